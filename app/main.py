@@ -1,8 +1,13 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
 from fastapi import Depends, FastAPI, Response, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from app.packages.models.conversation_models import (
     AnalayzeRequest, 
+    ConversationListRequest,
     GPTRequest, 
     UserConversationRequest, 
 )
@@ -15,15 +20,34 @@ from app.resolvers import (
     get_analyze_resolver,
     get_conversation_resolver, 
     get_all_user_conversations_resolver, 
-    process_answer_and_generate_followup_resolver
+    process_answer_and_generate_followup_resolver,
+    process_answer_and_generate_followup_stream_resolver,
+    get_conversation_title_resolver
 )
 from app.resolvers.analyze_resolvers import get_consolidated_and_labeled_values_for_user  # Update import
 from app.resolvers.user_resolvers import register, login, logout
+from app.openai_resolvers.fair_queue import bind_llm_user, fair_queue
+from app.openai_resolvers.llm_cache import llm_cache
+from app.openai_resolvers.llm_metrics import bind_llm_topic, llm_metrics
+from app.openai_resolvers.rate_limiter import rate_scheduler
+from app.services.background_tasks import background_tasks
+from app.packages.indexes import ensure_indexes_on_startup
+from app.packages.unit_of_work import turn_round_trips
 from app.packages.schemas.user_schema import UserCreate, UserLogin
 
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start the background workers and let queued jobs finish on shutdown
+    await background_tasks.start()
+    # Missing indexes are built while the app already serves requests
+    index_task = asyncio.create_task(ensure_indexes_on_startup())
+    yield
+    index_task.cancel()
+    await background_tasks.drain()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",  
@@ -63,17 +87,32 @@ async def api_get_current_user(request: Request):
 @app.post("/conversation")
 async def api_process_answer_and_generate_followup_resolver(request: GPTRequest, current_user: dict = Depends(get_current_user)):
     # Process an answer and generate a follow-up question
+    bind_llm_user(str(current_user['id']))
+    bind_llm_topic(request.topic)
     return await process_answer_and_generate_followup_resolver(request, str(current_user['id']))
 
+@app.post("/conversation/stream")
+async def api_process_answer_and_generate_followup_stream_resolver(request: GPTRequest, current_user: dict = Depends(get_current_user)):
+    # Process an answer and stream the follow-up responses as Server-Sent Events
+    bind_llm_user(str(current_user['id']))
+    bind_llm_topic(request.topic)
+    events = await process_answer_and_generate_followup_stream_resolver(request, str(current_user['id']))
+    return StreamingResponse(events, media_type="text/event-stream")
+
+@app.get("/conversation/{conversation_id}/title")
+async def api_get_conversation_title(conversation_id: str, current_user: dict = Depends(get_current_user)):
+    # Get the title of a conversation and whether its generation is still pending
+    return await get_conversation_title_resolver(conversation_id, str(current_user['id']))
+
 @app.post("/get_conversation")
 async def api_get_conversation(request: UserConversationRequest, current_user: dict = Depends(get_current_user)):
     # Get a specific conversation for the current user
     return await get_conversation_resolver(request, str(current_user['id']))
 
 @app.post("/user_conversations")
-async def get_user_data(current_user: dict = Depends(get_current_user)):
-    # Get all conversations for the current user
-    return await get_all_user_conversations_resolver(str(current_user['id']))
+async def get_user_data(request: Optional[ConversationListRequest] = None, current_user: dict = Depends(get_current_user)):
+    # Get a page of the current user's conversations; the body is optional
+    return await get_all_user_conversations_resolver(str(current_user['id']), request)
 
 @app.post("/user_all_values")
 async def get_all_values_for_user(current_user: dict = Depends(get_current_user)):
@@ -100,13 +139,36 @@ async def api_process_answer(request: AnalayzeRequest, current_user: dict = Depe
 @app.post("/retrieve_keywords")
 async def retrieve_keywords(request: AnalayzeRequest, current_user: dict = Depends(get_current_user)):
     # Retrieve keywords for a given request
+    bind_llm_user(str(current_user['id']))
     return await process_retrieve_keywords_resolver(request)
 
 @app.get("/analyze/{conversation_id}")
 async def get_analyze(conversation_id: str, current_user: dict = Depends(get_current_user)):
     # Get analysis for a specific conversation
+    bind_llm_user(str(current_user['id']))
     return await get_analyze_resolver(conversation_id)
 
+# Metrics routes
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    # Get latency, time-to-first-token, token and outcome metrics of LLM calls in the Prometheus text format
+    return PlainTextResponse(llm_metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/llm_cache")
+async def get_llm_cache_stats():
+    # Get hit, miss and eviction counters of the LLM response cache
+    return llm_cache.get_stats()
+
+@app.get("/metrics/conversation_turns")
+async def get_conversation_turn_stats():
+    # Get the MongoDB round trips of conversation turns: reads and writes, per turn and at most
+    return turn_round_trips.get_stats()
+
+@app.get("/metrics/llm_queue")
+async def get_llm_queue_stats():
+    # Get the queue depth and wait times, per active user by hashed ID, and the remaining provider rate budget
+    return {"queue": fair_queue.stats(), "rate_budget": rate_scheduler.stats()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
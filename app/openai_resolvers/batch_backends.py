@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+from abc import ABC, abstractmethod
+from typing import Any, Dict
+from app.openai_resolvers.batch_executor import run_batch
+from app.openai_resolvers.completions import create_chat_completion
+from app.openai_resolvers.openai_client import client as default_client
+
+logger = logging.getLogger(__name__)
+
+# "openai" submits to the OpenAI Batch API, "local" runs the requests through the configured
+# chat client (OpenAI or the fake backend) with bounded concurrency.
+BATCH_BACKEND = os.getenv("BATCH_BACKEND", "local")
+BATCH_LOCAL_MAX_IN_FLIGHT = int(os.getenv("BATCH_LOCAL_MAX_IN_FLIGHT", 4))
+
+BATCH_COMPLETED = "completed"
+BATCH_IN_PROGRESS = "in_progress"
+BATCH_FAILED = "failed"
+
+
+class BatchBackend(ABC):
+    """
+    Runs a JSONL file of chat completion requests in the OpenAI batch format
+    ({"custom_id", "method", "url", "body"} per line) and returns the results in the OpenAI
+    batch output format ({"custom_id", "response": {"status_code", "body"}, "error"} per line).
+    """
+
+    @abstractmethod
+    async def submit(self, input_path: str) -> str:
+        """Starts a batch for the requests in input_path and returns its ID."""
+
+    @abstractmethod
+    async def status(self, batch_id: str) -> str:
+        """Polls a batch: BATCH_COMPLETED, BATCH_IN_PROGRESS or BATCH_FAILED."""
+
+    @abstractmethod
+    async def download(self, batch_id: str, output_path: str):
+        """Writes the results of a completed batch to output_path."""
+
+
+class OpenAIBatchBackend(BatchBackend):
+    def __init__(self, client=None):
+        self.client = client or default_client
+
+    async def submit(self, input_path: str) -> str:
+        with open(input_path, "rb") as input_file:
+            uploaded = await self.client.files.create(file=input_file, purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        return batch.id
+
+    async def status(self, batch_id: str) -> str:
+        batch = await self.client.batches.retrieve(batch_id)
+        if batch.status == "completed":
+            return BATCH_COMPLETED
+        if batch.status in ("failed", "expired", "cancelled"):
+            return BATCH_FAILED
+        return BATCH_IN_PROGRESS
+
+    async def download(self, batch_id: str, output_path: str):
+        batch = await self.client.batches.retrieve(batch_id)
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = await self.client.files.content(file_id)
+                lines.append(content.text.rstrip("\n"))
+        with open(output_path, "w") as output_file:
+            output_file.write("\n".join(filter(None, lines)) + "\n")
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    Stand-in for the Batch API that runs every request through create_chat_completion at
+    background priority. Results are kept next to the input file, so a finished batch
+    survives a restart of the pipeline.
+    """
+
+    def __init__(self, max_in_flight: int = BATCH_LOCAL_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+
+    def output_path_for(self, batch_id: str) -> str:
+        return f"{batch_id}.results.jsonl"
+
+    async def submit(self, input_path: str) -> str:
+        with open(input_path) as input_file:
+            requests = [json.loads(line) for line in input_file if line.strip()]
+
+        async def run_request(request: Dict[str, Any]):
+            body = dict(request["body"])
+            return await create_chat_completion(
+                messages=body.pop("messages"),
+                model=body.pop("model"),
+                call_site="batch",
+                **body,
+            )
+
+        results = await run_batch(requests, run_request, max_in_flight=self.max_in_flight)
+
+        with open(input_path, "rb") as input_file:
+            batch_id = f"{input_path}.{hashlib.sha256(input_file.read()).hexdigest()[:12]}"
+        # Written under a temporary name so a crash never leaves a partial result file behind.
+        output_path = self.output_path_for(batch_id)
+        with open(f"{output_path}.tmp", "w") as output_file:
+            for request, result in zip(requests, results):
+                if result.ok:
+                    line = {
+                        "custom_id": request["custom_id"],
+                        "response": {"status_code": 200, "body": result.value.model_dump()},
+                        "error": None,
+                    }
+                else:
+                    line = {"custom_id": request["custom_id"], "response": None, "error": {"message": str(result.error)}}
+                output_file.write(json.dumps(line) + "\n")
+        os.replace(f"{output_path}.tmp", output_path)
+        return batch_id
+
+    async def status(self, batch_id: str) -> str:
+        return BATCH_COMPLETED if os.path.exists(self.output_path_for(batch_id)) else BATCH_FAILED
+
+    async def download(self, batch_id: str, output_path: str):
+        shutil.copyfile(self.output_path_for(batch_id), output_path)
+
+
+def create_batch_backend(backend: str = BATCH_BACKEND) -> BatchBackend:
+    if backend == "openai":
+        return OpenAIBatchBackend()
+    if backend == "local":
+        return LocalBatchBackend()
+    raise ValueError(f"Unknown batch backend: {backend}")
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Generic, List, Optional, Sequence, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass
+class BatchItemResult(Generic[R]):
+    index: int
+    value: Optional[R] = None
+    error: Optional[BaseException] = None
+    attempts: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def run_batch(
+    items: Sequence[T],
+    worker: Callable[[T], Awaitable[R]],
+    max_in_flight: int = 4,
+    max_retries: int = 2,
+    retry_delay: float = 0.5,
+) -> List[BatchItemResult[R]]:
+    """
+    Runs worker over every item with at most max_in_flight calls outstanding.
+
+    Args:
+        items (Sequence[T]): The inputs to process.
+        worker (Callable[[T], Awaitable[R]]): Coroutine function called once per attempt.
+        max_in_flight (int): Maximum number of concurrent worker calls.
+        max_retries (int): How many times a failed item is retried before giving up.
+        retry_delay (float): Base delay in seconds between retries, doubled on each attempt.
+
+    Returns:
+        List[BatchItemResult[R]]: One result per item, in the same order as items. Failed
+        items carry their last error instead of aborting the rest of the batch.
+    """
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least 1")
+
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def run_item(index: int, item: T) -> BatchItemResult[R]:
+        result: BatchItemResult[R] = BatchItemResult(index=index)
+        for attempt in range(max_retries + 1):
+            result.attempts = attempt + 1
+            async with semaphore:
+                try:
+                    result.value = await worker(item)
+                    result.error = None
+                    return result
+                except Exception as e:
+                    result.error = e
+                    logger.warning(f"Batch item {index} failed on attempt {result.attempts}: {e}")
+            if attempt < max_retries:
+                await asyncio.sleep(retry_delay * (2 ** attempt))
+        return result
+
+    return list(await asyncio.gather(*(run_item(index, item) for index, item in enumerate(items))))
+
+
+def leading_successes(results: Sequence[BatchItemResult[R]]) -> List[Any]:
+    """
+    Returns the values of the contiguous run of successful results at the start of the batch.
+    Useful when results are positional and a gap cannot be stored.
+    """
+    values = []
+    for result in results:
+        if not result.ok:
+            break
+        values.append(result.value)
+    return values
@@ -0,0 +1,127 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional
+
+LLM_DEFAULT_MODEL = os.getenv("LLM_DEFAULT_MODEL", "gpt-4o-mini")
+# Models a request may ask for in its overrides.
+LLM_ALLOWED_MODELS = [model.strip() for model in os.getenv("LLM_ALLOWED_MODELS", "gpt-4o-mini,gpt-4o").split(",") if model.strip()]
+# Upper bound of the max_tokens a request may ask for, unless a call site sets its own.
+LLM_MAX_TOKENS_LIMIT = int(os.getenv("LLM_MAX_TOKENS_LIMIT", 1024))
+MAX_STOP_SEQUENCES = 4
+
+# Call sites whose parameters a conversation request may override. GPTRequest.max_tokens
+# applies to the four turn completions; the single-call turn is left out because truncating
+# its JSON output would only force the fallback to one call per history.
+REQUEST_OVERRIDABLE_CALL_SITES = ("question", "summary", "analyze", "answers", "title", "turn")
+REQUEST_MAX_TOKENS_CALL_SITES = ("question", "summary", "analyze", "answers")
+
+
+@dataclass(frozen=True)
+class CallSiteConfig:
+    """
+    Attributes:
+        model (str): The model the call site uses.
+        max_tokens (Optional[int]): Cap on the completion tokens, None for no cap.
+        temperature (Optional[float]): Sampling temperature, None for the API default.
+        stop (Optional[List[str]]): Sequences that end the completion.
+        max_tokens_limit (int): The largest max_tokens a request may override it with.
+    """
+    model: str = LLM_DEFAULT_MODEL
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    stop: Optional[List[str]] = None
+    max_tokens_limit: int = LLM_MAX_TOKENS_LIMIT
+
+    @classmethod
+    def from_env(cls, call_site: str) -> "CallSiteConfig":
+        prefix = f"LLM_{call_site.upper()}_"
+        max_tokens = os.getenv(f"{prefix}MAX_TOKENS")
+        temperature = os.getenv(f"{prefix}TEMPERATURE")
+        stop = os.getenv(f"{prefix}STOP")
+        return cls(
+            model=os.getenv(f"{prefix}MODEL", LLM_DEFAULT_MODEL),
+            max_tokens=int(max_tokens) if max_tokens else None,
+            temperature=float(temperature) if temperature else None,
+            # Stop sequences are separated by "|".
+            stop=stop.split("|")[:MAX_STOP_SEQUENCES] if stop else None,
+            max_tokens_limit=int(os.getenv(f"{prefix}MAX_TOKENS_LIMIT", LLM_MAX_TOKENS_LIMIT)),
+        )
+
+    def params(self) -> Dict[str, Any]:
+        params = {"max_tokens": self.max_tokens, "temperature": self.temperature, "stop": self.stop}
+        return {name: value for name, value in params.items() if value is not None}
+
+
+# Parameter overrides of the current request, per call site.
+current_call_site_overrides: ContextVar[Dict[str, Dict[str, Any]]] = ContextVar("current_call_site_overrides", default={})
+
+call_site_configs: Dict[str, CallSiteConfig] = {}
+
+
+def get_call_site_config(call_site: str) -> CallSiteConfig:
+    """
+    Returns the configuration of the call site, read from the LLM_<CALL_SITE>_* environment
+    variables on first use, with the overrides of the current request applied.
+    """
+    if call_site not in call_site_configs:
+        call_site_configs[call_site] = CallSiteConfig.from_env(call_site)
+    overrides = current_call_site_overrides.get().get(call_site)
+    return replace(call_site_configs[call_site], **overrides) if overrides else call_site_configs[call_site]
+
+def validate_call_site_overrides(overrides: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Checks request overrides against the call sites they may change, the allowed models and the
+    max_tokens limit of each call site, and drops unset fields.
+
+    Raises:
+        ValueError: If an override is not allowed.
+    """
+    validated = {}
+    for call_site, override in overrides.items():
+        if call_site not in REQUEST_OVERRIDABLE_CALL_SITES:
+            raise ValueError(f"Call site {call_site} cannot be overridden, expected one of {', '.join(REQUEST_OVERRIDABLE_CALL_SITES)}")
+        override = {name: value for name, value in override.items() if value is not None}
+        if "model" in override and override["model"] not in LLM_ALLOWED_MODELS:
+            raise ValueError(f"Model {override['model']} is not allowed, expected one of {', '.join(LLM_ALLOWED_MODELS)}")
+        limit = get_call_site_config(call_site).max_tokens_limit
+        if override.get("max_tokens", 0) > limit:
+            raise ValueError(f"max_tokens of {call_site} may be at most {limit}")
+        validated[call_site] = override
+    return validated
+
+def bind_call_site_overrides(overrides: Dict[str, Dict[str, Any]]):
+    """
+    Validates the overrides and applies them to the LLM calls made by the rest of this request.
+
+    Raises:
+        ValueError: If an override is not allowed.
+    """
+    current_call_site_overrides.set(validate_call_site_overrides(overrides))
+
+@contextmanager
+def apply_call_site_overrides(overrides: Dict[str, Dict[str, Any]]):
+    """
+    Applies overrides validated by an earlier request to the LLM calls of the enclosed code,
+    e.g. a background job working on the request's behalf.
+    """
+    token = current_call_site_overrides.set(overrides)
+    try:
+        yield
+    finally:
+        current_call_site_overrides.reset(token)
+
+def get_request_overrides(request) -> Dict[str, Dict[str, Any]]:
+    """
+    Collects the per-call-site overrides of a GPTRequest. An explicitly sent max_tokens applies
+    to every turn completion that does not set its own.
+    """
+    overrides = {
+        call_site: override.model_dump(exclude_none=True)
+        for call_site, override in (request.llm_overrides or {}).items()
+    }
+    if "max_tokens" in request.model_fields_set:
+        for call_site in REQUEST_MAX_TOKENS_CALL_SITES:
+            overrides.setdefault(call_site, {}).setdefault("max_tokens", request.max_tokens)
+    return overrides
@@ -0,0 +1,103 @@
+import time
+from typing import Any, Dict, List, Optional
+from app.openai_resolvers.call_site_config import get_call_site_config
+from app.openai_resolvers.fair_queue import LLM_FAIR_QUEUE_ENABLED, fair_queue
+from app.openai_resolvers.llm_cache import LLM_CACHE_ENABLED, get_total_tokens, llm_cache, make_cache_key
+from app.openai_resolvers.llm_metrics import LLM_METRICS_ENABLED, OUTCOME_CACHED, OUTCOME_OK, classify_outcome, llm_metrics
+from app.openai_resolvers.openai_client import client
+from app.openai_resolvers.rate_limiter import LLM_RATE_LIMIT_ENABLED, estimate_request_tokens, rate_scheduler
+from app.openai_resolvers.resilience import resilient_caller
+
+
+async def create_chat_completion(
+    messages: List[Dict[str, str]],
+    model: Optional[str] = None,
+    call_site: str = "default",
+    use_cache: bool = True,
+    **params: Any,
+):
+    """
+    Single entry point for chat completions made by the app.
+
+    The model, max_tokens, temperature and stop sequences come from the configuration of the
+    call site, with the overrides of the current request applied; explicit arguments win.
+
+    Non-streaming completions are looked up in the response cache first, keyed on a hash of
+    the model, messages and parameters, and stored there after a successful call. Calls that
+    reach the API go through the resilience layer: per-call-site timeouts, retries with
+    jittered backoff and a circuit breaker. Streams are never hedged, and only opening the
+    stream is retried. Every attempt first waits for request and token budget from the rate
+    scheduler, prioritised by call site. Before any of that, the call waits for a slot in the
+    per-user fair queue of the user bound to the current request; a stream holds its slot
+    until it has been consumed or closed.
+
+    Every call is recorded in the LLM metrics by call site, topic, model and outcome: wall
+    time from entry to response (or, for streams, to the last chunk), time to the first chunk
+    of streams, and the token usage the API reports.
+
+    Args:
+        messages (List[Dict[str, str]]): The chat messages to send.
+        model (Optional[str]): The model to use, defaults to the call site's model.
+        call_site (str): Which part of the app makes the call, used to label cache counters
+            and metrics and to pick the model parameters and resilience policy.
+        use_cache (bool): Whether this call may be served from or stored in the cache.
+        **params: Additional parameters forwarded to chat.completions.create.
+
+    Returns:
+        The chat completion response, or the stream when stream=True.
+    """
+    started = time.monotonic()
+    config = get_call_site_config(call_site)
+    model = model or config.model
+    params = {**config.params(), **params}
+    cacheable = LLM_CACHE_ENABLED and use_cache and not params.get("stream")
+    if cacheable:
+        key = make_cache_key(model, messages, params)
+        cached = await llm_cache.get(key, call_site)
+        if cached is not None:
+            if LLM_METRICS_ENABLED:
+                llm_metrics.record(call_site, model, OUTCOME_CACHED, time.monotonic() - started, cached)
+            return cached
+
+    estimated_tokens = estimate_request_tokens(messages, params)
+
+    async def wait_for_budget():
+        await rate_scheduler.acquire(call_site, estimated_tokens)
+
+    async def send():
+        return await resilient_caller.call(
+            call_site,
+            lambda: client.chat.completions.create(
+                messages=messages,
+                model=model,
+                **params,
+            ),
+            hedge=not params.get("stream"),
+            before_attempt=wait_for_budget if LLM_RATE_LIMIT_ENABLED else None,
+        )
+
+    try:
+        if LLM_FAIR_QUEUE_ENABLED and params.get("stream"):
+            response = await fair_queue.hold_stream(send, estimated_tokens)
+        elif LLM_FAIR_QUEUE_ENABLED:
+            async with fair_queue.slot(estimated_tokens):
+                response = await send()
+        else:
+            response = await send()
+    except Exception as e:
+        if LLM_METRICS_ENABLED:
+            llm_metrics.record(call_site, model, classify_outcome(e), time.monotonic() - started)
+        raise
+
+    if params.get("stream"):
+        # The stream is recorded once it has been consumed.
+        return llm_metrics.instrument_stream(response, call_site, model, started) if LLM_METRICS_ENABLED else response
+
+    if LLM_METRICS_ENABLED:
+        llm_metrics.record(call_site, model, OUTCOME_OK, time.monotonic() - started, response)
+    if LLM_RATE_LIMIT_ENABLED:
+        rate_scheduler.settle(estimated_tokens, get_total_tokens(response))
+
+    if cacheable:
+        await llm_cache.set(key, response)
+    return response
@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+import heapq
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+LLM_FAIR_QUEUE_ENABLED = os.getenv("LLM_FAIR_QUEUE_ENABLED", "true").lower() == "true"
+# LLM calls in flight across all users; the resource the users share fairly.
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", 64))
+# A single turn makes four concurrent calls, so the default lets a user run two turns at once.
+LLM_USER_MAX_IN_FLIGHT = int(os.getenv("LLM_USER_MAX_IN_FLIGHT", 8))
+LLM_DEFAULT_USER_WEIGHT = float(os.getenv("LLM_DEFAULT_USER_WEIGHT", 1))
+# Comma separated user_id=weight pairs, e.g. "66a1...=2,66b2...=0.5".
+LLM_USER_WEIGHTS = os.getenv("LLM_USER_WEIGHTS", "")
+
+# Calls made outside a user request (e.g. background title jobs) share this queue.
+SYSTEM_USER = "system"
+
+current_llm_user: ContextVar[Optional[str]] = ContextVar("current_llm_user", default=None)
+
+
+def bind_llm_user(user_id: str):
+    """
+    Attributes the LLM calls made by the rest of this request to `user_id`. The value is
+    inherited by tasks the request spawns, including the body of a streaming response.
+    """
+    current_llm_user.set(user_id)
+
+def parse_user_weights(value: str) -> Dict[str, float]:
+    weights = {}
+    for pair in filter(None, (item.strip() for item in value.split(","))):
+        user_id, _, weight = pair.partition("=")
+        try:
+            weights[user_id.strip()] = float(weight)
+        except ValueError:
+            logger.warning(f"Ignoring invalid LLM user weight: {pair}")
+    return weights
+
+def user_key(user_id: str) -> str:
+    """
+    Identifies a user in the queue metrics without exposing the user ID.
+    """
+    return hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:12]
+
+
+@dataclass
+class QueuedCall:
+    finish_tag: float
+    start_tag: float
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class UserQueue:
+    weight: float
+    waiting: Deque[QueuedCall] = field(default_factory=deque)
+    in_flight: int = 0
+    last_finish_tag: float = 0.0
+
+
+class FairQueue:
+    """
+    Weighted fair queuing of LLM calls across users.
+
+    Each call gets a virtual finish tag of start + cost / weight, where start is the later of
+    the queue's virtual time and the user's previous finish tag. Free slots go to the waiting
+    call with the smallest tag among users below their in-flight limit, so a user who bursts
+    many calls only delays their own later calls, and idle users cannot bank credit.
+
+    Only users with calls waiting or in flight are kept, plus idle users whose last finish tag
+    is still ahead of the virtual time, until the virtual time passes it or no call is left in
+    the queue. A forgotten user starts again at the virtual time, as they would have anyway.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = LLM_MAX_IN_FLIGHT,
+        user_max_in_flight: int = LLM_USER_MAX_IN_FLIGHT,
+        weights: Optional[Dict[str, float]] = None,
+        default_weight: float = LLM_DEFAULT_USER_WEIGHT,
+    ):
+        self.max_in_flight = max_in_flight
+        self.user_max_in_flight = user_max_in_flight
+        self.weights = weights if weights is not None else parse_user_weights(LLM_USER_WEIGHTS)
+        self.default_weight = default_weight
+        self.users: Dict[str, UserQueue] = {}
+        # Users with waiting calls, the only ones dispatch has to look at.
+        self.backlogged: Set[str] = set()
+        # (last finish tag, user ID) of idle users, forgotten once the virtual time passes the tag.
+        self.idle: List[Tuple[float, str]] = []
+        self.in_flight = 0
+        self.virtual_time = 0.0
+        self.granted = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def user(self, user_id: str) -> UserQueue:
+        if user_id not in self.users:
+            self.users[user_id] = UserQueue(weight=self.weights.get(user_id, self.default_weight))
+        return self.users[user_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": sum(len(self.users[user_id].waiting) for user_id in self.backlogged),
+            "granted": self.granted,
+            "average_wait_seconds": self.total_wait_seconds / self.granted if self.granted else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+            "users": {
+                user_key(user_id): {"queue_depth": len(queue.waiting), "in_flight": queue.in_flight, "weight": queue.weight}
+                for user_id, queue in self.users.items()
+                if queue.waiting or queue.in_flight
+            },
+        }
+
+    async def acquire(self, user_id: str, cost: float = 1.0):
+        queue = self.user(user_id)
+        start_tag = max(self.virtual_time, queue.last_finish_tag)
+        call = QueuedCall(start_tag + max(cost, 1.0) / queue.weight, start_tag, asyncio.get_running_loop().create_future())
+        queue.last_finish_tag = call.finish_tag
+        queue.waiting.append(call)
+        self.backlogged.add(user_id)
+        self.dispatch()
+        try:
+            await call.future
+        except asyncio.CancelledError:
+            if call in queue.waiting:
+                queue.waiting.remove(call)
+                if not queue.waiting:
+                    self.backlogged.discard(user_id)
+                self.forget_if_idle(user_id)
+            elif call.future.done() and not call.future.cancelled():
+                self.release(user_id)
+            raise
+
+    def release(self, user_id: str):
+        self.user(user_id).in_flight -= 1
+        self.in_flight -= 1
+        self.dispatch()
+        self.forget_if_idle(user_id)
+
+    def forget_if_idle(self, user_id: str):
+        queue = self.users.get(user_id)
+        if queue is None or queue.waiting or queue.in_flight:
+            return
+        if queue.last_finish_tag <= self.virtual_time:
+            del self.users[user_id]
+        else:
+            heapq.heappush(self.idle, (queue.last_finish_tag, user_id))
+
+    def forget_idle_users(self):
+        if not self.in_flight and not self.backlogged:
+            # Nobody is contending any more, so no finish tag has to be kept.
+            self.users.clear()
+            self.idle.clear()
+            return
+        while self.idle and self.idle[0][0] <= self.virtual_time:
+            _, user_id = heapq.heappop(self.idle)
+            queue = self.users.get(user_id)
+            # The user may have been active again since the entry was pushed.
+            if queue is not None and not queue.waiting and not queue.in_flight and queue.last_finish_tag <= self.virtual_time:
+                del self.users[user_id]
+
+    def dispatch(self):
+        while self.in_flight < self.max_in_flight:
+            eligible = [
+                user_id for user_id in self.backlogged
+                if self.users[user_id].in_flight < self.user_max_in_flight
+            ]
+            if not eligible:
+                break
+            user_id = min(eligible, key=lambda eligible_id: self.users[eligible_id].waiting[0].finish_tag)
+            queue = self.users[user_id]
+            call = queue.waiting.popleft()
+            if not queue.waiting:
+                self.backlogged.discard(user_id)
+            self.virtual_time = max(self.virtual_time, call.start_tag)
+            wait = time.monotonic() - call.enqueued_at
+            queue.in_flight += 1
+            self.in_flight += 1
+            self.granted += 1
+            self.total_wait_seconds += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+            call.future.set_result(None)
+        self.forget_idle_users()
+
+    @asynccontextmanager
+    async def slot(self, cost: float = 1.0, user_id: Optional[str] = None):
+        user_id = user_id or current_llm_user.get() or SYSTEM_USER
+        await self.acquire(user_id, cost)
+        try:
+            yield
+        finally:
+            self.release(user_id)
+
+    async def hold_stream(
+        self,
+        open_stream: Callable[[], Awaitable[AsyncIterator[Any]]],
+        cost: float = 1.0,
+        user_id: Optional[str] = None,
+    ) -> "QueuedStream":
+        """
+        Opens a stream in a slot that is held until the stream has been consumed or closed,
+        since the call keeps the API busy until its last chunk.
+        """
+        user_id = user_id or current_llm_user.get() or SYSTEM_USER
+        await self.acquire(user_id, cost)
+        try:
+            stream = await open_stream()
+        except BaseException:
+            self.release(user_id)
+            raise
+        return QueuedStream(stream, lambda: self.release(user_id))
+
+
+class QueuedStream:
+    """
+    Wraps a completion stream to release its fair queue slot once the stream ends, fails or is
+    closed, whichever comes first.
+    """
+
+    def __init__(self, stream: AsyncIterator[Any], release: Callable[[], None]):
+        self.stream = stream
+        self.on_release: Optional[Callable[[], None]] = release
+
+    def __getattr__(self, name: str):
+        return getattr(self.stream, name)
+
+    def __aiter__(self):
+        return self.iterate()
+
+    async def iterate(self):
+        try:
+            async for chunk in self.stream:
+                yield chunk
+        finally:
+            self.release()
+
+    def release(self):
+        if self.on_release is not None:
+            release, self.on_release = self.on_release, None
+            release()
+
+    async def close(self):
+        self.release()
+        close = getattr(self.stream, "close", None)
+        if close is not None:
+            await close()
+
+
+fair_queue = FairQueue()
@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+import httpx
+from openai import APIStatusError, InternalServerError, RateLimitError
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from app.services.token_counter import count_message_tokens, count_tokens
+
+FAKE_API_URL = "https://fake-llm.local/v1/chat/completions"
+
+
+@dataclass
+class FakeLLMConfig:
+    """
+    Behaviour of the fake backend.
+
+    Attributes:
+        latency_distribution (str): "fixed", "uniform", "normal" or "lognormal".
+        latency_ms (float): Mean latency of a completion, or of the first chunk when streaming.
+        latency_jitter_ms (float): Spread of the distribution (half-width for uniform, sigma otherwise).
+        stream_chunk_delay_ms (float): Delay between streamed chunks after the first one.
+        error_rate (float): Probability in [0, 1] that a call fails.
+        error_statuses (List[int]): HTTP statuses the failures are drawn from.
+        usage_scale (float): Multiplier applied to the locally counted prompt and completion tokens.
+        seed (Optional[int]): Seed for latency and error sampling, for reproducible load tests.
+    """
+    latency_distribution: str = "fixed"
+    latency_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    stream_chunk_delay_ms: float = 0.0
+    error_rate: float = 0.0
+    error_statuses: List[int] = field(default_factory=lambda: [429, 500, 503])
+    usage_scale: float = 1.0
+    seed: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "FakeLLMConfig":
+        seed = os.getenv("FAKE_LLM_SEED")
+        return cls(
+            latency_distribution=os.getenv("FAKE_LLM_LATENCY_DISTRIBUTION", "fixed"),
+            latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", 0)),
+            latency_jitter_ms=float(os.getenv("FAKE_LLM_LATENCY_JITTER_MS", 0)),
+            stream_chunk_delay_ms=float(os.getenv("FAKE_LLM_STREAM_CHUNK_DELAY_MS", 0)),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", 0)),
+            error_statuses=[int(status) for status in os.getenv("FAKE_LLM_ERROR_STATUSES", "429,500,503").split(",")],
+            usage_scale=float(os.getenv("FAKE_LLM_USAGE_SCALE", 1)),
+            seed=int(seed) if seed is not None else None,
+        )
+
+
+def seeded_random(messages: List[Dict[str, str]]) -> random.Random:
+    """
+    Content is derived from the messages only, so identical prompts always get identical answers.
+    """
+    digest = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()
+    return random.Random(int(digest[:16], 16))
+
+def last_user_content(messages: List[Dict[str, str]]) -> str:
+    for message in reversed(messages):
+        if message["role"] == "user":
+            return message["content"]
+    return ""
+
+FAKE_ANALYSIS_SUMMARY = "The individual values personal development and meaningful relationships, and shows a consistent drive to act on their beliefs."
+
+def fake_analysis_values(rng: random.Random) -> List[Dict[str, Any]]:
+    # Imported here because keyword_extraction routes its calls through the client built from this module.
+    from app.openai_resolvers.keyword_extraction import attributes
+
+    chosen = rng.sample(attributes, 5)
+    percentages = sorted((rng.randint(40, 95) for _ in chosen), reverse=True)
+    return [
+        {
+            "attribute": attribute["attribute"],
+            "explanation": f"{attribute['explanation']} shows up in how they describe their choices",
+            "label": "high" if percentage >= 75 else "medium" if percentage >= 55 else "low",
+            "percentage": percentage,
+        }
+        for attribute, percentage in zip(chosen, percentages)
+    ]
+
+def fake_analysis(rng: random.Random) -> str:
+    lines = [FAKE_ANALYSIS_SUMMARY]
+    for number, value in enumerate(fake_analysis_values(rng), 1):
+        lines.append(f"{number}. {value['attribute']} - {value['explanation']} - {{{value['label']}: {value['percentage']}%}}")
+    return "\n".join(lines)
+
+def fake_structured_analysis(rng: random.Random) -> str:
+    return json.dumps({"summary": FAKE_ANALYSIS_SUMMARY, "values": fake_analysis_values(rng)})
+
+def fake_keywords(rng: random.Random) -> str:
+    from app.openai_resolvers.keyword_extraction import attributes
+
+    return ", ".join(attribute["attribute"] for attribute in rng.sample(attributes, 4))
+
+def fake_answer_options(rng: random.Random) -> List[Dict[str, str]]:
+    answers = [
+        {"title": "Family first", "answer": "I realised my family shaped most of what I care about."},
+        {"title": "Growth", "answer": "I want to keep learning and challenging myself."},
+        {"title": "Freedom", "answer": "I value being able to decide things for myself."},
+        {"title": "Helping others", "answer": "It matters to me that my work makes someone's life easier."},
+    ]
+    return rng.sample(answers, 3)
+
+def fake_possible_answers(rng: random.Random) -> str:
+    return json.dumps(fake_answer_options(rng))
+
+def fake_question(rng: random.Random) -> str:
+    return rng.choice([
+        "What about that experience felt most important to you?",
+        "How does that connect to the way you make decisions today?",
+        "Who else in your life shares that value, and how do you notice it?",
+    ])
+
+def fake_turn_outputs(rng: random.Random, prompt: str) -> str:
+    return json.dumps({
+        "question": fake_question(rng),
+        "summary": f"The user explained that {prompt[:120].rstrip('.')}, which points to what they value.",
+        "analysis": fake_analysis(rng),
+        "answers": fake_answer_options(rng),
+    })
+
+def fake_content(messages: List[Dict[str, str]], response_format: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Returns a canned response in the format the prompt, or the JSON schema of response_format, asks for.
+    """
+    rng = seeded_random(messages)
+    schema_name = ((response_format or {}).get("json_schema") or {}).get("name")
+    if schema_name == "value_analysis":
+        return fake_structured_analysis(rng)
+    if schema_name == "turn_outputs":
+        return fake_turn_outputs(rng, last_user_content(messages))
+    system = " ".join(message["content"] for message in messages if message["role"] == "system")
+    prompt = last_user_content(messages)
+
+    if "title generation assistant" in system:
+        return rng.choice(["Finding Meaning in Everyday Choices", "What Truly Matters to Me", "Reflecting on Values and Growth"])
+    if "Analyze the following individual's priorities and values" in system:
+        return fake_analysis(rng)
+    if "Extract only the keywords" in system:
+        return fake_keywords(rng)
+    if "maintain a running summary" in system:
+        return "The user described the experiences and people that shaped their values."
+    if "generates several possible answers" in system or "generate several possible answers" in prompt:
+        return fake_possible_answers(rng)
+    if "summarizes the user's responses" in system:
+        return f"The user explained that {prompt[:120].rstrip('.')}, which points to what they value."
+    if "asks questions to guide the user" in system:
+        return fake_question(rng)
+    return f"Fake response to: {prompt[:200]}"
+
+
+class FakeCompletions:
+    def __init__(self, config: FakeLLMConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+
+    def sample_latency(self) -> float:
+        config = self.config
+        if config.latency_distribution == "uniform":
+            latency = self.rng.uniform(config.latency_ms - config.latency_jitter_ms, config.latency_ms + config.latency_jitter_ms)
+        elif config.latency_distribution == "normal":
+            latency = self.rng.gauss(config.latency_ms, config.latency_jitter_ms)
+        elif config.latency_distribution == "lognormal" and config.latency_ms > 0:
+            # Parameterised so that the median is latency_ms and the tail grows with the jitter.
+            sigma = config.latency_jitter_ms / config.latency_ms
+            latency = config.latency_ms * self.rng.lognormvariate(0, sigma)
+        else:
+            latency = config.latency_ms
+        return max(latency, 0.0) / 1000
+
+    def maybe_fail(self):
+        if self.config.error_rate <= 0 or self.rng.random() >= self.config.error_rate:
+            return
+        status = self.rng.choice(self.config.error_statuses)
+        response = httpx.Response(status, request=httpx.Request("POST", FAKE_API_URL))
+        message = f"Fake LLM backend injected a {status} error"
+        if status == 429:
+            raise RateLimitError(message, response=response, body=None)
+        if status >= 500:
+            raise InternalServerError(message, response=response, body=None)
+        raise APIStatusError(message, response=response, body=None)
+
+    def usage(self, messages: List[Dict[str, str]], content: str) -> Dict[str, int]:
+        prompt_tokens = int(count_message_tokens(messages) * self.config.usage_scale)
+        completion_tokens = int(count_tokens(content) * self.config.usage_scale)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    async def create(self, messages: List[Dict[str, str]], model: str, stream: bool = False, **params: Any):
+        await asyncio.sleep(self.sample_latency())
+        self.maybe_fail()
+        content = fake_content(messages, params.get("response_format"))
+        completion_id = f"chatcmpl-fake-{seeded_random(messages).getrandbits(64):x}"
+        if stream:
+            include_usage = (params.get("stream_options") or {}).get("include_usage", False)
+            return self.stream(completion_id, model, content, self.usage(messages, content) if include_usage else None)
+        return ChatCompletion.model_validate({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+            "usage": self.usage(messages, content),
+        })
+
+    async def stream(self, completion_id: str, model: str, content: str, usage: Optional[Dict[str, int]] = None) -> AsyncIterator[ChatCompletionChunk]:
+        words = content.split(" ")
+        for index, word in enumerate(words):
+            if index:
+                await asyncio.sleep(self.config.stream_chunk_delay_ms / 1000)
+            yield ChatCompletionChunk.model_validate({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if index == len(words) - 1 else f"{word} "},
+                    "finish_reason": "stop" if index == len(words) - 1 else None,
+                }],
+            })
+        if usage is not None:
+            # Like the API with stream_options.include_usage: a last chunk with no choices.
+            yield ChatCompletionChunk.model_validate({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [],
+                "usage": usage,
+            })
+
+
+class FakeChat:
+    def __init__(self, config: FakeLLMConfig):
+        self.completions = FakeCompletions(config)
+
+
+class FakeAsyncOpenAI:
+    """
+    Local stand-in for AsyncOpenAI exposing the same chat.completions.create interface.
+    It needs no network access or API key and returns deterministic responses shaped like
+    the prompts ask for, with configurable latency, error injection and token usage.
+    """
+
+    def __init__(self, config: Optional[FakeLLMConfig] = None):
+        self.config = config or FakeLLMConfig.from_env()
+        self.chat = FakeChat(self.config)
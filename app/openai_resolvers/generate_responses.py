@@ -1,16 +1,77 @@
-from fastapi import HTTPException, logger
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, List, Optional, Tuple
+from fastapi import HTTPException
 from app.packages.mongodb import update_conversation
-from app.openai_resolvers.openai_client import client
-from app.type import Conversation
+from app.openai_resolvers.completions import create_chat_completion
+from app.services.context_window import build_context
+from app.services.get_system_role import get_turn_system_role
+from app.type import Conversation, Message
 
+logger = logging.getLogger(__name__)
 
-async def get_ai_response(messages, model="gpt-4o-mini"):
-    response = await client.chat.completions.create(
+# When enabled, the question, summary and analyze completions run in parallel and the
+# possible-answers completion starts as soon as the question and summary are ready.
+CONCURRENT_RESPONSES = os.getenv("CONCURRENT_RESPONSES", "true").lower() == "true"
+
+# "multi" sends one completion per history (question, summary, analyze, answers); "single"
+# asks for all four outputs in one structured completion over the shared question history.
+# Requests can pick the mode with GPTRequest.turn_mode; this is the default.
+TURN_MODE = os.getenv("TURN_MODE", "multi")
+TURN_MODE_MULTI = "multi"
+TURN_MODE_SINGLE = "single"
+
+TURN_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "turn_outputs",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "question": {"type": "string"},
+                "summary": {"type": "string"},
+                "analysis": {"type": "string"},
+                "answers": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"title": {"type": "string"}, "answer": {"type": "string"}},
+                        "required": ["title", "answer"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["question", "summary", "analysis", "answers"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# The call site label used for each conversation history.
+HISTORY_CALL_SITES = {
+    "questions": "question",
+    "summaries": "summary",
+    "analyze": "analyze",
+    "answers": "answers",
+}
+
+async def get_ai_response(messages, model=None, call_site="turn"):
+    response = await create_chat_completion(
         messages=messages,
         model=model,
+        call_site=call_site,
     )
     return response.choices[0].message.content.strip()
 
+async def get_history_response(user_conversation: Conversation, history_name: str, messages: Optional[List[Message]] = None):
+    context = await build_context(user_conversation, history_name, messages)
+    return await get_ai_response(context, call_site=HISTORY_CALL_SITES[history_name])
+
 def prompt_for_possible_answers(next_question: str, previous_answers: str):
     text = (
         f"Imagine you are the user and you are answering the question: '{next_question}'.\n"
@@ -19,42 +80,164 @@ def prompt_for_possible_answers(next_question: str, previous_answers: str):
     )
     return text
 
-async def generate_responses(user_conversation: Conversation):
+@dataclass
+class BranchResult:
+    name: str
+    value: Optional[str] = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+
+async def run_branch(name: str, awaitable: Awaitable[Any]) -> BranchResult:
+    """
+    Awaits a single branch of the turn and records its outcome and wall time.
+    Errors are captured instead of raised so that sibling branches keep running.
+    """
+    started = time.perf_counter()
     try:
-        ai_question_response = await get_ai_response(user_conversation.questions)
-        user_conversation.questions.append({"role": "assistant", "content": ai_question_response})
+        value = await awaitable
+        return BranchResult(name=name, value=value, elapsed=time.perf_counter() - started)
+    except Exception as e:
+        return BranchResult(name=name, error=e, elapsed=time.perf_counter() - started)
 
-        ai_summary_response = await get_ai_response(user_conversation.summaries)
-        user_conversation.summaries.append({"role": "assistant", "content": ai_summary_response})
+async def generate_responses_sequentially(user_conversation: Conversation):
+    ai_question_response = await get_history_response(user_conversation, "questions")
+    user_conversation.questions.append({"role": "assistant", "content": ai_question_response})
 
-        ai_analyze_response = await get_ai_response(user_conversation.analyze)
-        user_conversation.analyze.append({"role": "assistant", "content": ai_analyze_response})
+    ai_summary_response = await get_history_response(user_conversation, "summaries")
+    user_conversation.summaries.append({"role": "assistant", "content": ai_summary_response})
 
-        possible_answers_prompt = prompt_for_possible_answers(user_conversation.questions[-1]["content"], user_conversation.summaries[-1]["content"])
-        user_conversation.answers.append({"role": "user", "content": possible_answers_prompt})
+    ai_analyze_response = await get_history_response(user_conversation, "analyze")
+    user_conversation.analyze.append({"role": "assistant", "content": ai_analyze_response})
 
-        ai_answers_response = await get_ai_response(user_conversation.answers)
-        user_conversation.answers.append({"role": "assistant", "content": ai_answers_response})
+    possible_answers_prompt = prompt_for_possible_answers(user_conversation.questions[-1]["content"], user_conversation.summaries[-1]["content"])
+    user_conversation.answers.append({"role": "user", "content": possible_answers_prompt})
+    ai_answers_response = await get_history_response(user_conversation, "answers")
+    user_conversation.answers.append({"role": "assistant", "content": ai_answers_response})
 
-        await update_conversation(user_conversation)
+    return ai_question_response, ai_summary_response, ai_analyze_response, ai_answers_response
+
+async def generate_responses_concurrently(user_conversation: Conversation):
+    """
+    Runs the question, summary and analyze completions in parallel. The possible-answers
+    completion depends only on the question and summary, so it starts as soon as both are
+    ready instead of waiting for analyze. Every branch settles before an error is raised,
+    so one failing branch does not cancel the others, and nothing is appended to the
+    conversation unless all branches succeed.
+    """
+    question_task = asyncio.create_task(run_branch("question", get_history_response(user_conversation, "questions")))
+    summary_task = asyncio.create_task(run_branch("summary", get_history_response(user_conversation, "summaries")))
+    analyze_task = asyncio.create_task(run_branch("analyze", get_history_response(user_conversation, "analyze")))
+
+    question_result, summary_result = await asyncio.gather(question_task, summary_task)
+
+    answers_prompt = None
+    if question_result.error is None and summary_result.error is None:
+        answers_prompt = {"role": "user", "content": prompt_for_possible_answers(question_result.value, summary_result.value)}
+        answers_result = await run_branch("answers", get_history_response(user_conversation, "answers", user_conversation.answers + [answers_prompt]))
+    else:
+        answers_result = BranchResult(name="answers", error=RuntimeError("skipped: question or summary failed"))
+
+    analyze_result = await analyze_task
+
+    results = [question_result, summary_result, analyze_result, answers_result]
+    for result in results:
+        if result.error is None:
+            logger.info(f"Branch {result.name} for conversation {user_conversation.conversation_id} finished in {result.elapsed:.3f}s")
+        else:
+            logger.error(f"Branch {result.name} for conversation {user_conversation.conversation_id} failed after {result.elapsed:.3f}s: {result.error}")
+
+    failed = [result for result in results if result.error is not None]
+    if failed:
+        raise RuntimeError(f"Failed branches: {', '.join(result.name for result in failed)}")
 
-        return ai_question_response, ai_summary_response, ai_analyze_response, ai_answers_response
+    user_conversation.questions.append({"role": "assistant", "content": question_result.value})
+    user_conversation.summaries.append({"role": "assistant", "content": summary_result.value})
+    user_conversation.analyze.append({"role": "assistant", "content": analyze_result.value})
+    user_conversation.answers.append(answers_prompt)
+    user_conversation.answers.append({"role": "assistant", "content": answers_result.value})
+
+    return question_result.value, summary_result.value, analyze_result.value, answers_result.value
+
+def parse_turn_outputs(content: str) -> Tuple[str, str, str, str]:
+    """
+    Validates a TURN_RESPONSE_FORMAT completion and returns the question, summary, analysis and
+    possible answers. The answers are returned as the JSON list of title/answer objects the
+    answers history stores in the multi-call mode.
+
+    Raises:
+        ValueError: If the content is not valid JSON or does not match the schema.
+    """
+    data = json.loads(content)
+    if not isinstance(data, dict) or not all(isinstance(data.get(key), str) and data[key].strip() for key in ("question", "summary", "analysis")):
+        raise ValueError("Turn outputs must have question, summary and analysis strings")
+    answers = data.get("answers")
+    if not isinstance(answers, list) or not all(
+        isinstance(answer, dict) and isinstance(answer.get("title"), str) and isinstance(answer.get("answer"), str)
+        for answer in answers
+    ):
+        raise ValueError("Turn outputs must have a list of title/answer objects")
+    answers = [{"title": answer["title"], "answer": answer["answer"]} for answer in answers]
+    return data["question"].strip(), data["summary"].strip(), data["analysis"].strip(), json.dumps(answers)
+
+async def generate_responses_single_call(user_conversation: Conversation):
+    """
+    Produces the follow-up question, summary, analysis and possible answers from one structured
+    completion. Only the question history is sent, under the combined turn system prompt, since
+    it already holds every user message alongside the assistant's questions. The outputs are
+    appended to the four histories exactly as in the multi-call mode, so the modes can be mixed
+    within a conversation.
+    """
+    history = user_conversation.questions
+    if history and history[0]["role"] == "system":
+        history = history[1:]
+    context = await build_context(user_conversation, "questions", [get_turn_system_role(user_conversation.topic)] + history)
+    response = await create_chat_completion(
+        messages=context,
+        call_site="turn",
+        response_format=TURN_RESPONSE_FORMAT,
+    )
+    question, summary, analyze, answers = parse_turn_outputs(response.choices[0].message.content)
+
+    user_conversation.questions.append({"role": "assistant", "content": question})
+    user_conversation.summaries.append({"role": "assistant", "content": summary})
+    user_conversation.analyze.append({"role": "assistant", "content": analyze})
+    user_conversation.answers.append({"role": "user", "content": prompt_for_possible_answers(question, summary)})
+    user_conversation.answers.append({"role": "assistant", "content": answers})
+
+    return question, summary, analyze, answers
+
+async def generate_responses(user_conversation: Conversation, concurrent: Optional[bool] = None, mode: Optional[str] = None):
+    if concurrent is None:
+        concurrent = CONCURRENT_RESPONSES
+    try:
+        responses = None
+        if (mode or TURN_MODE) == TURN_MODE_SINGLE:
+            try:
+                responses = await generate_responses_single_call(user_conversation)
+            except ValueError as e:
+                logger.warning(f"Single-call turn output for conversation {user_conversation.conversation_id} was invalid, falling back to one call per history: {e}")
+
+        if responses is None and concurrent:
+            responses = await generate_responses_concurrently(user_conversation)
+        elif responses is None:
+            responses = await generate_responses_sequentially(user_conversation)
+
+        await update_conversation(user_conversation)
+        return responses
     except Exception as e:
         logger.error(f"Error generating responses for conversation {user_conversation.conversation_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error while generating responses.")
 
 async def get_answer(responses: list):
     try:
-        answers_response = await client.chat.completions.create(
+        answers_response = await create_chat_completion(
             messages=responses.answers,
-            model="gpt-4o-mini",
+            call_site="answers",
         )
         ai_answers_response = answers_response.choices[0].message.content.strip()
         responses.answers.append({"role": "assistant", "content": ai_answers_response})
-
         await update_conversation(responses)
-
         return ai_answers_response
     except Exception as e:
         logger.error(f"Error generating title for responses: {responses}: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error while generating title.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error while generating title.")
@@ -1,4 +1,4 @@
-from app.openai_resolvers.openai_client import client
+from app.openai_resolvers.completions import create_chat_completion
 
 system_prompt = {
     "role": "system",
@@ -12,9 +12,9 @@ def create_client_role(sentences: list[str]) -> dict:
 async def ask_title(sentences: list[str]) -> dict:
     client_role = create_client_role(sentences)
     print(client_role)
-    return await client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[system_prompt, client_role]
+    return await create_chat_completion(
+        messages=[system_prompt, client_role],
+        call_site="title"
     )
 
 def retrieve_title(response: dict) -> str:
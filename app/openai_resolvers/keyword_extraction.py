@@ -107,6 +107,43 @@ Analyze the following individual's priorities and values based on their actions
 Here are the attributes to consider: Discovery, Accuracy, Achievement, Adventure, Charm, Power, Influence, Autonomy, Beauty, Victory, Challenge, Change, Comfort, Commitment, Compassion, Resistance, Helpfulness, Courtesy, Creation, Trust, Responsibility, Harmony, Excitement, Honesty, Fame, Family, Fitness, Flexibility, Forgiveness, Friendship, Fun, Generosity, Belief, Religion, Growth, Health, Cooperation, Honesty, Hope, Humility, Humor, Independence, Diligence, Peace, Intimacy, Fairness, Knowledge, Leisure, Being loved, Love, Mastery, Present, Moderation, Devotion, Rebellion, Helpfulness, Openness, Order, Passion, Joy, Popularity, Purpose, Rationality, Reality, Responsibility, Risk, Romance, Security, Acceptance, Self-control, Autonomy, Self-awareness, Devotion, Sexuality, Minimalism, Solitude, Spirituality, Stability, Tolerance, Tradition, Virtue, Wealth, Peace, Fulfillment, Truth, Dignity, Authenticity, Immersion, Effort, Conviction, Freedom, Expression, Oneness, Ingenuity, Professionalism, Flexibility, Leisure, Overcoming, Fellowship, Simplicity, etc."
 """
 
+structured_adviser_prompts = """
+Analyze the following individual's priorities and values based on their actions and context. Based on the information provided, determine which of the attributes below align with the individual's authentic values. Respond with a JSON object: "summary" is a paragraph summarizing the result of the analysis, and "values" lists each aligned attribute with an "explanation" of how it applies to them, a "label" (high, medium, or low) for how relevant it is to the individual, and its relevance "percentage" as a number from 0 to 100. Do not add conclusion sentences.
+
+Here are the attributes to consider: Discovery, Accuracy, Achievement, Adventure, Charm, Power, Influence, Autonomy, Beauty, Victory, Challenge, Change, Comfort, Commitment, Compassion, Resistance, Helpfulness, Courtesy, Creation, Trust, Responsibility, Harmony, Excitement, Honesty, Fame, Family, Fitness, Flexibility, Forgiveness, Friendship, Fun, Generosity, Belief, Religion, Growth, Health, Cooperation, Honesty, Hope, Humility, Humor, Independence, Diligence, Peace, Intimacy, Fairness, Knowledge, Leisure, Being loved, Love, Mastery, Present, Moderation, Devotion, Rebellion, Helpfulness, Openness, Order, Passion, Joy, Popularity, Purpose, Rationality, Reality, Responsibility, Risk, Romance, Security, Acceptance, Self-control, Autonomy, Self-awareness, Devotion, Sexuality, Minimalism, Solitude, Spirituality, Stability, Tolerance, Tradition, Virtue, Wealth, Peace, Fulfillment, Truth, Dignity, Authenticity, Immersion, Effort, Conviction, Freedom, Expression, Oneness, Ingenuity, Professionalism, Flexibility, Leisure, Overcoming, Fellowship, Simplicity, etc.
+"""
+
+# JSON schema the structured analysis is constrained to; parsed by analyze_service.parse_structured_analysis.
+ANALYSIS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "value_analysis",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "summary": {"type": "string"},
+                "values": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "attribute": {"type": "string"},
+                            "explanation": {"type": "string"},
+                            "label": {"type": "string", "enum": ["high", "medium", "low"]},
+                            "percentage": {"type": "number"},
+                        },
+                        "required": ["attribute", "explanation", "label", "percentage"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["summary", "values"],
+            "additionalProperties": False,
+        },
+    },
+}
+
 analyze_prompts = """
 Retrieve only following attributes out of the input text
 
@@ -115,8 +152,22 @@ The below is the list of the attributes that you need to extract from the input
 Discovery, Accuracy, Achievement, Adventure, Charm, Power, Influence, Autonomy, Beauty, Victory, Challenge, Change, Comfort, Commitment, Compassion, Resistance, Helpfulness, Courtesy, Creation, Trust, Responsibility, Harmony, Excitement, Honesty, Fame, Family, Fitness, Flexibility, Forgiveness, Friendship, Fun, Generosity, Belief, Religion, Growth, Health, Cooperation, Honesty, Hope, Humility, Humor, Independence, Diligence, Peace, Intimacy, Fairness, Knowledge, Leisure, Being loved, Love, Mastery, Present, Moderation, Devotion, Rebellion, Helpfulness, Openness, Order, Passion, Joy, Popularity, Purpose, Rationality, Reality, Responsibility, Risk, Romance, Security, Acceptance, Self-control, Autonomy, Self-awareness, Devotion, Sexuality, Minimalism, Solitude, Spirituality, Stability, Tolerance, Tradition, Virtue, Wealth, Peace, Fulfillment, Truth, Dignity, Authenticity, Immersion, Effort, Conviction, Freedom, Expression, Oneness, Ingenuity, Professionalism, Flexibility, Leisure, Overcoming, Fellowship, Simplicity
 """
 
-from typing import List, Dict
-from app.openai_resolvers.openai_client import client
+import os
+from typing import List, Dict, Optional
+from app.openai_resolvers.batch_executor import BatchItemResult, run_batch
+from app.openai_resolvers.completions import create_chat_completion
+from app.services.attribute_matcher import AttributeMatcher
+
+KEYWORDS_MAX_IN_FLIGHT = int(os.getenv("KEYWORDS_MAX_IN_FLIGHT", 4))
+# "json" asks for schema-constrained analysis output, "text" for the numbered list format.
+ANALYSIS_OUTPUT_MODE = os.getenv("ANALYSIS_OUTPUT_MODE", "json")
+ANALYSIS_STRUCTURED = ANALYSIS_OUTPUT_MODE == "json"
+# "local" matches the attributes catalog without calling the model and only sends texts it
+# cannot match confidently to the LLM; "llm" sends every text to the LLM.
+KEYWORD_EXTRACTOR = os.getenv("KEYWORD_EXTRACTOR", "local")
+
+# Built once at startup; matching a batch of texts takes milliseconds.
+attribute_matcher = AttributeMatcher(attributes)
 
 PROMPT_TEMPLATE = """
 Extract only the keywords that represent the most important traits, values, or actions of the subject from the following text. Show only the keywords, without additional context or sentences. The output should be a list of keywords separated by commas.
@@ -140,36 +191,66 @@ def create_prompts_for_multiple_sentences(analyze: List[str]) -> List[Dict[str,
         for sentence in analyze
     ]
 
-def create_prompt_for_single_sentence(sentence: str) -> List[Dict[str, str]]:
+def create_prompt_for_single_sentence(sentence: str, structured: bool = False) -> List[Dict[str, str]]:
     """
     Generates keyword extraction prompts for a single sentence with separate roles.
 
     Args:
         sentence (str): The sentence to analyze.
+        structured (bool): Ask for the JSON analysis format of ANALYSIS_RESPONSE_FORMAT
+            instead of the numbered list.
 
     Returns:
         List[Dict[str, str]]: A list of role-based prompts for the chat API.
     """
     return [
-        {"role": "system", "content": adviser_prompts},
+        {"role": "system", "content": structured_adviser_prompts if structured else adviser_prompts},
         {"role": "user", "content": sentence}
     ]
 
-async def fetch_keywords_from_api_only_one(extract_roles: List[Dict[str, str]]):
+async def fetch_keywords_from_api_only_one(extract_roles: List[Dict[str, str]], structured: bool = False):
     """
     Fetches keywords from the API for a single role-based prompt.
 
     Args:
         extract_roles (List[Dict[str, str]]): Role-based prompts for the API.
+        structured (bool): Constrain the output to ANALYSIS_RESPONSE_FORMAT.
 
     Returns:
         Response object from the API.
     """
-    return await client.chat.completions.create(
+    params = {"response_format": ANALYSIS_RESPONSE_FORMAT} if structured else {}
+    return await create_chat_completion(
         messages=extract_roles,
-        model="gpt-4o-mini"
+        call_site="analysis",
+        **params
     )
 
+async def fetch_keywords_batch(
+    extract_roles: List[Dict[str, str]],
+    max_in_flight: int = KEYWORDS_MAX_IN_FLIGHT,
+    max_retries: int = 0,
+) -> List[BatchItemResult]:
+    """
+    Fetches keywords from the API for multiple prompts with bounded concurrency.
+
+    Args:
+        extract_roles (List[Dict[str, str]]): A list of prompts for the API.
+        max_in_flight (int): Maximum number of requests outstanding at once.
+        max_retries (int): Extra retries of a failed prompt on top of the resilience layer,
+            which already retries each completion (LLM_KEYWORDS_MAX_RETRIES).
+
+    Returns:
+        List[BatchItemResult]: One result per prompt, in order. Failed prompts carry their error.
+    """
+    async def fetch_one(extract_role: Dict[str, str]):
+        return await create_chat_completion(
+            messages=[extract_role],
+            call_site="keywords"
+        )
+
+    return await run_batch(extract_roles, fetch_one, max_in_flight=max_in_flight, max_retries=max_retries)
+
 async def fetch_keywords_from_api(extract_roles: List[Dict[str, str]]) -> List:
     """
     Fetches keywords from the API for multiple prompts.
@@ -179,13 +260,44 @@ async def fetch_keywords_from_api(extract_roles: List[Dict[str, str]]) -> List:
 
     Returns:
         List: A list of responses from the API.
+
+    Raises:
+        Exception: The error of the first prompt that still failed after retries.
     """
-    # Use list comprehension for asynchronous calls and collect responses
-    return [
-        await client.chat.completions.create(
-            messages=[extract_role],
-            model="gpt-4o-mini"
-        )
-        for extract_role in extract_roles
-    ]
+    results = await fetch_keywords_batch(extract_roles)
+    for result in results:
+        if not result.ok:
+            raise result.error
+    return [result.value for result in results]
+
+async def extract_keywords_batch(analyze: List[str], extractor: Optional[str] = None) -> List[BatchItemResult]:
+    """
+    Extracts the keywords of each text with the configured extractor. With the local
+    extractor the texts are matched against the attributes catalog, and only those without a
+    confident match are sent to the LLM.
+
+    Args:
+        analyze (List[str]): The texts to extract keywords from.
+        extractor (Optional[str]): "local" or "llm", defaults to KEYWORD_EXTRACTOR.
+
+    Returns:
+        List[BatchItemResult]: One result per text, in order, whose value is the comma-separated
+        keywords. Texts the LLM failed on carry its error.
+    """
+    if (extractor or KEYWORD_EXTRACTOR) == "local":
+        local_keywords = attribute_matcher.extract_keywords(analyze)
+    else:
+        local_keywords = [None] * len(analyze)
 
+    results = [BatchItemResult(index=index, value=keywords) for index, keywords in enumerate(local_keywords)]
+    fallback_indexes = [index for index, keywords in enumerate(local_keywords) if keywords is None]
+    if fallback_indexes:
+        prompts = create_prompts_for_multiple_sentences([analyze[index] for index in fallback_indexes])
+        for index, result in zip(fallback_indexes, await fetch_keywords_batch(prompts)):
+            results[index] = BatchItemResult(
+                index=index,
+                value=result.value.choices[0].message.content.strip() if result.ok else None,
+                error=result.error,
+                attempts=result.attempts,
+            )
+    return results
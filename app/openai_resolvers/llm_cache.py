@@ -0,0 +1,194 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from openai.types.chat import ChatCompletion
+from app.packages.database import llm_cache_collection
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1024))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+LLM_CACHE_MONGO_ENABLED = os.getenv("LLM_CACHE_MONGO_ENABLED", "false").lower() == "true"
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    tokens_saved: int = 0
+
+
+def make_cache_key(model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+    """
+    Builds a content-addressed key from everything that determines the completion.
+    """
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def get_total_tokens(response: Any) -> int:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", 0) or 0
+
+def estimate_size(response: Any) -> int:
+    if hasattr(response, "model_dump_json"):
+        return len(response.model_dump_json())
+    return sys.getsizeof(response)
+
+
+class LRUCache:
+    """
+    In-process LRU cache with a per-entry TTL, bounded by entry count and approximate size in bytes.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.size_bytes = 0
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        expires_at, value, size = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats.hits += 1
+        self.stats.tokens_saved += get_total_tokens(value)
+        return value
+
+    def set(self, key: str, value: Any):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (time.monotonic() + self.ttl_seconds, value, size)
+        self.size_bytes += size
+        while len(self.entries) > self.max_entries or self.size_bytes > self.max_bytes:
+            oldest_key = next(iter(self.entries))
+            self._remove(oldest_key)
+            self.stats.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.size_bytes = 0
+        self.stats = CacheStats()
+
+    def _remove(self, key: str):
+        _, _, size = self.entries.pop(key)
+        self.size_bytes -= size
+
+
+class MongoCache:
+    """
+    Shared cache tier stored in the llm_cache collection so that every worker benefits from a hit.
+    Responses are stored as plain dictionaries and rebuilt as ChatCompletion objects. Expired
+    entries are removed by the llm_cache TTL index declared in app.packages.indexes.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.collection = llm_cache_collection
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+
+    async def get(self, key: str) -> Optional[Any]:
+        document = await self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}})
+        if not document:
+            self.stats.misses += 1
+            return None
+        response = ChatCompletion.model_validate(document["response"])
+        self.stats.hits += 1
+        self.stats.tokens_saved += get_total_tokens(response)
+        return response
+
+    async def set(self, key: str, value: Any):
+        if not hasattr(value, "model_dump"):
+            return
+        await self.collection.update_one(
+            {"_id": key},
+            {"$set": {
+                "response": value.model_dump(),
+                "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds),
+            }},
+            upsert=True
+        )
+
+
+class LLMResponseCache:
+    """
+    Two-tier response cache: the in-process LRU is consulted first, then the optional Mongo tier.
+    Counters are kept per tier and per call site.
+    """
+
+    def __init__(self, memory: LRUCache, mongo: Optional[MongoCache] = None):
+        self.memory = memory
+        self.mongo = mongo
+        self.call_sites: Dict[str, CacheStats] = {}
+
+    def _call_site_stats(self, call_site: str) -> CacheStats:
+        return self.call_sites.setdefault(call_site, CacheStats())
+
+    async def get(self, key: str, call_site: str) -> Optional[Any]:
+        stats = self._call_site_stats(call_site)
+        value = self.memory.get(key)
+        if value is None and self.mongo is not None:
+            try:
+                value = await self.mongo.get(key)
+            except Exception as e:
+                logger.warning(f"LLM cache lookup in MongoDB failed: {e}")
+            if value is not None:
+                self.memory.set(key, value)
+        if value is None:
+            stats.misses += 1
+            return None
+        stats.hits += 1
+        stats.tokens_saved += get_total_tokens(value)
+        return value
+
+    async def set(self, key: str, value: Any):
+        self.memory.set(key, value)
+        if self.mongo is not None:
+            try:
+                await self.mongo.set(key, value)
+            except Exception as e:
+                logger.warning(f"LLM cache write to MongoDB failed: {e}")
+
+    def clear(self):
+        self.memory.clear()
+        self.call_sites = {}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "memory": {**asdict(self.memory.stats), "entries": len(self.memory.entries), "size_bytes": self.memory.size_bytes},
+            "mongo": asdict(self.mongo.stats) if self.mongo is not None else None,
+            "call_sites": {call_site: asdict(stats) for call_site, stats in self.call_sites.items()},
+        }
+
+
+llm_cache = LLMResponseCache(
+    memory=LRUCache(
+        max_entries=LLM_CACHE_MAX_ENTRIES,
+        max_bytes=LLM_CACHE_MAX_BYTES,
+        ttl_seconds=LLM_CACHE_TTL_SECONDS,
+    ),
+    mongo=MongoCache(ttl_seconds=LLM_CACHE_TTL_SECONDS) if LLM_CACHE_MONGO_ENABLED else None,
+)
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from openai import APITimeoutError, RateLimitError
+from app.openai_resolvers.resilience import CircuitOpenError
+
+LLM_METRICS_ENABLED = os.getenv("LLM_METRICS_ENABLED", "true").lower() == "true"
+
+# Upper bounds in seconds of the latency histogram buckets.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+OUTCOME_OK = "ok"
+OUTCOME_CACHED = "cached"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_RATE_LIMITED = "rate_limited"
+OUTCOME_CIRCUIT_OPEN = "circuit_open"
+OUTCOME_ERROR = "error"
+
+UNKNOWN_TOPIC = "unknown"
+
+current_llm_topic: ContextVar[Optional[str]] = ContextVar("current_llm_topic", default=None)
+
+
+def bind_llm_topic(topic: Optional[str]):
+    """
+    Labels the LLM calls made by the rest of this request with the conversation topic.
+    """
+    current_llm_topic.set(topic)
+
+def classify_outcome(error: BaseException) -> str:
+    if isinstance(error, (asyncio.TimeoutError, APITimeoutError)):
+        return OUTCOME_TIMEOUT
+    if isinstance(error, RateLimitError):
+        return OUTCOME_RATE_LIMITED
+    if isinstance(error, CircuitOpenError):
+        return OUTCOME_CIRCUIT_OPEN
+    return OUTCOME_ERROR
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def get(self, labels: Tuple[str, ...]) -> float:
+        return self.values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{format_labels(self.label_names, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # Per label set: the count per bucket (not cumulative), the sum and the count.
+        self.values: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        bucket_counts, total, count = self.values.get(labels) or ([0] * len(self.buckets), 0.0, 0)
+        for index, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                bucket_counts[index] += 1
+                break
+        self.values[labels] = (bucket_counts, total + value, count + 1)
+
+    def count(self, labels: Tuple[str, ...]) -> int:
+        return self.values[labels][2] if labels in self.values else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (bucket_counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                bucket_labels = format_labels(self.label_names, labels, 'le="%g"' % upper_bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = format_labels(self.label_names, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {total:g}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class LLMMetrics:
+    """
+    Latency, time-to-first-token, token usage and outcome of every chat completion, labelled
+    by call site, conversation topic and model, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.requests = Counter(
+            "llm_requests_total", "Chat completions by outcome.",
+            ("call_site", "topic", "model", "outcome"),
+        )
+        self.duration = Histogram(
+            "llm_request_duration_seconds", "Wall time of a chat completion, including queueing and retries.",
+            ("call_site", "topic", "model", "outcome"),
+        )
+        self.time_to_first_token = Histogram(
+            "llm_time_to_first_token_seconds", "Time until the first chunk of a streamed chat completion.",
+            ("call_site", "topic", "model"),
+        )
+        self.tokens = Counter(
+            "llm_tokens_total", "Tokens reported in the usage of chat completions.",
+            ("call_site", "topic", "model", "kind"),
+        )
+
+    def record(self, call_site: str, model: str, outcome: str, duration: float, response: Any = None, topic: Optional[str] = None):
+        topic = topic or current_llm_topic.get() or UNKNOWN_TOPIC
+        self.requests.inc((call_site, topic, model, outcome))
+        self.duration.observe((call_site, topic, model, outcome), duration)
+        usage = getattr(response, "usage", None)
+        if usage is not None and outcome != OUTCOME_CACHED:
+            self.tokens.inc((call_site, topic, model, "prompt"), getattr(usage, "prompt_tokens", 0) or 0)
+            self.tokens.inc((call_site, topic, model, "completion"), getattr(usage, "completion_tokens", 0) or 0)
+
+    def record_first_token(self, call_site: str, model: str, seconds: float, topic: Optional[str] = None):
+        topic = topic or current_llm_topic.get() or UNKNOWN_TOPIC
+        self.time_to_first_token.observe((call_site, topic, model), seconds)
+
+    def instrument_stream(self, stream: AsyncIterator[Any], call_site: str, model: str, started: float) -> "InstrumentedStream":
+        return InstrumentedStream(self, stream, call_site, model, started)
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.requests, self.duration, self.time_to_first_token, self.tokens):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class InstrumentedStream:
+    """
+    Wraps a completion stream to record the time to the first chunk, and the wall time,
+    outcome and usage (from the final chunk, when the stream includes it) once it ends.
+    """
+
+    def __init__(self, metrics: LLMMetrics, stream: AsyncIterator[Any], call_site: str, model: str, started: float):
+        self.metrics = metrics
+        self.stream = stream
+        self.call_site = call_site
+        self.model = model
+        self.started = started
+        # The topic is read now, since the stream may be consumed outside the request context.
+        self.topic = current_llm_topic.get()
+
+    def __getattr__(self, name: str):
+        return getattr(self.stream, name)
+
+    def __aiter__(self):
+        return self.iterate()
+
+    async def iterate(self):
+        first_chunk = True
+        usage_chunk = None
+        try:
+            async for chunk in self.stream:
+                if first_chunk:
+                    self.metrics.record_first_token(self.call_site, self.model, time.monotonic() - self.started, topic=self.topic)
+                    first_chunk = False
+                if getattr(chunk, "usage", None) is not None:
+                    usage_chunk = chunk
+                yield chunk
+        except Exception as e:
+            self.metrics.record(self.call_site, self.model, classify_outcome(e), time.monotonic() - self.started, topic=self.topic)
+            raise
+        self.metrics.record(self.call_site, self.model, OUTCOME_OK, time.monotonic() - self.started, usage_chunk, topic=self.topic)
+
+
+llm_metrics = LLMMetrics()
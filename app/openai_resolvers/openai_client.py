@@ -1,9 +1,33 @@
 import os
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from dotenv import load_dotenv
+from app.openai_resolvers.fake_client import FakeAsyncOpenAI
+from app.openai_resolvers.rate_limiter import rate_scheduler
 
 load_dotenv()
 
-client = AsyncOpenAI(
-    api_key=os.environ['OPENAI_API_KEY'],  # this is also the default, it can be omitted
-)
\ No newline at end of file
+# Selects the LLM backend: "openai" talks to the OpenAI API, "fake" uses the local
+# deterministic stand-in so the app can run and be load-tested without an API key.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+
+async def observe_rate_limits(response):
+    # Feeds the x-ratelimit-* headers of every API response back into the rate scheduler.
+    rate_scheduler.observe_response(response.status_code, response.headers)
+
+def create_client(backend: str = LLM_BACKEND):
+    """
+    Builds the chat client for the configured backend. Every backend exposes the
+    AsyncOpenAI interface used by the app: `await client.chat.completions.create(...)`.
+    """
+    if backend == "openai":
+        return AsyncOpenAI(
+            api_key=os.environ['OPENAI_API_KEY'],  # this is also the default, it can be omitted
+            # Retries are handled per call site by the resilience layer in completions.py.
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(event_hooks={"response": [observe_rate_limits]}),
+        )
+    if backend == "fake":
+        return FakeAsyncOpenAI()
+    raise ValueError(f"Unknown LLM backend: {backend}")
+
+client = create_client()
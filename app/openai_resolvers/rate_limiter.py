@@ -0,0 +1,212 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional
+from app.services.token_counter import count_message_tokens
+
+logger = logging.getLogger(__name__)
+
+LLM_RATE_LIMIT_ENABLED = os.getenv("LLM_RATE_LIMIT_ENABLED", "true").lower() == "true"
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 500))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", 200000))
+# Completion tokens assumed for a request that does not set max_tokens.
+LLM_ESTIMATED_COMPLETION_TOKENS = int(os.getenv("LLM_ESTIMATED_COMPLETION_TOKENS", 300))
+
+# Lower runs first: interactive turns beat the analysis page, which beats background work.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_ANALYSIS = 1
+PRIORITY_BACKGROUND = 2
+
+CALL_SITE_PRIORITIES = {
+    "question": PRIORITY_INTERACTIVE,
+    "summary": PRIORITY_INTERACTIVE,
+    "analyze": PRIORITY_INTERACTIVE,
+    "answers": PRIORITY_INTERACTIVE,
+    "context": PRIORITY_INTERACTIVE,
+    "turn": PRIORITY_INTERACTIVE,
+    "analysis": PRIORITY_ANALYSIS,
+    "keywords": PRIORITY_BACKGROUND,
+    "title": PRIORITY_BACKGROUND,
+    "batch": PRIORITY_BACKGROUND,
+}
+
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to `capacity` tokens and refills continuously at
+    `refill_per_second`. The level may go negative when actual usage exceeds an estimate,
+    which delays the following requests until the debt is refilled.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.level = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def seconds_until(self, amount: float) -> float:
+        self.refill()
+        # A request larger than the whole bucket only has to wait for a full bucket.
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.refill_per_second) if self.refill_per_second > 0 else float("inf")
+
+    def take(self, amount: float):
+        self.refill()
+        self.level -= amount
+
+    def clamp(self, remaining: float):
+        self.refill()
+        self.level = min(self.level, remaining)
+
+    def set_capacity(self, capacity: float, per_seconds: float = 60.0):
+        self.refill()
+        self.capacity = capacity
+        self.refill_per_second = capacity / per_seconds
+        self.level = min(self.level, capacity)
+
+
+@dataclass(order=True)
+class Waiter:
+    priority: int
+    sequence: int
+    tokens: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False, default_factory=time.monotonic)
+
+
+def estimate_request_tokens(messages: List[Dict[str, str]], params: Mapping[str, Any]) -> int:
+    return count_message_tokens(messages) + int(params.get("max_tokens") or LLM_ESTIMATED_COMPLETION_TOKENS)
+
+def parse_reset_seconds(value: str) -> Optional[float]:
+    """Parses OpenAI reset durations such as "20ms", "1s" or "6m0s"."""
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", value or "")
+    if not parts:
+        return None
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+class RateBudgetScheduler:
+    """
+    Shapes LLM traffic to the provider's requests-per-minute and tokens-per-minute budgets.
+
+    Every call acquires a request and its estimated tokens from two token buckets before it is
+    sent. Callers that cannot be served yet wait in a priority queue, so interactive turns go
+    out before keyword extraction and titles. The buckets follow the provider's rate-limit
+    headers, and a 429 pauses dispatching for its Retry-After.
+    """
+
+    def __init__(self, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE, tokens_per_minute: float = LLM_TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self.configured_requests = requests_per_minute
+        self.configured_tokens = tokens_per_minute
+        self.waiters: List[Waiter] = []
+        self.sequence = itertools.count()
+        self.paused_until = 0.0
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.waited_seconds = 0.0
+        self.granted = 0
+
+    def queue_depth(self) -> int:
+        return sum(1 for waiter in self.waiters if not waiter.future.done())
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "queue_depth": self.queue_depth(),
+            "granted": self.granted,
+            "average_wait_seconds": self.waited_seconds / self.granted if self.granted else 0.0,
+            "requests_available": self.requests.level,
+            "tokens_available": self.tokens.level,
+        }
+
+    async def acquire(self, call_site: str, tokens: int):
+        priority = CALL_SITE_PRIORITIES.get(call_site, PRIORITY_ANALYSIS)
+        waiter = Waiter(priority, next(self.sequence), tokens, asyncio.get_running_loop().create_future())
+        heapq.heappush(self.waiters, waiter)
+        self.dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just before the caller went away; hand the budget back.
+                self.requests.take(-1)
+                self.tokens.take(-tokens)
+            waiter.future.cancel()
+            self.dispatch()
+            raise
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """Corrects the token bucket once the real usage of a request is known."""
+        if isinstance(actual_tokens, int) and actual_tokens:
+            self.tokens.take(actual_tokens - estimated_tokens)
+
+    def dispatch(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        while self.waiters:
+            head = self.waiters[0]
+            if head.future.done():
+                heapq.heappop(self.waiters)
+                continue
+            wait = max(
+                self.paused_until - time.monotonic(),
+                self.requests.seconds_until(1),
+                self.tokens.seconds_until(head.tokens),
+            )
+            if wait > 0:
+                self.timer = asyncio.get_running_loop().call_later(wait, self.dispatch)
+                return
+            heapq.heappop(self.waiters)
+            self.requests.take(1)
+            self.tokens.take(head.tokens)
+            self.granted += 1
+            self.waited_seconds += time.monotonic() - head.enqueued_at
+            head.future.set_result(None)
+
+    def observe_response(self, status_code: int, headers: Mapping[str, str]):
+        """Adapts the buckets to the x-ratelimit-* headers of a provider response."""
+        limit_requests = headers.get("x-ratelimit-limit-requests")
+        limit_tokens = headers.get("x-ratelimit-limit-tokens")
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        try:
+            # The configured budgets are an upper bound; the provider may only lower them.
+            if limit_requests is not None and float(limit_requests) < self.requests.capacity:
+                self.requests.set_capacity(min(float(limit_requests), self.configured_requests))
+            if limit_tokens is not None and float(limit_tokens) < self.tokens.capacity:
+                self.tokens.set_capacity(min(float(limit_tokens), self.configured_tokens))
+            if remaining_requests is not None:
+                self.requests.clamp(float(remaining_requests))
+            if remaining_tokens is not None:
+                self.tokens.clamp(float(remaining_tokens))
+        except ValueError:
+            logger.warning(f"Ignoring malformed rate-limit headers: {dict(headers)}")
+
+        if status_code == 429:
+            retry_after = headers.get("retry-after")
+            pause = None
+            try:
+                pause = float(retry_after) if retry_after is not None else None
+            except ValueError:
+                pass
+            if pause is None:
+                pause = parse_reset_seconds(headers.get("x-ratelimit-reset-requests") or headers.get("x-ratelimit-reset-tokens") or "")
+            if pause:
+                logger.warning(f"Provider rate limit hit, pausing LLM dispatch for {pause:.2f}s")
+                self.paused_until = max(self.paused_until, time.monotonic() + pause)
+
+
+rate_scheduler = RateBudgetScheduler()
@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import math
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+BeforeAttempt = Callable[[], Awaitable[None]]
+
+# Call sites share a policy per group: the four turn completions (and context folding) are
+# latency critical, the analysis page, keyword extraction and titles can afford to wait.
+CALL_SITE_GROUPS = {
+    "question": "turn",
+    "summary": "turn",
+    "analyze": "turn",
+    "answers": "turn",
+    "context": "turn",
+    "turn": "turn",
+    "analysis": "analyze",
+    "keywords": "keywords",
+    "title": "title",
+}
+
+DEFAULT_TIMEOUTS = {"turn": 30.0, "analyze": 90.0, "keywords": 30.0, "title": 15.0, "default": 60.0}
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, group: str, retry_in: float):
+        self.group = group
+        self.retry_in = retry_in
+        self.message = f"Circuit for {group} LLM calls is open, retry in {retry_in:.1f}s"
+        super().__init__(self.message)
+
+
+@dataclass
+class CallSitePolicy:
+    """
+    Attributes:
+        timeout (float): Seconds a single attempt may take before it is abandoned.
+        max_retries (int): Retries after the first attempt for retryable errors.
+        backoff_base (float): First backoff delay in seconds, doubled on every retry.
+        backoff_max (float): Upper bound of a single backoff delay.
+        hedge (bool): Whether to fire a duplicate request when the first one is slower than usual.
+        hedge_min_delay (float): Hedge delay used until enough latencies were observed for a p95.
+    """
+    timeout: float
+    max_retries: int = 2
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    hedge: bool = False
+    hedge_min_delay: float = 2.0
+
+    @classmethod
+    def from_env(cls, group: str) -> "CallSitePolicy":
+        prefix = f"LLM_{group.upper()}_"
+        return cls(
+            timeout=float(os.getenv(f"{prefix}TIMEOUT_SECONDS", DEFAULT_TIMEOUTS.get(group, DEFAULT_TIMEOUTS["default"]))),
+            max_retries=int(os.getenv(f"{prefix}MAX_RETRIES", 2)),
+            backoff_base=float(os.getenv(f"{prefix}BACKOFF_BASE_SECONDS", 0.5)),
+            backoff_max=float(os.getenv(f"{prefix}BACKOFF_MAX_SECONDS", 8)),
+            hedge=os.getenv(f"{prefix}HEDGE", "false").lower() == "true",
+            hedge_min_delay=float(os.getenv(f"{prefix}HEDGE_MIN_DELAY_SECONDS", 2)),
+        )
+
+
+class CircuitBreaker:
+    """
+    Opens when the failure ratio over the recent window crosses the threshold, fails fast while
+    open, and lets a single trial call through after the cooldown (half-open) to decide whether
+    to close again.
+    """
+
+    def __init__(self, failure_ratio: float = 0.5, min_calls: int = 10, window_seconds: float = 30.0, cooldown_seconds: float = 30.0):
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.outcomes: Deque[Tuple[float, bool]] = deque()
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self, group: str):
+        state = self.state
+        if state == "open":
+            raise CircuitOpenError(group, self.cooldown_seconds - (time.monotonic() - self.opened_at))
+        if state == "half_open":
+            if self.trial_in_flight:
+                raise CircuitOpenError(group, 0.0)
+            self.trial_in_flight = True
+
+    def cancel_trial(self):
+        self.trial_in_flight = False
+
+    def record(self, success: bool):
+        now = time.monotonic()
+        if self.opened_at is not None:
+            self.trial_in_flight = False
+            if success:
+                self.opened_at = None
+                self.outcomes.clear()
+            else:
+                self.opened_at = now
+            return
+
+        self.outcomes.append((now, success))
+        while self.outcomes and now - self.outcomes[0][0] > self.window_seconds:
+            self.outcomes.popleft()
+        failures = sum(1 for _, ok in self.outcomes if not ok)
+        if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.failure_ratio:
+            logger.warning(f"Opening LLM circuit after {failures} failures in {len(self.outcomes)} calls")
+            self.opened_at = now
+
+
+class LatencyTracker:
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.samples: Deque[float] = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)]
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, APITimeoutError, APIConnectionError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+def get_retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class ResilientCaller:
+    """
+    Wraps LLM calls with a per-call-site timeout, jittered exponential backoff on 429/5xx and
+    timeouts, a circuit breaker per call-site group and optional hedged requests.
+    """
+
+    def __init__(self):
+        self.policies: Dict[str, CallSitePolicy] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latencies: Dict[str, LatencyTracker] = {}
+
+    def reset(self):
+        self.policies.clear()
+        self.breakers.clear()
+        self.latencies.clear()
+
+    def group_of(self, call_site: str) -> str:
+        return CALL_SITE_GROUPS.get(call_site, "default")
+
+    def policy(self, group: str) -> CallSitePolicy:
+        if group not in self.policies:
+            self.policies[group] = CallSitePolicy.from_env(group)
+        return self.policies[group]
+
+    def breaker(self, group: str) -> CircuitBreaker:
+        return self.breakers.setdefault(group, CircuitBreaker())
+
+    def latency(self, group: str) -> LatencyTracker:
+        return self.latencies.setdefault(group, LatencyTracker())
+
+    def backoff_delay(self, policy: CallSitePolicy, attempt: int, error: BaseException) -> float:
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, policy.backoff_max)
+        # Full jitter keeps retries from many workers from arriving in lockstep.
+        return random.uniform(0, min(policy.backoff_max, policy.backoff_base * (2 ** attempt)))
+
+    async def attempt(self, group: str, policy: CallSitePolicy, call: Callable[[], Awaitable[T]], before_attempt: Optional[BeforeAttempt] = None) -> T:
+        if before_attempt is not None:
+            # Time spent waiting for rate budget does not count against the attempt's timeout.
+            await before_attempt()
+        started = time.monotonic()
+        result = await asyncio.wait_for(call(), timeout=policy.timeout)
+        self.latency(group).observe(time.monotonic() - started)
+        return result
+
+    async def hedged_attempt(self, group: str, policy: CallSitePolicy, call: Callable[[], Awaitable[T]], before_attempt: Optional[BeforeAttempt] = None) -> T:
+        if before_attempt is not None:
+            # The hedge delay measures the call itself, not the wait for rate budget.
+            await before_attempt()
+        hedge_delay = self.latency(group).p95() or policy.hedge_min_delay
+        pending = {asyncio.create_task(self.attempt(group, policy, call))}
+        error: Optional[BaseException] = None
+        # Outstanding attempts are cancelled however this returns, including when the caller
+        # itself is cancelled, so no orphaned call keeps holding rate and queue budget.
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+            if not done:
+                logger.info(f"Hedging {group} LLM call after {hedge_delay:.2f}s")
+                pending.add(asyncio.create_task(self.attempt(group, policy, call, before_attempt)))
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, call_site: str, call: Callable[[], Awaitable[T]], hedge: bool = True, before_attempt: Optional[BeforeAttempt] = None) -> T:
+        group = self.group_of(call_site)
+        policy = self.policy(group)
+        breaker = self.breaker(group)
+
+        for attempt in range(policy.max_retries + 1):
+            breaker.before_call(group)
+            try:
+                if hedge and policy.hedge:
+                    result = await self.hedged_attempt(group, policy, call, before_attempt)
+                else:
+                    result = await self.attempt(group, policy, call, before_attempt)
+                breaker.record(True)
+                return result
+            except asyncio.CancelledError:
+                breaker.cancel_trial()
+                raise
+            except Exception as e:
+                retryable = is_retryable(e)
+                if retryable:
+                    breaker.record(False)
+                else:
+                    # Only upstream trouble counts against the circuit. A bad request is neither
+                    # a failure nor a success, so it must not close a half-open circuit either.
+                    breaker.cancel_trial()
+                if not retryable or attempt == policy.max_retries:
+                    raise
+                delay = self.backoff_delay(policy, attempt, e)
+                logger.warning(f"Retrying {call_site} LLM call in {delay:.2f}s after attempt {attempt + 1} failed: {e!r}")
+                await asyncio.sleep(delay)
+
+
+resilient_caller = ResilientCaller()
@@ -0,0 +1,104 @@
+import asyncio
+from typing import AsyncIterator, Dict, List, Tuple
+from app.openai_resolvers.generate_responses import prompt_for_possible_answers
+from app.openai_resolvers.get_title import create_client_role, system_prompt as title_system_prompt
+from app.openai_resolvers.completions import create_chat_completion
+from app.services.context_window import build_context
+from app.type import Conversation
+
+
+async def stream_ai_response(messages, model=None, call_site="turn") -> AsyncIterator[str]:
+    """
+    Streams a chat completion and yields the content deltas as they arrive.
+    """
+    stream = await create_chat_completion(
+        messages=messages,
+        model=model,
+        call_site=call_site,
+        stream=True,
+        # The final chunk then carries the token usage, recorded in the LLM metrics.
+        stream_options={"include_usage": True},
+    )
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+async def stream_responses(user_conversation: Conversation, generate_title: bool) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Streams the question, summary, analyze and possible-answers completions of a turn, and
+    the title when requested, as (event, delta) pairs in the order the tokens arrive.
+
+    Question, summary and analyze start immediately. The possible-answers completion starts
+    once the question and summary are complete, and the title once the summary is complete.
+    The full responses are appended to the conversation only after every stream finished.
+
+    Args:
+        user_conversation (Conversation): The conversation holding the four message histories.
+        generate_title (bool): Whether to stream a title generated from the summary.
+
+    Yields:
+        Tuple[str, str]: The event name ("question", "summary", "analyze", "answers" or "title") and the delta.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    results: Dict[str, str] = {}
+    answers_prompt = {}
+
+    async def run(event: str, messages: List[Dict[str, str]], history_name: str = None):
+        if history_name:
+            messages = await build_context(user_conversation, history_name, messages)
+        parts = []
+        async for delta in stream_ai_response(messages, call_site=event):
+            parts.append(delta)
+            await queue.put((event, delta))
+        results[event] = "".join(parts).strip()
+
+    async def run_answers(dependencies):
+        await asyncio.gather(*dependencies)
+        answers_prompt.update({"role": "user", "content": prompt_for_possible_answers(results["question"], results["summary"])})
+        await run("answers", user_conversation.answers + [answers_prompt], "answers")
+
+    async def run_title(dependency):
+        await dependency
+        await run("title", [title_system_prompt, create_client_role([results["summary"]])])
+
+    async def run_turn():
+        question = asyncio.create_task(run("question", user_conversation.questions, "questions"))
+        summary = asyncio.create_task(run("summary", user_conversation.summaries, "summaries"))
+        tasks = [
+            question,
+            summary,
+            asyncio.create_task(run("analyze", user_conversation.analyze, "analyze")),
+            asyncio.create_task(run_answers([question, summary])),
+        ]
+        if generate_title:
+            tasks.append(asyncio.create_task(run_title(summary)))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    turn = asyncio.create_task(run_turn())
+    turn.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            yield item
+        turn.result()
+    finally:
+        if not turn.done():
+            turn.cancel()
+
+    user_conversation.questions.append({"role": "assistant", "content": results["question"]})
+    user_conversation.summaries.append({"role": "assistant", "content": results["summary"]})
+    user_conversation.analyze.append({"role": "assistant", "content": results["analyze"]})
+    user_conversation.answers.append(answers_prompt)
+    user_conversation.answers.append({"role": "assistant", "content": results["answers"]})
+    if generate_title:
+        user_conversation.title = results["title"]
@@ -13,3 +13,6 @@ mongo_client = AsyncIOMotorClient(os.getenv("MONGODB_URI"))
 db = mongo_client.get_database(os.getenv("MONGODB_DB_NAME"))
 conversation_collection = db.get_collection("conversations")
 users_collection = db.get_collection("users")
+llm_cache_collection = db.get_collection("llm_cache")
+leases_collection = db.get_collection("leases")
+user_value_profiles_collection = db.get_collection("user_value_profiles")
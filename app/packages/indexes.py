@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from app.packages.database import db
+
+logger = logging.getLogger(__name__)
+
+# Create missing indexes when the app starts. Creation is idempotent; failures are logged and
+# do not stop the app.
+MONGODB_ENSURE_INDEXES = os.getenv("MONGODB_ENSURE_INDEXES", "true").lower() == "true"
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """
+    Attributes:
+        collection (str): The collection the index belongs to.
+        name (str): The index name, used to match declared and existing indexes.
+        keys (Tuple[Tuple[str, int], ...]): The indexed fields and their directions.
+        options (Dict[str, Any]): createIndex options such as unique or partialFilterExpression.
+        reason (str): The queries the index serves.
+    """
+    collection: str
+    name: str
+    keys: Tuple[Tuple[str, int], ...]
+    options: Dict[str, Any] = field(default_factory=dict)
+    reason: str = ""
+
+    def model(self) -> IndexModel:
+        return IndexModel(list(self.keys), name=self.name, **self.options)
+
+
+# Every index the app relies on, in one place.
+REQUIRED_INDEXES: List[IndexSpec] = [
+    IndexSpec(
+        collection="conversations",
+        name="user_id_updated_at",
+        keys=(("user_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)),
+        reason="list_user_conversations: a user's conversations, most recently updated first, paged on (updated_at, _id).",
+    ),
+    IndexSpec(
+        collection="conversations",
+        name="user_id_with_history",
+        keys=(("user_id", ASCENDING),),
+        # Only conversations with questions and summaries, the ones fetch_user_data_from_db
+        # returns; empty conversations never enter the index.
+        options={"partialFilterExpression": {"questions.0": {"$exists": True}, "summaries.0": {"$exists": True}}},
+        reason="fetch_user_data_from_db and fetch_latest_analyzed_values.",
+    ),
+    IndexSpec(
+        collection="users",
+        name="username_unique",
+        keys=(("username", ASCENDING),),
+        # Partial, so documents without a username do not collide on null.
+        options={"unique": True, "partialFilterExpression": {"username": {"$type": "string"}}},
+        reason="get_user by username; usernames are unique.",
+    ),
+    IndexSpec(
+        collection="leases",
+        name="expires_at_ttl",
+        keys=(("expires_at", ASCENDING),),
+        # Expired leases are taken over in place, so this only removes abandoned ones.
+        options={"expireAfterSeconds": 3600},
+        reason="Removes leases an hour after they expired.",
+    ),
+    IndexSpec(
+        collection="llm_cache",
+        name="expires_at_1",
+        keys=(("expires_at", ASCENDING),),
+        options={"expireAfterSeconds": 0},
+        reason="Removes expired LLM cache entries.",
+    ),
+]
+
+
+def normalize_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: options[name] for name in ("unique", "partialFilterExpression", "expireAfterSeconds") if name in options}
+
+def diff_indexes(specs: List[IndexSpec], existing: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Compares the declared indexes of one collection with its index_information().
+
+    Returns:
+        Dict[str, List[str]]: Names of declared indexes that are present, missing, or present
+        with other keys or options ("conflicting"), and of existing indexes nobody declared
+        ("undeclared").
+    """
+    report = {"present": [], "missing": [], "conflicting": [], "undeclared": []}
+    for spec in specs:
+        info = existing.get(spec.name)
+        if info is None:
+            report["missing"].append(spec.name)
+        elif [(key, int(direction)) for key, direction in info["key"]] != list(spec.keys) \
+                or normalize_options(info) != normalize_options(spec.options):
+            report["conflicting"].append(spec.name)
+        else:
+            report["present"].append(spec.name)
+    declared = {spec.name for spec in specs}
+    report["undeclared"] = sorted(name for name in existing if name != "_id_" and name not in declared)
+    return report
+
+def specs_by_collection(specs: List[IndexSpec]) -> Dict[str, List[IndexSpec]]:
+    collections: Dict[str, List[IndexSpec]] = {}
+    for spec in specs:
+        collections.setdefault(spec.collection, []).append(spec)
+    return collections
+
+async def get_unused_indexes(collection) -> Optional[List[str]]:
+    """
+    Names of the indexes with no recorded use since the server started, from $indexStats.
+    Returns None when the statistics are not available, e.g. without the needed privileges.
+    """
+    try:
+        stats = await collection.aggregate([{"$indexStats": {}}]).to_list(length=None)
+    except OperationFailure as e:
+        logger.warning(f"Could not read index statistics of {collection.name}: {e}")
+        return None
+    return sorted(stat["name"] for stat in stats if stat["name"] != "_id_" and stat["accesses"]["ops"] == 0)
+
+async def index_report(database=db, specs: List[IndexSpec] = REQUIRED_INDEXES) -> Dict[str, Dict[str, Any]]:
+    """
+    Reports, per collection, which declared indexes are present, missing or conflicting,
+    which existing indexes are undeclared, and which have not been used.
+    """
+    report = {}
+    for collection_name, collection_specs in specs_by_collection(specs).items():
+        collection = database.get_collection(collection_name)
+        existing = await collection.index_information()
+        report[collection_name] = {
+            **diff_indexes(collection_specs, existing),
+            "unused": await get_unused_indexes(collection),
+        }
+    return report
+
+async def ensure_indexes(database=db, specs: List[IndexSpec] = REQUIRED_INDEXES) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Creates the declared indexes that are missing. Indexes that already exist are left alone,
+    including ones whose options differ from the declaration: those are reported as
+    conflicting and have to be dropped by hand, since rebuilding an index can take long.
+
+    Returns:
+        Dict[str, Dict[str, List[str]]]: Per collection, the created, present, conflicting
+        and failed index names.
+    """
+    result = {}
+    for collection_name, collection_specs in specs_by_collection(specs).items():
+        collection = database.get_collection(collection_name)
+        diff = diff_indexes(collection_specs, await collection.index_information())
+        outcome = {"created": [], "present": diff["present"], "conflicting": diff["conflicting"], "failed": []}
+        for spec in collection_specs:
+            if spec.name not in diff["missing"]:
+                continue
+            try:
+                await collection.create_indexes([spec.model()])
+                outcome["created"].append(spec.name)
+                logger.info(f"Created index {spec.name} on {collection_name}")
+            except OperationFailure as e:
+                # e.g. duplicate usernames prevent the unique index.
+                outcome["failed"].append(spec.name)
+                logger.error(f"Could not create index {spec.name} on {collection_name}: {e}")
+        for name in diff["conflicting"]:
+            logger.warning(f"Index {name} on {collection_name} differs from its declaration; drop it to recreate it")
+        result[collection_name] = outcome
+    return result
+
+async def ensure_indexes_on_startup():
+    if not MONGODB_ENSURE_INDEXES:
+        return
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        logger.error(f"Could not ensure MongoDB indexes: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report or create the MongoDB indexes the app declares.")
+    parser.add_argument("--apply", action="store_true", help="Create missing indexes before reporting.")
+    args = parser.parse_args()
+
+    async def main():
+        output = {}
+        if args.apply:
+            output["applied"] = await ensure_indexes()
+        output["report"] = await index_report()
+        return output
+
+    print(json.dumps(asyncio.run(main()), indent=2))
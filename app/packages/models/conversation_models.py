@@ -1,16 +1,40 @@
 from datetime import datetime, timezone
-from typing import List, Optional
-from pydantic import BaseModel
+from typing import Dict, List, Literal, Optional
+from pydantic import BaseModel, Field
 
 from app.type import Message
 
 
+class LLMCallOverride(BaseModel):
+    # Parameters a request may set for one call site; unset fields keep the configured value.
+    model: Optional[str] = None
+    max_tokens: Optional[int] = Field(default=None, gt=0)
+    temperature: Optional[float] = Field(default=None, ge=0, le=2)
+    stop: Optional[List[str]] = Field(default=None, max_length=4)
+
 class GPTRequest(BaseModel):
     conversation_id: Optional[str] = None
     prompt: str
     topic: str
-    max_tokens: int = 150
+    # Caps the question, summary, analyze and answers completions when sent explicitly.
+    max_tokens: int = Field(default=150, gt=0)
     is_title_generate: bool = False
+    # "single" generates the turn with one structured completion, "multi" with one per history;
+    # None uses the TURN_MODE default.
+    turn_mode: Optional[Literal["multi", "single"]] = None
+    # Per-call-site parameter overrides, keyed by call site (question, summary, analyze,
+    # answers, title or turn) and checked against the configured limits.
+    llm_overrides: Optional[Dict[str, LLMCallOverride]] = None
+
+# Conversation fields a listing may ask for on top of the default sidebar fields.
+ConversationListField = Literal["questions", "summaries", "analyze", "answers", "keywords", "title_status", "deleted_at"]
+
+class ConversationListRequest(BaseModel):
+    # Opaque cursor returned as next_cursor by the previous page; None for the first page.
+    cursor: Optional[str] = None
+    limit: int = Field(default=20, gt=0, le=100)
+    # Extra fields to include in each conversation.
+    fields: List[ConversationListField] = Field(default_factory=list)
 
 class UserConversationRequest(BaseModel):
     conversation_id: str
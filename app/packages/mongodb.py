@@ -1,6 +1,9 @@
 # mongodb.py
-from datetime import datetime, timezone
-from typing import List
+import base64
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
 from fastapi import HTTPException
 from pymongo.errors import DuplicateKeyError
 from pymongo import ReturnDocument
@@ -8,8 +11,17 @@ from pymongo.results import UpdateResult
 from bson import ObjectId
 
 from app.packages.models.conversation_models import Analyze, AnalyzeQuery, SimpleConversationQuery, UserConversationQuery
-from app.type import Conversation
-from app.packages.database import conversation_collection, logger
+from app.type import HISTORY_FIELDS, Conversation, FlattenedAnalysisSummary
+from app.packages.database import conversation_collection, leases_collection, logger, user_value_profiles_collection
+from app.packages.unit_of_work import (
+    ROUND_TRIP_READ,
+    ROUND_TRIP_WRITE,
+    ConversationUnitOfWork,
+    bind_unit_of_work,
+    current_unit_of_work,
+    record_round_trip,
+    turn_round_trips,
+)
 
 
 async def get_conversation_by_id(conversation_id) -> Conversation:
@@ -24,6 +36,7 @@ async def get_conversation_by_id(conversation_id) -> Conversation:
     - The conversation document or None if not found.
     """
     try:
+        record_round_trip(ROUND_TRIP_READ)
         conversation = await conversation_collection.find_one({"_id": ObjectId(conversation_id)})
         return conversation
     except Exception as e:
@@ -45,6 +58,9 @@ async def get_conversation(query: SimpleConversationQuery) -> Conversation:
             summaries=conversation["summaries"],
             analyze=conversation["analyze"],
             answers=conversation.get("answers", []),
+            title=conversation.get("title"),
+            title_status=conversation.get("title_status"),
+            title_requested_at=conversation.get("title_requested_at"),
         )
         return user_conversation
     except Exception as e:
@@ -85,7 +101,13 @@ async def init_or_get_conversation(query: UserConversationQuery) -> Conversation
                 created_at=conversation["created_at"],
                 status=conversation["status"],
                 is_favorite=conversation["is_favorite"],
+                title=conversation.get("title"),
+                title_status=conversation.get("title_status"),
+                title_requested_at=conversation.get("title_requested_at"),
+                context_summaries=conversation.get("context_summaries", {}),
+                context_folded=conversation.get("context_folded", {}),
             )
+        update_conversation.mark_persisted()
         return update_conversation
     except Exception as e:
         logger.error(f"Error fetching conversation for user_id {user_id}: {e}")
@@ -132,9 +154,11 @@ async def create_conversation(user_conversation: Conversation):
         conversation_data = {k: v for k, v in conversation_data.items() if v is not None}
 
         # Insert the new document
+        record_round_trip(ROUND_TRIP_WRITE)
         result = await conversation_collection.insert_one(conversation_data)
 
         if result.inserted_id:
+            user_conversation.mark_persisted()
             return str(result.inserted_id)
         else:
             raise HTTPException(status_code=500, detail="Failed to create conversation.")
@@ -180,51 +204,175 @@ async def update_or_append_field_by_id(conversation_id: str, field_name: str, ke
         raise HTTPException(status_code=500, detail=f"Error updating {field_name}")
 
 async def update_conversation(user_conversation: Conversation):
+    """
+    Stores the changes of a conversation, or, within a unit of work, registers the
+    conversation to be stored with the unit's single write at the end of the turn.
+
+    Returns:
+        str: The ID of the conversation.
+    """
+    unit_of_work = current_unit_of_work.get()
+    if unit_of_work is not None:
+        unit_of_work.register(user_conversation)
+        return user_conversation.conversation_id
+    return await write_conversation(user_conversation)
+
+async def write_conversation(user_conversation: Conversation, staged_fields: Optional[Dict[str, Any]] = None):
+    """
+    Stores the changes of a conversation in one update. When the conversation knows which
+    messages are already stored (see Conversation.mark_persisted), only the messages appended
+    since are written, with $push/$each, next to $sets of the scalar fields; so the bytes written
+    per turn do not grow with the length of the conversation. Otherwise the full histories are
+    written, inserting the conversation if it does not exist yet.
+
+    Args:
+        user_conversation (Conversation): The conversation to store.
+        staged_fields (Optional[Dict[str, Any]]): Further fields to $set, e.g. title fields
+            staged in a unit of work.
+
+    Returns:
+        str: The ID of the conversation.
+    """
     user_id = user_conversation.user_id
     conversation_id = user_conversation.conversation_id
-    questions = user_conversation.questions
-    summaries = user_conversation.summaries
-    analyze = user_conversation.analyze
-    answers = user_conversation.answers
-    title = user_conversation.title
-    status = user_conversation.status
-    is_favorite = user_conversation.is_favorite
-    deleted_at = user_conversation.deleted_at
     updated_at = datetime.utcnow()  # Update the timestamp when modifying
 
-    update_data = {
+    set_data = {
         "user_id": user_id,
-        "questions": questions,
-        "summaries": summaries,
-        "analyze": analyze,
-        "answers": answers,
-        "title": title,
-        "status": status,
-        "is_favorite": is_favorite,
+        "title": user_conversation.title,
+        "status": user_conversation.status,
+        "is_favorite": user_conversation.is_favorite,
         "updated_at": updated_at,
-        "deleted_at": deleted_at,
+        "deleted_at": user_conversation.deleted_at,
+        # One rolling summary per history, so these stay small.
+        "context_summaries": user_conversation.context_summaries,
+        "context_folded": user_conversation.context_folded,
+        **(staged_fields or {}),
     }
 
     # Remove None values from the update data
-    update_data = {k: v for k, v in update_data.items() if v is not None}
+    set_data = {k: v for k, v in set_data.items() if v is not None}
 
     try:
+        appended = user_conversation.appended_messages()
+        if appended is not None:
+            update = {"$set": set_data}
+            if appended:
+                update["$push"] = {name: {"$each": messages} for name, messages in appended.items()}
+            record_round_trip(ROUND_TRIP_WRITE)
+            result: UpdateResult = await conversation_collection.update_one(
+                {"_id": ObjectId(conversation_id)},
+                update
+            )
+            if result.matched_count:
+                user_conversation.mark_persisted()
+                return conversation_id
+            # The stored conversation is gone; write it in full below.
+
+        history_data = {name: getattr(user_conversation, name) for name in HISTORY_FIELDS}
+        record_round_trip(ROUND_TRIP_WRITE)
         result: UpdateResult = await conversation_collection.update_one(
             {"_id": ObjectId(conversation_id)},
-            {"$set": update_data},
+            {
+                "$set": {**set_data, **{k: v for k, v in history_data.items() if v is not None}},
+                # A conversation created within a unit of work is inserted here.
+                "$setOnInsert": {"topic": user_conversation.topic, "created_at": user_conversation.created_at},
+            },
             upsert=True
         )
-        if result.upserted_id:
-            return str(result.upserted_id)
-        else:
-            existing_document = await conversation_collection.find_one(
-                {"_id": ObjectId(conversation_id)},
-            )
-            return str(existing_document["_id"])
+        user_conversation.mark_persisted()
+        return str(result.upserted_id) if result.upserted_id else conversation_id
     except Exception as e:
         logger.error(f"Error updating conversation for user_id {user_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error while updating conversation.")
 
+@asynccontextmanager
+async def conversation_unit_of_work(unit_of_work: Optional[ConversationUnitOfWork] = None):
+    """
+    Runs the enclosed turn in a unit of work and, if it completes, stores every registered
+    conversation with one write each and then runs the after_commit callbacks. If the turn
+    raises, nothing is stored.
+
+    Args:
+        unit_of_work (Optional[ConversationUnitOfWork]): A unit of work already used for part
+            of the turn, e.g. to load the conversation before a response starts streaming.
+    """
+    unit_of_work = unit_of_work or ConversationUnitOfWork()
+    with bind_unit_of_work(unit_of_work):
+        yield unit_of_work
+        for conversation_id, conversation in unit_of_work.conversations.items():
+            await write_conversation(conversation, unit_of_work.staged_fields.get(conversation_id))
+    turn_round_trips.record(unit_of_work)
+    for callback in unit_of_work.callbacks:
+        await callback()
+
+async def update_conversation_title(
+    conversation_id: str,
+    title: Optional[str] = None,
+    title_status: Optional[str] = None,
+    title_requested_at: Optional[datetime] = None,
+):
+    """
+    Updates only the title fields of a conversation, so background title generation never
+    overwrites the message histories written by a concurrent turn.
+
+    Args:
+        conversation_id (str): The ID of the conversation
+        title (Optional[str]): The generated title
+        title_status (Optional[str]): "pending", "ready" or "failed"
+        title_requested_at (Optional[datetime]): When the pending title was requested
+    """
+    update_data = {
+        "title": title,
+        "title_status": title_status,
+        "title_requested_at": title_requested_at,
+    }
+    update_data = {k: v for k, v in update_data.items() if v is not None}
+
+    unit_of_work = current_unit_of_work.get()
+    if unit_of_work is not None and unit_of_work.stage_fields(conversation_id, update_data):
+        return
+
+    try:
+        record_round_trip(ROUND_TRIP_WRITE)
+        await conversation_collection.update_one(
+            {"_id": ObjectId(conversation_id)},
+            {"$set": update_data}
+        )
+    except Exception as e:
+        logger.error(f"Error updating title for conversation {conversation_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error while updating title.")
+
+async def get_conversation_title(conversation_id: str, user_id: str) -> Conversation | None:
+    """
+    Fetches only the title fields of a conversation of the user.
+
+    Args:
+        conversation_id (str): The ID of the conversation
+        user_id (str): The ID of the user the conversation must belong to
+
+    Returns:
+        Conversation | None: The conversation with its title fields set, or None if the user
+        has no such conversation
+    """
+    try:
+        document = await conversation_collection.find_one(
+            {"_id": ObjectId(conversation_id), "user_id": user_id},
+            {"topic": 1, "title": 1, "title_status": 1, "title_requested_at": 1}
+        )
+        if not document:
+            return None
+        return Conversation(
+            conversation_id=conversation_id,
+            topic=document.get("topic", ""),
+            title=document.get("title"),
+            title_status=document.get("title_status"),
+            title_requested_at=document.get("title_requested_at"),
+        )
+    except Exception as e:
+        logger.error(f"Error fetching title for conversation {conversation_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error while fetching title.")
+
 async def store_keywords(conversation_id: str, keywords: List[str]):
     try:
         result: UpdateResult = await conversation_collection.update_one(
@@ -266,13 +414,14 @@ async def get_next_id(sequence_name: str) -> int:
 async def fetch_user_data_from_db(user_id: int) -> List[Conversation]:
     """
     Interacts with the MongoDB database to retrieve all records that contain user_id
-    and have 'questions' and 'summaries' attributes.
+    and have non-empty 'questions' and 'summaries' attributes.
     """
     try:
+        # Written as "has a first element" so the partial user_id_with_history index applies.
         user_data = await conversation_collection.find({
             "user_id": user_id,
-            "questions": { "$exists": True, "$ne": [] },
-            "summaries": { "$exists": True, "$ne": [] }
+            "questions.0": { "$exists": True },
+            "summaries.0": { "$exists": True }
         }).to_list(length=None)
     
         if not user_data or len(user_data) == 0:
@@ -287,6 +436,143 @@ async def fetch_user_data_from_db(user_id: int) -> List[Conversation]:
         logger.error(f"Database error fetching data for user_id {user_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error while fetching data.")
 
+async def fetch_latest_analyzed_values(user_id: str) -> List[FlattenedAnalysisSummary]:
+    """
+    Returns the analyzed values of the latest analysis summary of each of the user's
+    conversations, flattened into one list, with a single aggregation. Only the analyzed
+    values leave the server; histories and older analyses are never transferred.
+
+    Conversations without analysis summaries are ignored.
+    """
+    pipeline = [
+        # Same filter as fetch_user_data_from_db, so the partial user_id_with_history index applies.
+        {"$match": {
+            "user_id": user_id,
+            "questions.0": {"$exists": True},
+            "summaries.0": {"$exists": True},
+            "analysis_summaries": {"$type": "object"},
+        }},
+        # analysis_summaries keeps its keys in insertion order, so the last one is the latest.
+        {"$project": {"_id": 0, "latest": {"$arrayElemAt": [{"$objectToArray": "$analysis_summaries"}, -1]}}},
+        {"$unwind": "$latest.v.analyzed_values"},
+        {"$replaceRoot": {"newRoot": "$latest.v.analyzed_values"}},
+    ]
+    try:
+        return await conversation_collection.aggregate(pipeline).to_list(length=None)
+    except Exception as e:
+        logger.error(f"Database error fetching analyzed values for user_id {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error while fetching data.")
+
+def fetch_latest_analyses(user_id: Optional[str] = None):
+    """
+    Returns a cursor over the latest analysis of each conversation, of one user or of all users
+    ordered by user, as {"_id", "user_id", "sha", "analyzed_values"} documents. Used to build
+    user value profiles from scratch.
+    """
+    match = {
+        "questions.0": {"$exists": True},
+        "summaries.0": {"$exists": True},
+        "analysis_summaries": {"$type": "object"},
+    }
+    if user_id is not None:
+        match = {"user_id": user_id, **match}
+    return conversation_collection.aggregate([
+        {"$match": match},
+        {"$sort": {"user_id": 1}},
+        {"$project": {"user_id": 1, "latest": {"$arrayElemAt": [{"$objectToArray": "$analysis_summaries"}, -1]}}},
+        {"$project": {"user_id": 1, "sha": "$latest.k", "analyzed_values": "$latest.v.analyzed_values"}},
+        {"$match": {"analyzed_values": {"$type": "array"}}},
+    ])
+
+# Fields of each conversation in a listing page, enough to render the conversation list.
+CONVERSATION_LIST_FIELDS = ("title", "topic", "created_at", "updated_at", "status", "is_favorite")
+
+def encode_conversation_cursor(updated_at: datetime, conversation_id: ObjectId) -> str:
+    """
+    Encodes the sort key of the last conversation of a page as an opaque cursor.
+    """
+    payload = json.dumps([updated_at.isoformat(), str(conversation_id)])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_conversation_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """
+    Decodes a cursor made by encode_conversation_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        updated_at, conversation_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(updated_at), ObjectId(conversation_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+async def list_user_conversations(
+    user_id: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Returns one page of the user's conversations with questions and summaries, most recently
+    updated first. Pages are keyed on (updated_at, _id) rather than skipped over, so every page
+    costs one bounded index scan of the user_id_updated_at index, however far the user pages.
+
+    Args:
+        user_id (str): The owner of the conversations.
+        limit (int): The page size.
+        cursor (Optional[str]): The next_cursor of the previous page, None for the first page.
+        fields (Optional[List[str]]): Fields to return on top of CONVERSATION_LIST_FIELDS.
+
+    Returns:
+        Dict[str, Any]: The page's "conversations" and the "next_cursor", None on the last page.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    query: Dict[str, Any] = {
+        "user_id": user_id,
+        "questions.0": {"$exists": True},
+        "summaries.0": {"$exists": True},
+    }
+    if cursor:
+        updated_at, conversation_id = decode_conversation_cursor(cursor)
+        query["$or"] = [
+            {"updated_at": {"$lt": updated_at}},
+            {"updated_at": updated_at, "_id": {"$lt": conversation_id}},
+        ]
+    projection = {field: 1 for field in (*CONVERSATION_LIST_FIELDS, *(fields or []))}
+
+    try:
+        # One extra document tells whether another page follows.
+        documents = await conversation_collection.find(query, projection) \
+            .sort([("updated_at", -1), ("_id", -1)]) \
+            .limit(limit + 1) \
+            .to_list(length=limit + 1)
+    except Exception as e:
+        logger.error(f"Database error listing conversations for user_id {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error while fetching data.")
+
+    page = documents[:limit]
+    next_cursor = None
+    if len(documents) > limit:
+        last = page[-1]
+        next_cursor = encode_conversation_cursor(last["updated_at"], last["_id"])
+    for document in page:
+        document["_id"] = str(document["_id"])
+    return {"conversations": page, "next_cursor": next_cursor}
+
+def find_conversations_for_batch():
+    """
+    Returns a cursor over every conversation with summaries, projected to the fields the
+    offline batch pipeline needs to find missing analyses and keywords.
+    """
+    return conversation_collection.find(
+        {"summaries": {"$exists": True, "$ne": []}},
+        {"summaries": 1, "analyze": 1, "keywords": 1, "analysis_summaries": 1}
+    )
+
 async def get_analysis_summary_by_sha(conversation_id: str, sha256_hash: str):
     """
     Retrieves the analysis summary for a given SHA hash from a conversation.
@@ -314,3 +600,90 @@ async def get_analysis_summary_by_sha(conversation_id: str, sha256_hash: str):
     except Exception as e:
         logger.error(f"Error fetching analysis summary for conversation {conversation_id}: {e}")
         raise HTTPException(status_code=500, detail="Error fetching analysis summary")
+
+async def acquire_lease(key: str, owner: str, ttl_seconds: float) -> bool:
+    """
+    Tries to take a short-lived lease so that only one worker performs the work identified by key.
+    An expired lease can be taken over by another owner.
+
+    Args:
+        key (str): The lease identifier
+        owner (str): A unique identifier of the caller
+        ttl_seconds (float): How long the lease is held before it can be taken over
+
+    Returns:
+        bool: True if the caller now holds the lease
+    """
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    try:
+        await leases_collection.insert_one({"_id": key, "owner": owner, "expires_at": expires_at})
+        return True
+    except DuplicateKeyError:
+        taken_over = await leases_collection.find_one_and_update(
+            {"_id": key, "expires_at": {"$lte": now}},
+            {"$set": {"owner": owner, "expires_at": expires_at}}
+        )
+        return taken_over is not None
+    except Exception as e:
+        logger.error(f"Error acquiring lease {key}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error while acquiring lease.")
+
+async def release_lease(key: str, owner: str):
+    try:
+        await leases_collection.delete_one({"_id": key, "owner": owner})
+    except Exception as e:
+        # An unreleased lease only delays other workers until it expires.
+        logger.warning(f"Error releasing lease {key}: {e}")
+
+async def get_user_value_profile(user_id: str, projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Fetches the value profile of a user by its _id, the user ID.
+
+    Returns:
+        dict | None: The profile, or None if it has not been built yet.
+    """
+    try:
+        return await user_value_profiles_collection.find_one({"_id": user_id}, projection)
+    except Exception as e:
+        logger.error(f"Error fetching value profile for user_id {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error while fetching data.")
+
+async def update_user_value_profile_if_unchanged(
+    user_id: str,
+    conversation_id: str,
+    previous_sha: Optional[str],
+    update: Dict[str, Any],
+) -> bool:
+    """
+    Applies an update to a user's existing value profile, only while the profile still holds
+    the contribution of the conversation's analysis previous_sha (None for no contribution), so
+    a delta computed against it is never applied twice. Profiles are never created here, since
+    a profile created from one delta would lack the user's other conversations.
+
+    Returns:
+        bool: False if the conversation's contribution changed in the meantime, or the profile
+        does not exist.
+    """
+    contribution_filter = previous_sha if previous_sha is not None else {"$exists": False}
+    result: UpdateResult = await user_value_profiles_collection.update_one(
+        {"_id": user_id, f"contributions.{conversation_id}.sha": contribution_filter},
+        update
+    )
+    return bool(result.matched_count)
+
+async def insert_user_value_profile_if_absent(profile: Dict[str, Any]) -> bool:
+    """
+    Stores a user's value profile unless one exists already.
+
+    Returns:
+        bool: False if the user had a profile, which is left untouched.
+    """
+    try:
+        await user_value_profiles_collection.insert_one(profile)
+        return True
+    except DuplicateKeyError:
+        return False
+
+async def replace_user_value_profile(profile: Dict[str, Any]):
+    await user_value_profiles_collection.replace_one({"_id": profile["_id"]}, profile, upsert=True)
@@ -0,0 +1,120 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.type import Conversation
+
+ROUND_TRIP_READ = "read"
+ROUND_TRIP_WRITE = "write"
+
+
+class ConversationUnitOfWork:
+    """
+    Collects the conversation changes of one turn so they are stored with a single write per
+    conversation when the turn completes, instead of after every step.
+
+    While a unit of work is bound (see bind_unit_of_work), update_conversation registers the
+    conversation instead of writing it, update_conversation_title stages the title fields of a
+    registered conversation, and new conversations get their ID without being inserted. The
+    changes are flushed by conversation_unit_of_work when the turn succeeds and dropped when it
+    fails. Work that must see the stored conversation, such as queueing background jobs, is
+    deferred with after_commit.
+
+    Attributes:
+        conversations (Dict[str, Conversation]): The conversations to write, by ID.
+        staged_fields (Dict[str, Dict[str, Any]]): Extra fields to $set, by conversation ID.
+        round_trips (Dict[str, int]): MongoDB round trips of the turn, by kind.
+    """
+
+    def __init__(self):
+        self.conversations: Dict[str, Conversation] = {}
+        self.staged_fields: Dict[str, Dict[str, Any]] = {}
+        self.callbacks: List[Callable[[], Awaitable[None]]] = []
+        self.round_trips: Dict[str, int] = {ROUND_TRIP_READ: 0, ROUND_TRIP_WRITE: 0}
+
+    def register(self, conversation: Conversation):
+        self.conversations[conversation.conversation_id] = conversation
+
+    def stage_fields(self, conversation_id: str, fields: Dict[str, Any]) -> bool:
+        """
+        Adds fields to the write of a registered conversation.
+
+        Returns:
+            bool: False if the conversation is not registered and has to be written directly.
+        """
+        if conversation_id not in self.conversations:
+            return False
+        self.staged_fields.setdefault(conversation_id, {}).update(fields)
+        return True
+
+    def after_commit(self, callback: Callable[[], Awaitable[None]]):
+        self.callbacks.append(callback)
+
+    def record_round_trip(self, kind: str):
+        self.round_trips[kind] = self.round_trips.get(kind, 0) + 1
+
+    @property
+    def total_round_trips(self) -> int:
+        return sum(self.round_trips.values())
+
+
+class TurnRoundTripStats:
+    """
+    Counts the MongoDB round trips of the conversation turns run in a unit of work.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.turns = 0
+        self.round_trips: Dict[str, int] = {ROUND_TRIP_READ: 0, ROUND_TRIP_WRITE: 0}
+        self.max_round_trips = 0
+
+    def record(self, unit_of_work: ConversationUnitOfWork):
+        self.turns += 1
+        for kind, count in unit_of_work.round_trips.items():
+            self.round_trips[kind] = self.round_trips.get(kind, 0) + count
+        self.max_round_trips = max(self.max_round_trips, unit_of_work.total_round_trips)
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = sum(self.round_trips.values())
+        return {
+            "turns": self.turns,
+            "round_trips": dict(self.round_trips),
+            "round_trips_per_turn": total / self.turns if self.turns else 0.0,
+            "max_round_trips_per_turn": self.max_round_trips,
+        }
+
+
+current_unit_of_work: ContextVar[Optional[ConversationUnitOfWork]] = ContextVar("current_unit_of_work", default=None)
+
+turn_round_trips = TurnRoundTripStats()
+
+
+@contextmanager
+def bind_unit_of_work(unit_of_work: ConversationUnitOfWork):
+    """
+    Makes the conversation writes of the enclosed code go through the unit of work.
+    """
+    token = current_unit_of_work.set(unit_of_work)
+    try:
+        yield unit_of_work
+    finally:
+        current_unit_of_work.reset(token)
+
+def record_round_trip(kind: str):
+    unit_of_work = current_unit_of_work.get()
+    if unit_of_work is not None:
+        unit_of_work.record_round_trip(kind)
+
+async def after_commit(callback: Callable[[], Awaitable[None]]):
+    """
+    Runs the callback once the current unit of work has been flushed, or right away outside
+    a unit of work.
+    """
+    unit_of_work = current_unit_of_work.get()
+    if unit_of_work is None:
+        await callback()
+    else:
+        unit_of_work.after_commit(callback)
@@ -1,7 +1,9 @@
 from app.resolvers.conversation_resolvers import (
     get_conversation_resolver,
     get_all_user_conversations_resolver,
-    process_answer_and_generate_followup_resolver
+    process_answer_and_generate_followup_resolver,
+    process_answer_and_generate_followup_stream_resolver,
+    get_conversation_title_resolver
 )
 from app.resolvers.analyze_resolvers import (
     get_analyze_resolver,
@@ -21,5 +23,7 @@ __all__ = [
     'get_all_questions_resolver',
     'get_question_resolver',
     'get_all_user_conversations_resolver',
-    'process_answer_and_generate_followup_resolver'
+    'process_answer_and_generate_followup_resolver',
+    'process_answer_and_generate_followup_stream_resolver',
+    'get_conversation_title_resolver'
 ]
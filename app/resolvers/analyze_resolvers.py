@@ -1,29 +1,59 @@
-import hashlib
 import logging
-from typing import List
+import os
+from typing import List, Optional
 from fastapi import HTTPException
 from app.packages.models.conversation_models import AnalayzeRequest, AnalyzeQuery
 from app.openai_resolvers.keyword_extraction import (
+    ANALYSIS_STRUCTURED,
     create_prompt_for_single_sentence, 
-    create_prompts_for_multiple_sentences, 
-    fetch_keywords_from_api, 
+    extract_keywords_batch, 
     fetch_keywords_from_api_only_one
 )
+from app.openai_resolvers.batch_executor import leading_successes
+from app.openai_resolvers.llm_metrics import bind_llm_topic
 from app.packages.mongodb import (
     get_analyze, 
     get_conversation_by_id,
     store_keywords, 
     update_or_append_field_by_id, 
     get_analysis_summary_by_sha,
-    fetch_user_data_from_db
+    fetch_latest_analyzed_values
 )
 from app.services.add_new_label import add_new_label
-from app.services.analyze_service import get_attribute_and_explanation_object_array
+from app.services.analyze_service import (
+    AnalysisSummary,
+    build_analysis_summary,
+    find_previous_analysis,
+    get_summaries_content_and_hash,
+    merge_analyses
+)
+from app.services.background_tasks import background_tasks
 from app.services.consolidate_values import consolidate_values
-from app.type import Conversation, FlattenedAnalysisSummary, LabeledAttribute
+from app.services.single_flight import SingleFlight, run_with_lease
+from app.services.value_profile import (
+    USER_VALUE_PROFILES_ENABLED,
+    get_or_build_user_value_profile,
+    profile_labeled_values,
+    update_user_value_profile
+)
+from app.type import FlattenedAnalysisSummary, LabeledAttribute
 
 logger = logging.getLogger(__name__)
 
+ANALYSIS_LEASE_ENABLED = os.getenv("ANALYSIS_LEASE_ENABLED", "true").lower() == "true"
+ANALYSIS_LEASE_TTL_SECONDS = float(os.getenv("ANALYSIS_LEASE_TTL_SECONDS", 60))
+ANALYSIS_LEASE_POLL_SECONDS = float(os.getenv("ANALYSIS_LEASE_POLL_SECONDS", 0.5))
+# Analyze only the summaries added since the latest stored analysis and merge the result into
+# it, instead of re-analyzing the whole conversation.
+ANALYSIS_INCREMENTAL = os.getenv("ANALYSIS_INCREMENTAL", "true").lower() == "true"
+# After a turn, the analysis is precomputed in the background once the conversation has been
+# quiet for this long, so a quick series of turns results in a single analysis.
+ANALYSIS_PRECOMPUTE_ENABLED = os.getenv("ANALYSIS_PRECOMPUTE_ENABLED", "true").lower() == "true"
+ANALYSIS_PRECOMPUTE_DELAY_SECONDS = float(os.getenv("ANALYSIS_PRECOMPUTE_DELAY_SECONDS", 15))
+
+# Concurrent requests for the same (conversation_id, sha) share one in-flight analysis.
+analysis_single_flight = SingleFlight()
+
 async def process_answer_resolver(request: AnalayzeRequest):
     try:
         first_conversation_id = request.conversation_id
@@ -50,10 +80,17 @@ async def process_retrieve_keywords_resolver(request: AnalayzeRequest):
 
         if len(analyze) > len(keywords):
             missing_analyze = analyze[len(keywords):]
-            prompts = create_prompts_for_multiple_sentences(missing_analyze)
             
-            responses = await fetch_keywords_from_api(prompts)
-            new_keywords = [response.choices[0].message.content.strip() for response in responses]
+            results = await extract_keywords_batch(missing_analyze)
+            # Keywords are stored positionally against the analyze messages, so only the
+            # leading run of successes can be kept; the rest is retried on the next call.
+            new_keywords = leading_successes(results)
+
+            failed_count = sum(1 for result in results if not result.ok)
+            if failed_count:
+                logger.warning(f"{failed_count} of {len(results)} keyword extractions failed for conversation {first_conversation_id}")
+            if not new_keywords:
+                raise results[0].error
             
             keywords.extend(new_keywords)
             
@@ -67,6 +104,131 @@ async def process_retrieve_keywords_resolver(request: AnalayzeRequest):
 
 # Removed get_all_questions_resolver and get_question_resolver functions
 
+async def request_analysis(summaries_content: str, structured: bool) -> AnalysisSummary:
+    """
+    Asks the model for the value analysis of the summaries and parses it.
+
+    Raises:
+        ValueError: If the completion is not a valid analysis with at least one value.
+    """
+    prompts = create_prompt_for_single_sentence(summaries_content, structured=structured)
+    api_response = await fetch_keywords_from_api_only_one(prompts, structured=structured)
+    return build_analysis_summary(api_response.choices[0].message.content.strip())
+
+async def generate_analysis(
+    conversation_id: str,
+    sha256_hash: str,
+    summaries_content: str,
+    previous: Optional[AnalysisSummary] = None,
+    previous_count: int = 0,
+    new_count: int = 0,
+    user_id: Optional[str] = None,
+):
+    """
+    Generates the value analysis of the combined summaries and stores it under its SHA-256 hash.
+
+    Args:
+        conversation_id (str): The ID of the conversation.
+        sha256_hash (str): The SHA-256 hash of all combined assistant summaries.
+        summaries_content (str): The summaries to analyze: all of them, or with previous given,
+            only those added since the previous analysis.
+        previous (Optional[AnalysisSummary]): The stored analysis of the earlier summaries to
+            merge the new analysis into.
+        previous_count (int): How many summaries the previous analysis covers.
+        new_count (int): How many summaries summaries_content holds.
+        user_id (Optional[str]): The owner of the conversation, whose value profile is updated.
+
+    Returns:
+        dict: The analysis summary text and the analyzed values.
+
+    Raises:
+        ValueError: If the model returned no valid analysis; nothing is stored then.
+    """
+    try:
+        value_object = await request_analysis(summaries_content, ANALYSIS_STRUCTURED)
+    except ValueError as e:
+        if not ANALYSIS_STRUCTURED:
+            raise
+        logger.warning(f"Structured analysis of conversation {conversation_id} was invalid, retrying in text mode: {e}")
+        value_object = await request_analysis(summaries_content, False)
+    if previous is not None:
+        value_object = merge_analyses(previous, previous_count, value_object, new_count)
+    
+    # Store the new analysis summary
+    await update_or_append_field_by_id(
+        conversation_id=conversation_id,
+        field_name="analysis_summaries",
+        key=sha256_hash,
+        value=value_object
+    )
+    if user_id is not None and USER_VALUE_PROFILES_ENABLED:
+        try:
+            await update_user_value_profile(user_id, conversation_id, sha256_hash, value_object["analyzed_values"])
+        except Exception as e:
+            # The analysis is stored; the profile catches up on the next rebuild.
+            logger.error(f"Error updating the value profile of user {user_id}: {e}")
+    
+    return value_object
+
+async def ensure_analysis(conversation_id: str):
+    """
+    Returns the stored analysis of the conversation's current summaries, generating and storing
+    it first if needed. Concurrent calls for the same summaries share one generation, in this
+    process and, through a lease, across workers.
+
+    Args:
+        conversation_id (str): The ID of the conversation to analyze.
+
+    Returns:
+        dict: The analysis summary text and the analyzed values.
+    """
+    user_conversation = await get_conversation_by_id(conversation_id)
+    bind_llm_topic(user_conversation.get('topic'))
+
+    # Combine all assistant summaries and hash them
+    summaries_content, sha256_hash = get_summaries_content_and_hash(user_conversation['summaries'])
+
+    # Try to get existing analysis summary
+    existing_summary = await get_analysis_summary_by_sha(conversation_id, sha256_hash)
+
+    if (existing_summary):
+        return existing_summary
+
+    async def generate():
+        previous = None
+        if ANALYSIS_INCREMENTAL:
+            previous = find_previous_analysis(user_conversation['summaries'], user_conversation.get('analysis_summaries') or {})
+        if previous is None:
+            return await generate_analysis(conversation_id, sha256_hash, summaries_content, user_id=user_conversation.get('user_id'))
+
+        # Only the summaries added since the previous analysis are sent, and merged into it.
+        previous_count, previous_analysis = previous
+        assistant_summaries = [summary for summary in user_conversation['summaries'] if summary["role"] == "assistant"]
+        new_summaries = assistant_summaries[previous_count:]
+        new_content, _ = get_summaries_content_and_hash(new_summaries)
+        return await generate_analysis(
+            conversation_id,
+            sha256_hash,
+            new_content,
+            previous=previous_analysis,
+            previous_count=previous_count,
+            new_count=len(new_summaries),
+            user_id=user_conversation.get('user_id'),
+        )
+
+    async def generate_once_across_workers():
+        if not ANALYSIS_LEASE_ENABLED:
+            return await generate()
+        return await run_with_lease(
+            key=f"analysis:{conversation_id}:{sha256_hash}",
+            fn=generate,
+            lookup=lambda: get_analysis_summary_by_sha(conversation_id, sha256_hash),
+            ttl_seconds=ANALYSIS_LEASE_TTL_SECONDS,
+            poll_interval=ANALYSIS_LEASE_POLL_SECONDS,
+        )
+
+    return await analysis_single_flight.do((conversation_id, sha256_hash), generate_once_across_workers)
+
 async def get_analyze_resolver(conversation_id: str):
     """
     Fetches and analyzes the conversation by extracting keywords from summaries.
@@ -82,77 +244,47 @@ async def get_analyze_resolver(conversation_id: str):
         HTTPException: If there is an error during data fetching or processing.
     """
     try:
-        user_conversation = await get_conversation_by_id(conversation_id)
-        
-        # Combine all assistant summaries
-        summaries_content = " ".join(
-            summary['content'] 
-            for summary in user_conversation['summaries'] 
-            if summary["role"] == "assistant"
-        )
-
-        # Generate SHA-256 hash of the combined summaries
-        sha256_hash = hashlib.sha256(summaries_content.encode('utf-8')).hexdigest()
-        
-        # Try to get existing analysis summary
-        existing_summary = await get_analysis_summary_by_sha(conversation_id, sha256_hash)
-        
-        if (existing_summary):
-            return existing_summary
-            
-        # If no existing summary, generate new one
-        prompts = create_prompt_for_single_sentence(summaries_content)
-        api_response = await fetch_keywords_from_api_only_one(prompts)
-        analysis_summary_text = api_response.choices[0].message.content.strip()
-        analyzed_values = get_attribute_and_explanation_object_array(analysis_summary_text)
-        
-        value_object = {
-            "analysis_summary_text": analysis_summary_text,
-            "analyzed_values": analyzed_values
-        }
-        
-        # Store the new analysis summary
-        await update_or_append_field_by_id(
-            conversation_id=conversation_id,
-            field_name="analysis_summaries",
-            key=sha256_hash,
-            value=value_object
-        )
-        
-        return value_object
-        
+        return await ensure_analysis(conversation_id)
     except Exception as error:
         logger.error(f"Error in get_analyze_resolver: {error}")
         raise HTTPException(status_code=500, detail="Internal server error while fetching data.")
 
-async def extract_analysis_summaries(user_data: List[Conversation]) -> List[FlattenedAnalysisSummary]:
+def schedule_analysis_precompute(conversation_id: str) -> bool:
+    """
+    Schedules a debounced background job that stores the analysis of the conversation's latest
+    summaries, so the analysis view usually finds it already computed. Every call within
+    ANALYSIS_PRECOMPUTE_DELAY_SECONDS of the previous one restarts the delay.
+
+    Returns:
+        bool: True if the job was scheduled, False if precomputing is disabled or the
+        background queue is not running.
     """
-    Extracts and flattens analysis summaries from user data.
+    if not ANALYSIS_PRECOMPUTE_ENABLED:
+        return False
+
+    async def precompute():
+        await ensure_analysis(conversation_id)
+
+    return background_tasks.submit_debounced(f"analysis:{conversation_id}", ANALYSIS_PRECOMPUTE_DELAY_SECONDS, precompute)
+
+async def extract_analysis_summaries(user_id: str) -> List[FlattenedAnalysisSummary]:
+    """
+    Extracts and flattens analysis summaries of the user's conversations.
 
     Args:
-        user_data (list): List of user conversations.
+        user_id (str): The ID of the user whose conversations are read.
 
     Returns:
         list: Flattened list of analyzed values from the latest analysis summaries.
     """
-    all_analysis_summaries = []
-    for conversation in user_data:
-        conversation_id = conversation["_id"]
-        user_conversation = await get_conversation_by_id(conversation_id)
-        if user_conversation and "analysis_summaries" in user_conversation:
-            # Get the last analysis summary object
-            analysis_summaries = list(user_conversation["analysis_summaries"].values())
-            last_summary_object = analysis_summaries[-1]
-            # Extract the 'analyzed_values' from the last summary object
-            analyzed_values = last_summary_object['analyzed_values']
-            all_analysis_summaries.extend(analyzed_values)
-    return all_analysis_summaries
+    return await fetch_latest_analyzed_values(user_id)
 
 async def get_consolidated_and_labeled_values_for_user(user_id: str) -> List[LabeledAttribute]:
     """
-    Retrieves all analysis summaries belonging to a specific user by first getting all conversation IDs
-    and then retrieving the values using those IDs. The function consolidates and labels the values
-    before returning them. Ignores conversations without analysis summaries.
+    Retrieves the consolidated and labeled values of all conversations belonging to a specific
+    user from the user's value profile, building the profile first if it does not exist yet.
+    Without profiles, the latest analyzed values are read in one round trip and consolidated and
+    labeled here. Ignores conversations without analysis summaries.
 
     Args:
         user_id (str): The ID of the user whose analysis summaries are to be retrieved.
@@ -164,12 +296,15 @@ async def get_consolidated_and_labeled_values_for_user(user_id: str) -> List[Lab
         HTTPException: If there is an error during data fetching or processing.
     """
     try:
-        user_conversations = await fetch_user_data_from_db(user_id)
+        if USER_VALUE_PROFILES_ENABLED:
+            profile = await get_or_build_user_value_profile(user_id, {"attributes": 1})
+            return profile_labeled_values(profile)
+
+        flattened_analysis_summaries = await extract_analysis_summaries(user_id)
         
-        if not len(user_conversations):
+        if not flattened_analysis_summaries:
             return []
         
-        flattened_analysis_summaries = await extract_analysis_summaries(user_conversations)
         consolidated_data = consolidate_values(flattened_analysis_summaries)
         labeled_data = add_new_label(consolidated_data)
         
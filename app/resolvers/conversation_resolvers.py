@@ -1,15 +1,39 @@
+import json
 import logging
+from typing import Any, AsyncIterator, Dict, Optional
 from fastapi import HTTPException
-from app.packages.models.conversation_models import UserConversationRequest, SimpleConversationQuery, GPTRequest
-from app.packages.mongodb import get_conversation, fetch_user_data_from_db, update_conversation
+from app.packages.models.conversation_models import ConversationListRequest, UserConversationRequest, SimpleConversationQuery, GPTRequest
+from app.packages.mongodb import (
+    conversation_unit_of_work,
+    get_conversation,
+    get_conversation_title,
+    list_user_conversations,
+    update_conversation
+)
+from app.packages.unit_of_work import ConversationUnitOfWork, bind_unit_of_work
 from app.services.conversation_services import process_conversation
+from app.openai_resolvers.call_site_config import bind_call_site_overrides, get_request_overrides
 from app.openai_resolvers.get_title import get_title
 from app.openai_resolvers.generate_responses import generate_responses
+from app.openai_resolvers.stream_responses import stream_responses
+from app.resolvers.analyze_resolvers import schedule_analysis_precompute
+from app.services.title_service import get_provisional_title, get_title_status, is_title_pending, schedule_title_generation
 from app.type import Conversation
-from typing import List
 
 logger = logging.getLogger(__name__)
 
+def bind_request_overrides(request: GPTRequest):
+    """
+    Applies the request's max_tokens and per-call-site overrides to the LLM calls of this turn.
+
+    Raises:
+        HTTPException: 400 if an override exceeds the configured limits.
+    """
+    try:
+        bind_call_site_overrides(get_request_overrides(request))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 async def get_conversation_resolver(request: UserConversationRequest, user_id: str) -> Conversation:
     try:
         conversation_id = request.conversation_id
@@ -25,46 +49,60 @@ async def get_conversation_resolver(request: UserConversationRequest, user_id: s
         logger.error(f"Error in get_conversation for request {request}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def get_all_user_conversations_resolver(user_id: str) -> List[Conversation]:
+async def get_all_user_conversations_resolver(user_id: str, request: Optional[ConversationListRequest] = None) -> Dict[str, Any]:
     """
     Calls the database function and handles the case where no data is found.
-    Takes user_id as a parameter.
+    Returns one page of the user's conversations, projected to the listing fields.
 
     Args:
         user_id (str): The ID of the user whose conversations are to be retrieved.
+        request (Optional[ConversationListRequest]): The cursor, page size and extra fields;
+            None for the first page with the defaults.
 
     Returns:
-        list: List of user conversations.
+        dict: The page's "conversations" and the "next_cursor" of the following page.
 
     Raises:
-        HTTPException: If there is an error during data fetching or processing.
+        HTTPException: 400 for a malformed cursor, 404 if the user has no conversations, or
+        500 if there is an error during data fetching or processing.
     """
+    request = request or ConversationListRequest()
     try:
-        user_data = await fetch_user_data_from_db(user_id)
+        page = await list_user_conversations(user_id, request.limit, request.cursor, request.fields)
         
-        if not user_data:
-            raise ValueError(f"No data found for user_id {user_id}")
+        if not page["conversations"] and not request.cursor:
+            raise LookupError(f"No data found for user_id {user_id}")
         
-        return user_data
+        return page
     except ValueError as ve:
-        logger.warning(ve)
-        raise HTTPException(status_code=404, detail=str(ve))
+        raise HTTPException(status_code=400, detail=str(ve))
+    except LookupError as le:
+        logger.warning(le)
+        raise HTTPException(status_code=404, detail=str(le))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Resolver error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error while fetching data.")
 
 async def process_answer_and_generate_followup_resolver(request: GPTRequest, user_id: str):
+    bind_request_overrides(request)
     try:
-        conversation = await process_conversation(request, user_id)
-        user_prompt = request.prompt
-        ai_question_response, ai_summary_response, ai_analyze_response, ai_answers_response = await generate_responses(conversation)
-        await update_conversation(conversation)
-        if request.is_title_generate or conversation.title is None:
-            title = await get_title([ai_summary_response]) 
-            conversation.title = title
+        # Every change of the turn is stored with one write when the turn completes.
+        async with conversation_unit_of_work():
+            conversation = await process_conversation(request, user_id)
+            user_prompt = request.prompt
+            ai_question_response, ai_summary_response, ai_analyze_response, ai_answers_response = await generate_responses(conversation, mode=request.turn_mode)
             await update_conversation(conversation)
-        else:
-            title = conversation.title
+            needs_title = request.is_title_generate or (conversation.title is None and not is_title_pending(conversation))
+            # The title is generated off the critical path when the background queue can take it;
+            # the response then carries a provisional title and a pending status the client can poll.
+            if needs_title and not await schedule_title_generation(conversation, ai_summary_response):
+                title = await get_title([ai_summary_response]) 
+                conversation.title = title
+                await update_conversation(conversation)
+        schedule_analysis_precompute(conversation.conversation_id)
+        title = get_provisional_title(conversation)
 
         return {
             "user_prompt": user_prompt,
@@ -73,8 +111,97 @@ async def process_answer_and_generate_followup_resolver(request: GPTRequest, use
             "analyze_response": ai_analyze_response,
             "answers_response": ai_answers_response,
             "conversation_id": conversation.conversation_id,
-            "title": title
+            "title": title,
+            "title_status": get_title_status(conversation)
         }
     except Exception as e:
         logger.error(f"Error in process_answer_and_generate_followup_resolver for request {request}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+async def get_conversation_title_resolver(conversation_id: str, user_id: str):
+    """
+    Returns the current title of a conversation and whether its generation is still pending,
+    for clients polling after a turn answered with a provisional title.
+
+    Args:
+        conversation_id (str): The ID of the conversation.
+        user_id (str): The ID of the current user, who must own the conversation.
+
+    Returns:
+        dict: The conversation ID, title and title status.
+
+    Raises:
+        HTTPException: If the user has no such conversation or it cannot be fetched.
+    """
+    try:
+        conversation = await get_conversation_title(conversation_id, user_id)
+        if not conversation:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        return {
+            "conversation_id": conversation_id,
+            "title": get_provisional_title(conversation),
+            "title_status": get_title_status(conversation)
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Error in get_conversation_title_resolver for conversation {conversation_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def process_answer_and_generate_followup_stream_resolver(request: GPTRequest, user_id: str) -> AsyncIterator[str]:
+    """
+    Streaming variant of process_answer_and_generate_followup_resolver.
+
+    The conversation is loaded (or created) before streaming starts so that lookup errors still
+    surface as HTTP errors. The returned iterator emits one Server-Sent Event per token tagged
+    with its source (question, summary, analyze, answers, title), persists the conversation once
+    every stream has completed, and finishes with a "done" event carrying the same payload as
+    the non-streaming endpoint. A failure mid-stream emits an "error" event and nothing is stored.
+
+    Args:
+        request (GPTRequest): The user's answer and conversation details.
+        user_id (str): The ID of the current user.
+
+    Returns:
+        AsyncIterator[str]: The formatted Server-Sent Events.
+    """
+    bind_request_overrides(request)
+    # The conversation is loaded in the turn's unit of work, so a new one is only inserted with
+    # the single write once every stream has completed.
+    unit_of_work = ConversationUnitOfWork()
+    try:
+        with bind_unit_of_work(unit_of_work):
+            conversation = await process_conversation(request, user_id)
+    except Exception as e:
+        logger.error(f"Error in process_answer_and_generate_followup_stream_resolver for request {request}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    generate_title = request.is_title_generate or (conversation.title is None and not is_title_pending(conversation))
+
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            async for event, delta in stream_responses(conversation, generate_title):
+                yield format_sse(event, {"delta": delta})
+            async with conversation_unit_of_work(unit_of_work):
+                await update_conversation(conversation)
+            schedule_analysis_precompute(conversation.conversation_id)
+        except Exception as e:
+            logger.error(f"Error streaming responses for conversation {conversation.conversation_id}: {e}")
+            yield format_sse("error", {"detail": "Internal server error while generating responses."})
+            return
+
+        yield format_sse("done", {
+            "user_prompt": request.prompt,
+            "summary_response": conversation.summaries[-1]["content"],
+            "question_response": conversation.questions[-1]["content"],
+            "analyze_response": conversation.analyze[-1]["content"],
+            "answers_response": conversation.answers[-1]["content"],
+            "conversation_id": conversation.conversation_id,
+            "title": conversation.title,
+            "title_status": get_title_status(conversation)
+        })
+
+    return event_stream()
@@ -1,5 +1,17 @@
+import hashlib
+import json
+import logging
 import re
-from typing import List, TypedDict
+from typing import Dict, List, Optional, Tuple, TypedDict
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_LABELS = ("high", "medium", "low")
+# Labels of merged incremental analyses are derived from the merged percentage.
+HIGH_LABEL_MIN_PERCENTAGE = 70
+MEDIUM_LABEL_MIN_PERCENTAGE = 40
+# How many attributes a merged incremental analysis keeps.
+ANALYSIS_MAX_VALUES = 10
 
 class Evaluation(TypedDict):
     label: str
@@ -10,6 +22,10 @@ class AttributeExplanation(TypedDict):
     explanation: str
     evaluation: Evaluation
 
+class AnalysisSummary(TypedDict):
+    analysis_summary_text: str
+    analyzed_values: List[AttributeExplanation]
+
 def clean_string(input: str) -> str:
     match = re.match(r'^\d+\.\s*(.*?)$', input)
     return match.group(1) if match else input
@@ -64,3 +80,125 @@ def get_attribute_and_explanation_object_array(input: str) -> List[AttributeExpl
         result.append(get_attribute_and_explanation_object(attribute, explanation, label, percentage))
 
     return result
+
+def get_summaries_content_and_hash(summaries: List[Dict[str, str]]) -> Tuple[str, str]:
+    """
+    Combines the assistant summaries of a conversation into the text that is analyzed, and
+    hashes it. Stored analyses are keyed by this SHA-256 hash.
+    """
+    summaries_content = " ".join(
+        summary['content']
+        for summary in summaries
+        if summary["role"] == "assistant"
+    )
+    return summaries_content, hashlib.sha256(summaries_content.encode('utf-8')).hexdigest()
+
+def format_percentage(percentage: float) -> str:
+    return f"{int(percentage)}%" if float(percentage).is_integer() else f"{percentage}%"
+
+def parse_percentage(percentage: str) -> float:
+    return float(re.sub(r"[^0-9.]", "", percentage) or 0)
+
+def render_analysis_text(summary: str, analyzed_values: List[AttributeExplanation]) -> str:
+    lines = [summary.strip()]
+    for number, value in enumerate(analyzed_values, 1):
+        evaluation = value["evaluation"]
+        lines.append(f"{number}. {value['attribute']} - {value['explanation']} - {{{evaluation['label']}: {evaluation['percentage']}}}")
+    return "\n".join(lines)
+
+def get_summary_paragraph(analysis_summary_text: str) -> str:
+    lines = []
+    for line in analysis_summary_text.split("\n"):
+        if re.match(r'^\d+\.', line.strip()):
+            break
+        lines.append(line)
+    return "\n".join(lines).strip()
+
+def parse_structured_analysis(content: str) -> AnalysisSummary:
+    """
+    Parses and validates a JSON analysis in the ANALYSIS_RESPONSE_FORMAT schema.
+
+    The result has the same shape as the text format: percentages are stored as "90%" strings
+    and analysis_summary_text is rendered as the summary paragraph followed by the numbered list.
+
+    Raises:
+        ValueError: If the content is not valid JSON or does not match the schema.
+    """
+    data = json.loads(content)
+    if not isinstance(data, dict) or not isinstance(data.get("summary"), str) or not isinstance(data.get("values"), list):
+        raise ValueError("Structured analysis must have a summary string and a values list")
+
+    analyzed_values: List[AttributeExplanation] = []
+    for value in data["values"]:
+        if not isinstance(value, dict):
+            raise ValueError(f"Invalid structured analysis value: {value}")
+        attribute, explanation, label, percentage = (value.get(key) for key in ("attribute", "explanation", "label", "percentage"))
+        if not isinstance(attribute, str) or not isinstance(explanation, str) or label not in ANALYSIS_LABELS \
+                or isinstance(percentage, bool) or not isinstance(percentage, (int, float)) or not 0 <= percentage <= 100:
+            raise ValueError(f"Invalid structured analysis value: {value}")
+        analyzed_values.append(get_attribute_and_explanation_object(attribute, explanation, label, format_percentage(percentage)))
+
+    return {"analysis_summary_text": render_analysis_text(data["summary"], analyzed_values), "analyzed_values": analyzed_values}
+
+def build_analysis_summary(analysis_summary_text: str) -> AnalysisSummary:
+    """
+    Parses an analysis completion. JSON output from the structured analysis mode is validated
+    in one pass; anything else goes through the text parser.
+
+    Raises:
+        ValueError: If JSON output fails validation, or the completion holds no values. Such an
+            analysis must not be stored, since it would be served for the summaries from then on.
+    """
+    if analysis_summary_text.lstrip().startswith("{"):
+        return parse_structured_analysis(analysis_summary_text)
+    analyzed_values = get_attribute_and_explanation_object_array(analysis_summary_text)
+    if not analyzed_values:
+        raise ValueError("Analysis holds no values")
+    return {"analysis_summary_text": analysis_summary_text, "analyzed_values": analyzed_values}
+
+def find_previous_analysis(summaries: List[Dict[str, str]], analysis_summaries: Dict[str, AnalysisSummary]) -> Optional[Tuple[int, AnalysisSummary]]:
+    """
+    Finds the stored analysis that covers the longest prefix of the conversation's assistant
+    summaries, by hashing each prefix the way get_summaries_content_and_hash does.
+
+    Returns:
+        Optional[Tuple[int, AnalysisSummary]]: The number of summaries the analysis covers and
+        the analysis, or None if no earlier analysis is stored.
+    """
+    if not analysis_summaries:
+        return None
+    assistant_summaries = [summary for summary in summaries if summary["role"] == "assistant"]
+    for count in range(len(assistant_summaries) - 1, 0, -1):
+        _, sha256_hash = get_summaries_content_and_hash(assistant_summaries[:count])
+        if sha256_hash in analysis_summaries:
+            return count, analysis_summaries[sha256_hash]
+    return None
+
+def merge_analyses(previous: AnalysisSummary, previous_weight: float, new: AnalysisSummary, new_weight: float) -> AnalysisSummary:
+    """
+    Merges the analysis of newly added summaries into the analysis of the earlier ones.
+
+    Each side is weighted by the number of summaries it covers. An attribute's merged
+    percentage is the weighted mean of its percentages, counting 0 on the side that did not
+    find it, so attributes that keep showing up rise and one-off attributes fade. The label
+    follows from the merged percentage, the explanation from the newest analysis that has the
+    attribute, and the ANALYSIS_MAX_VALUES strongest attributes are kept. The summary paragraph
+    is the one of the new analysis.
+    """
+    total_weight = previous_weight + new_weight
+    merged: Dict[str, Dict] = {}
+    for weight, analysis in ((previous_weight, previous), (new_weight, new)):
+        for value in analysis["analyzed_values"]:
+            entry = merged.setdefault(value["attribute"], {"score": 0.0, "explanation": value["explanation"]})
+            entry["score"] += weight * parse_percentage(value["evaluation"]["percentage"])
+            entry["explanation"] = value["explanation"]
+
+    ranked = sorted(merged.items(), key=lambda item: item[1]["score"], reverse=True)[:ANALYSIS_MAX_VALUES]
+    analyzed_values: List[AttributeExplanation] = []
+    for attribute, entry in ranked:
+        percentage = round(entry["score"] / total_weight, 1)
+        label = "high" if percentage >= HIGH_LABEL_MIN_PERCENTAGE else "medium" if percentage >= MEDIUM_LABEL_MIN_PERCENTAGE else "low"
+        analyzed_values.append(get_attribute_and_explanation_object(attribute, entry["explanation"], label, format_percentage(percentage)))
+
+    summary = get_summary_paragraph(new["analysis_summary_text"]) or get_summary_paragraph(previous["analysis_summary_text"])
+    return {"analysis_summary_text": render_analysis_text(summary, analyzed_values), "analyzed_values": analyzed_values}
@@ -0,0 +1,175 @@
+import math
+import os
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Character n-gram sizes of the hashed token vectors, and the size of the hashed feature space.
+NGRAM_SIZES = (3, 4)
+HASH_BUCKETS = 1 << 18
+# A token matches an attribute term when the cosine similarity of their vectors, times the
+# term weight, reaches this value.
+LOCAL_KEYWORDS_MIN_SIMILARITY = float(os.getenv("LOCAL_KEYWORDS_MIN_SIMILARITY", 0.75))
+# Texts whose strongest attribute scores below this are left to the LLM. It sits above the
+# explanation weight, so a text matched only through explanation words is never trusted.
+LOCAL_KEYWORDS_MIN_CONFIDENCE = float(os.getenv("LOCAL_KEYWORDS_MIN_CONFIDENCE", 0.9))
+LOCAL_KEYWORDS_MAX_KEYWORDS = int(os.getenv("LOCAL_KEYWORDS_MAX_KEYWORDS", 8))
+# Attribute names and their variants count fully; distinctive explanation words count less.
+NAME_WEIGHT = 1.0
+EXPLANATION_WEIGHT = 0.8
+
+MIN_TOKEN_LENGTH = 3
+# Suffixes stripped from attribute names to derive variants, e.g. Honesty -> honest.
+VARIANT_SUFFIXES = ("fulness", "ness", "ship", "ity", "ment", "ance", "ence", "ism", "ion", "ing", "y")
+MIN_STEM_LENGTH = 4
+STOPWORDS = frozenset("""
+    a about after all an and any are as at be been being by can could for from has have her his
+    in into is it its life living may more most not of on one one's oneself or other others our
+    own such than that the their them themselves they this those through to towards very was
+    were what when which while who will with without would you your
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z'-]*")
+
+Vector = Dict[int, float]
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        token.strip("'-")
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if len(token.strip("'-")) >= MIN_TOKEN_LENGTH and token.strip("'-") not in STOPWORDS
+    ]
+
+def hashed_ngram_vector(token: str) -> Vector:
+    """
+    L2-normalized vector of the hashed character n-grams of the token. Only the start of the
+    word is marked, so inflected forms ("committed") stay close to their stem ("commit").
+    """
+    padded = f"<{token}"
+    counts: Vector = defaultdict(float)
+    for size in NGRAM_SIZES:
+        for start in range(len(padded) - size + 1):
+            counts[zlib.crc32(padded[start:start + size].encode("utf-8")) % HASH_BUCKETS] += 1.0
+    norm = math.sqrt(sum(value * value for value in counts.values())) or 1.0
+    return {feature: value / norm for feature, value in counts.items()}
+
+def name_variants(name: str) -> List[str]:
+    variants = {name.lower()}
+    for word in tokenize(name):
+        variants.add(word)
+        for suffix in VARIANT_SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+                variants.add(word[:-len(suffix)])
+                break
+    return sorted(variants)
+
+
+class AttributeMatcher:
+    """
+    Finds the attributes of the catalog mentioned in a text without calling the model.
+
+    The index holds one hashed character n-gram vector per attribute term: the name, its
+    words and suffix-stripped variants, and the explanation words that belong to no other
+    attribute. An inverted index from n-gram feature to terms lets every distinct token of a
+    batch of texts be scored against all terms with one pass over its features, so similar
+    word forms ("honest", "honesty") match while unrelated words cost nothing.
+    """
+
+    def __init__(
+        self,
+        catalog: Iterable[Dict[str, str]],
+        min_similarity: float = LOCAL_KEYWORDS_MIN_SIMILARITY,
+        min_confidence: float = LOCAL_KEYWORDS_MIN_CONFIDENCE,
+    ):
+        self.min_similarity = min_similarity
+        self.min_confidence = min_confidence
+        self.attribute_names: List[str] = []
+        self.terms: List[Tuple[int, float]] = []
+        self.postings: Dict[int, List[Tuple[int, float]]] = defaultdict(list)
+        self.build(list(catalog))
+
+    def build(self, catalog: List[Dict[str, str]]):
+        explanations: Dict[str, set] = defaultdict(set)
+        for entry in catalog:
+            name = entry["attribute"]
+            if name not in self.attribute_names:
+                self.attribute_names.append(name)
+            explanations[name].update(tokenize(entry.get("explanation", "")))
+
+        # Explanation words shared by several attributes, or naming another attribute, say
+        # nothing about which attribute a text is about.
+        owners: Dict[str, set] = defaultdict(set)
+        for name in self.attribute_names:
+            for word in explanations[name] | set(name_variants(name)):
+                owners[word].add(name)
+
+        for attribute_id, name in enumerate(self.attribute_names):
+            terms = {variant: NAME_WEIGHT for variant in name_variants(name)}
+            for word in explanations[name]:
+                if owners[word] == {name} and word not in terms:
+                    terms[word] = EXPLANATION_WEIGHT
+            for term, weight in terms.items():
+                self.add_term(attribute_id, term, weight)
+
+    def add_term(self, attribute_id: int, term: str, weight: float):
+        term_id = len(self.terms)
+        self.terms.append((attribute_id, weight))
+        for feature, value in hashed_ngram_vector(term).items():
+            self.postings[feature].append((term_id, value))
+
+    def score_token(self, token: str) -> Dict[int, float]:
+        """
+        Returns the best weighted similarity of the token to each attribute it matches.
+        """
+        dot_products: Dict[int, float] = defaultdict(float)
+        for feature, value in hashed_ngram_vector(token).items():
+            for term_id, term_value in self.postings.get(feature, ()):
+                dot_products[term_id] += value * term_value
+
+        scores: Dict[int, float] = {}
+        for term_id, similarity in dot_products.items():
+            attribute_id, weight = self.terms[term_id]
+            score = similarity * weight
+            if score >= self.min_similarity and score > scores.get(attribute_id, 0.0):
+                scores[attribute_id] = score
+        return scores
+
+    def match(self, text: str, token_scores: Optional[Dict[str, Dict[int, float]]] = None) -> List[Tuple[str, float]]:
+        """
+        Returns the attributes found in the text with their confidence, the best similarity of
+        any of its tokens, strongest first. Ties go to the attribute hit more often, then to the
+        one mentioned first.
+        """
+        token_scores = token_scores if token_scores is not None else {}
+        best: Dict[int, float] = {}
+        hits: Dict[int, int] = defaultdict(int)
+        first_seen: Dict[int, int] = {}
+        for position, token in enumerate(tokenize(text)):
+            if token not in token_scores:
+                token_scores[token] = self.score_token(token)
+            for attribute_id, score in token_scores[token].items():
+                best[attribute_id] = max(best.get(attribute_id, 0.0), score)
+                hits[attribute_id] += 1
+                first_seen.setdefault(attribute_id, position)
+
+        ranked = sorted(best, key=lambda attribute_id: (-round(best[attribute_id], 6), -hits[attribute_id], first_seen[attribute_id]))
+        return [(self.attribute_names[attribute_id], best[attribute_id]) for attribute_id in ranked]
+
+    def extract_keywords(self, texts: List[str], max_keywords: int = LOCAL_KEYWORDS_MAX_KEYWORDS) -> List[Optional[str]]:
+        """
+        Extracts the keywords of a batch of texts in the comma-separated format of the LLM
+        extractor. Tokens repeated across the batch are scored once.
+
+        Returns:
+            List[Optional[str]]: The keywords of each text, or None where the strongest match is
+            below min_confidence and the text should go to the LLM instead.
+        """
+        token_scores: Dict[str, Dict[int, float]] = {}
+        results: List[Optional[str]] = []
+        for text in texts:
+            matches = self.match(text, token_scores)[:max_keywords]
+            confident = matches and matches[0][1] >= self.min_confidence
+            results.append(", ".join(name for name, _ in matches) if confident else None)
+        return results
@@ -0,0 +1,110 @@
+import asyncio
+import contextvars
+import logging
+import os
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_QUEUE_MAXSIZE = int(os.getenv("BACKGROUND_QUEUE_MAXSIZE", 100))
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", 2))
+BACKGROUND_DRAIN_TIMEOUT_SECONDS = float(os.getenv("BACKGROUND_DRAIN_TIMEOUT_SECONDS", 10))
+
+Job = Callable[[], Awaitable[None]]
+
+
+class BackgroundTaskQueue:
+    """
+    In-process asyncio job queue with a fixed pool of workers.
+
+    Jobs are submitted without blocking the request: submit() returns False when the queue is
+    not running or is full, so the caller can fall back to doing the work inline. On shutdown,
+    drain() stops accepting jobs and waits for the queued ones to finish before cancelling the workers.
+
+    submit_debounced() delays a job and restarts the delay whenever a job with the same name is
+    submitted again, so a burst of submissions queues only the last one.
+
+    Jobs start with every context variable at its default; whatever a job needs from the
+    request that submitted it has to be passed to it explicitly.
+    """
+
+    def __init__(self, maxsize: int = BACKGROUND_QUEUE_MAXSIZE, workers: int = BACKGROUND_WORKERS):
+        self.maxsize = maxsize
+        self.worker_count = workers
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: List[asyncio.Task] = []
+        self.accepting = False
+        self.debounced: Dict[str, asyncio.TimerHandle] = {}
+
+    @property
+    def running(self) -> bool:
+        return self.accepting and bool(self.workers)
+
+    def has_capacity(self) -> bool:
+        return self.running and not self.queue.full()
+
+    def qsize(self) -> int:
+        return self.queue.qsize() if self.queue is not None else 0
+
+    async def start(self):
+        if self.workers:
+            return
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self.workers = [asyncio.create_task(self._work(index)) for index in range(self.worker_count)]
+        self.accepting = True
+
+    def submit(self, name: str, job: Job) -> bool:
+        if not self.running:
+            return False
+        try:
+            self.queue.put_nowait((name, job))
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"Background queue is full, rejecting job {name}")
+            return False
+
+    def submit_debounced(self, name: str, delay: float, job: Job) -> bool:
+        if not self.running:
+            return False
+        if name in self.debounced:
+            self.debounced[name].cancel()
+        self.debounced[name] = asyncio.get_running_loop().call_later(delay, self._submit_debounced, name, job)
+        return True
+
+    def _submit_debounced(self, name: str, job: Job):
+        del self.debounced[name]
+        self.submit(name, job)
+
+    async def drain(self, timeout: float = BACKGROUND_DRAIN_TIMEOUT_SECONDS):
+        if not self.workers:
+            return
+        self.accepting = False
+        if self.debounced:
+            logger.info(f"Dropping {len(self.debounced)} debounced background jobs on shutdown")
+        for handle in self.debounced.values():
+            handle.cancel()
+        self.debounced.clear()
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Background queue drain timed out with {self.queue.qsize()} jobs left")
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        self.queue = None
+
+    async def _work(self, index: int):
+        while True:
+            name, job = await self.queue.get()
+            try:
+                # Each job runs in its own task with an empty context, so context variables bound
+                # by an earlier job (such as the LLM user and topic) do not carry over to it.
+                await contextvars.Context().run(asyncio.create_task, job())
+            except Exception as e:
+                logger.error(f"Background job {name} failed in worker {index}: {e}")
+            finally:
+                self.queue.task_done()
+
+
+background_tasks = BackgroundTaskQueue()
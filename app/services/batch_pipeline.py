@@ -0,0 +1,224 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from typing import Any, Dict, Optional
+from app.openai_resolvers.batch_backends import BATCH_FAILED, BATCH_IN_PROGRESS, BatchBackend, create_batch_backend
+from app.openai_resolvers.call_site_config import get_call_site_config
+from app.openai_resolvers.keyword_extraction import (
+    ANALYSIS_RESPONSE_FORMAT,
+    ANALYSIS_STRUCTURED,
+    create_prompt_for_single_sentence,
+    create_prompts_for_multiple_sentences,
+)
+from app.packages.mongodb import (
+    find_conversations_for_batch,
+    get_conversation_by_id,
+    store_keywords,
+    update_or_append_field_by_id,
+)
+from app.services.analyze_service import build_analysis_summary, get_summaries_content_and_hash
+from app.services.value_profile import USER_VALUE_PROFILES_ENABLED, update_user_value_profile
+
+logger = logging.getLogger(__name__)
+
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", 60))
+
+# Pipeline stages, in order. The checkpoint records the last stage that completed.
+STAGE_COLLECTED = "collected"
+STAGE_SUBMITTED = "submitted"
+STAGE_DOWNLOADED = "downloaded"
+STAGE_INGESTED = "ingested"
+
+
+def batch_request(custom_id: str, call_site: str, messages, **params: Any) -> Dict[str, Any]:
+    # Batched requests use the same model and parameters as the call site they stand in for.
+    config = get_call_site_config(call_site)
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {"model": config.model, "messages": messages, **config.params(), **params},
+    }
+
+def load_checkpoint(run_dir: str) -> Dict[str, Any]:
+    path = os.path.join(run_dir, "checkpoint.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as checkpoint_file:
+        return json.load(checkpoint_file)
+
+def save_checkpoint(run_dir: str, checkpoint: Dict[str, Any]):
+    path = os.path.join(run_dir, "checkpoint.json")
+    with open(f"{path}.tmp", "w") as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(f"{path}.tmp", path)
+
+async def collect_batch_requests(input_path: str) -> int:
+    """
+    Writes a request for every conversation whose current summaries have no stored analysis,
+    and for every analyze message that has no keywords yet, to a JSONL batch file.
+
+    Returns:
+        int: The number of requests written.
+    """
+    count = 0
+    with open(f"{input_path}.tmp", "w") as input_file:
+        async for conversation in find_conversations_for_batch():
+            conversation_id = str(conversation["_id"])
+
+            summaries_content, sha256_hash = get_summaries_content_and_hash(conversation["summaries"])
+            if summaries_content and sha256_hash not in conversation.get("analysis_summaries", {}):
+                request = batch_request(
+                    f"analysis:{conversation_id}:{sha256_hash}",
+                    "analysis",
+                    create_prompt_for_single_sentence(summaries_content, structured=ANALYSIS_STRUCTURED),
+                    **({"response_format": ANALYSIS_RESPONSE_FORMAT} if ANALYSIS_STRUCTURED else {}),
+                )
+                input_file.write(json.dumps(request) + "\n")
+                count += 1
+
+            analyze = [message["content"] for message in conversation.get("analyze", []) if message["role"] == "assistant"]
+            keyword_count = len(conversation.get("keywords") or [])
+            prompts = create_prompts_for_multiple_sentences(analyze[keyword_count:])
+            for index, prompt in enumerate(prompts, start=keyword_count):
+                input_file.write(json.dumps(batch_request(f"keywords:{conversation_id}:{index}", "keywords", [prompt])) + "\n")
+                count += 1
+    os.replace(f"{input_path}.tmp", input_path)
+    return count
+
+async def ingest_batch_results(output_path: str) -> Dict[str, int]:
+    """
+    Stores the analyses and keywords of a batch output file. Ingesting the same file twice
+    is harmless: analyses are keyed by summary hash and keywords by position, so a resumed
+    run rewrites the same values. Analyses of summaries that changed while the batch ran are
+    dropped, since storing them would make an outdated analysis the conversation's latest.
+
+    Returns:
+        Dict[str, int]: How many analyses and keywords were stored, how many results failed and
+        how many analyses were stale.
+    """
+    counts = {"analyses": 0, "keywords": 0, "failed": 0, "stale": 0}
+    keywords_by_conversation: Dict[str, Dict[int, str]] = defaultdict(dict)
+
+    with open(output_path) as output_file:
+        for line in filter(str.strip, output_file):
+            result = json.loads(line)
+            kind, conversation_id, key = result["custom_id"].split(":", 2)
+            response = result.get("response") or {}
+            if result.get("error") or response.get("status_code") != 200:
+                logger.warning(f"Batch request {result['custom_id']} failed: {result.get('error') or response}")
+                counts["failed"] += 1
+                continue
+            content = response["body"]["choices"][0]["message"]["content"].strip()
+
+            if kind == "analysis":
+                try:
+                    value_object = build_analysis_summary(content)
+                except ValueError as e:
+                    logger.warning(f"Could not parse batch analysis for conversation {conversation_id}: {e}")
+                    counts["failed"] += 1
+                    continue
+                conversation = await get_conversation_by_id(conversation_id)
+                if not conversation or get_summaries_content_and_hash(conversation["summaries"])[1] != key:
+                    logger.info(f"Dropping batch analysis of conversation {conversation_id}: its summaries changed")
+                    counts["stale"] += 1
+                    continue
+                await update_or_append_field_by_id(
+                    conversation_id=conversation_id,
+                    field_name="analysis_summaries",
+                    key=key,
+                    value=value_object
+                )
+                if USER_VALUE_PROFILES_ENABLED and conversation.get("user_id"):
+                    await update_user_value_profile(conversation["user_id"], conversation_id, key, value_object["analyzed_values"])
+                counts["analyses"] += 1
+            elif kind == "keywords":
+                keywords_by_conversation[conversation_id][int(key)] = content
+
+    for conversation_id, new_keywords in keywords_by_conversation.items():
+        conversation = await get_conversation_by_id(conversation_id)
+        keywords = list((conversation or {}).get("keywords") or [])
+        # Keywords are stored positionally against the analyze messages, so only a run that
+        # continues the stored list can be appended.
+        appended = 0
+        while len(keywords) in new_keywords:
+            keywords.append(new_keywords[len(keywords)])
+            appended += 1
+        if appended:
+            await store_keywords(conversation_id, keywords)
+            counts["keywords"] += appended
+
+    return counts
+
+async def run_batch_pipeline(run_dir: str, backend: Optional[BatchBackend] = None, poll_seconds: float = BATCH_POLL_SECONDS) -> Dict[str, Any]:
+    """
+    Collects pending analysis and keyword prompts, runs them through a batch backend and stores
+    the results. Progress is checkpointed in run_dir after every stage, so running the pipeline
+    again with the same run_dir after a crash resumes where it stopped instead of starting over.
+
+    Args:
+        run_dir (str): Directory holding the batch files and the checkpoint of this run.
+        backend (Optional[BatchBackend]): The batch backend, defaults to BATCH_BACKEND.
+        poll_seconds (float): Seconds between status checks of a submitted batch.
+
+    Returns:
+        Dict[str, Any]: The final checkpoint, including the ingestion counts.
+    """
+    backend = backend or create_batch_backend()
+    os.makedirs(run_dir, exist_ok=True)
+    input_path = os.path.join(run_dir, "input.jsonl")
+    output_path = os.path.join(run_dir, "output.jsonl")
+    checkpoint = load_checkpoint(run_dir)
+
+    if not checkpoint.get("stage"):
+        checkpoint = {"stage": STAGE_COLLECTED, "requests": await collect_batch_requests(input_path)}
+        save_checkpoint(run_dir, checkpoint)
+        logger.info(f"Collected {checkpoint['requests']} batch requests in {input_path}")
+        if not checkpoint["requests"]:
+            checkpoint.update(stage=STAGE_INGESTED, counts={"analyses": 0, "keywords": 0, "failed": 0})
+            save_checkpoint(run_dir, checkpoint)
+            return checkpoint
+
+    if checkpoint["stage"] == STAGE_COLLECTED:
+        checkpoint.update(stage=STAGE_SUBMITTED, batch_id=await backend.submit(input_path))
+        save_checkpoint(run_dir, checkpoint)
+        logger.info(f"Submitted batch {checkpoint['batch_id']}")
+
+    if checkpoint["stage"] == STAGE_SUBMITTED:
+        status = await backend.status(checkpoint["batch_id"])
+        while status == BATCH_IN_PROGRESS:
+            await asyncio.sleep(poll_seconds)
+            status = await backend.status(checkpoint["batch_id"])
+        if status == BATCH_FAILED:
+            # The next run submits the collected requests again.
+            checkpoint.update(stage=STAGE_COLLECTED, batch_id=None)
+            save_checkpoint(run_dir, checkpoint)
+            raise RuntimeError(f"Batch for {run_dir} failed, run the pipeline again to resubmit it")
+        await backend.download(checkpoint["batch_id"], output_path)
+        checkpoint["stage"] = STAGE_DOWNLOADED
+        save_checkpoint(run_dir, checkpoint)
+
+    if checkpoint["stage"] == STAGE_DOWNLOADED:
+        checkpoint.update(stage=STAGE_INGESTED, counts=await ingest_batch_results(output_path))
+        save_checkpoint(run_dir, checkpoint)
+        logger.info(f"Ingested batch results: {checkpoint['counts']}")
+
+    return checkpoint
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute missing analyses and keywords offline through a batch backend.")
+    parser.add_argument("--run-dir", required=True, help="Directory for the batch files and checkpoint; reuse it to resume a run.")
+    parser.add_argument("--backend", default=None, help="Batch backend: openai or local (defaults to BATCH_BACKEND).")
+    parser.add_argument("--poll-seconds", type=float, default=BATCH_POLL_SECONDS)
+    args = parser.parse_args()
+
+    result = asyncio.run(run_batch_pipeline(
+        args.run_dir,
+        backend=create_batch_backend(args.backend) if args.backend else None,
+        poll_seconds=args.poll_seconds,
+    ))
+    print(json.dumps(result, indent=2))
@@ -5,6 +5,21 @@ from typing import List
 from app.type import ConsolidatedAttribute, AttributeExplanation
 
 
+def consolidate_attribute(attribute: str, explanation: str, total: float, count: int) -> ConsolidatedAttribute:
+    """
+    Computes the mean percentage and relevance score of an attribute from the sum and number
+    of its percentages.
+    """
+    mean_percentage = total / count
+    relevance_score = mean_percentage * (1 + math.log(count + 1))
+    return {
+        "attribute": attribute,
+        "explanation": explanation,
+        "mean": mean_percentage,
+        "count": count,
+        "relevance_score": relevance_score
+    }
+
 def consolidate_values(data: List[AttributeExplanation]) -> List[ConsolidatedAttribute]:
     """
     Consolidates values by calculating mean percentage and relevance score for each attribute.
@@ -31,15 +46,8 @@ def consolidate_values(data: List[AttributeExplanation]) -> List[ConsolidatedAtt
     results: List[ConsolidatedAttribute] = []
 
     for attribute, values in grouped_data.items():
-        mean_percentage = values["total"] / values["count"]
-        relevance_score = mean_percentage * (1 + math.log(values["count"] + 1))
-        results.append({
-            "attribute": attribute,
-            "explanation": next(entry["explanation"] for entry in data if entry["attribute"] == attribute),
-            "mean": mean_percentage,
-            "count": values["count"],
-            "relevance_score": relevance_score
-        })
+        explanation = next(entry["explanation"] for entry in data if entry["attribute"] == attribute)
+        results.append(consolidate_attribute(attribute, explanation, values["total"], values["count"]))
 
     # Sort results by relevance score in descending order
     sorted_results = sorted(results, key=lambda x: x["relevance_score"], reverse=True)
@@ -0,0 +1,83 @@
+import os
+import logging
+from typing import Dict, List, Optional
+from app.openai_resolvers.completions import create_chat_completion
+from app.services.token_counter import count_message_tokens, count_tokens
+from app.type import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", 3))
+
+FOLD_PROMPT = (
+    "You maintain a running summary of a conversation between an assistant and a user. "
+    "Update the existing summary with the new messages. Keep every fact the user shared about "
+    "their experiences, feelings and values, drop pleasantries, and answer with the summary only."
+)
+
+
+def create_summary_message(summary: str) -> Dict[str, str]:
+    return {"role": "system", "content": f"Summary of the earlier conversation: {summary}"}
+
+async def fold_messages(previous_summary: Optional[str], messages: List[Message]) -> str:
+    transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+    content = f"Existing summary: {previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+    response = await create_chat_completion(
+        messages=[{"role": "system", "content": FOLD_PROMPT}, {"role": "user", "content": content}],
+        call_site="context",
+    )
+    return response.choices[0].message.content.strip()
+
+async def build_context(
+    user_conversation: Conversation,
+    history_name: str,
+    messages: Optional[List[Message]] = None,
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    keep_turns: int = CONTEXT_KEEP_TURNS,
+) -> List[Message]:
+    """
+    Returns the messages to send for one of the conversation histories, kept under a token budget.
+
+    The leading system prompt is always pinned. When the history exceeds the budget, every
+    message except the last keep_turns turns is folded into a rolling summary stored on the
+    conversation (context_summaries / context_folded), so a summary is only regenerated when
+    the history outgrows the budget again. The stored history itself is never truncated.
+
+    Args:
+        user_conversation (Conversation): The conversation that owns the history.
+        history_name (str): "questions", "summaries", "analyze" or "answers".
+        messages (Optional[List[Message]]): The messages to fit, defaults to the stored history.
+        budget (int): The maximum approximate token count to send.
+        keep_turns (int): The number of most recent user/assistant turns always sent verbatim.
+
+    Returns:
+        List[Message]: The pinned system prompt, the rolling summary if any, and the recent messages.
+    """
+    if messages is None:
+        messages = getattr(user_conversation, history_name)
+
+    pinned = messages[:1] if messages and messages[0]["role"] == "system" else []
+    body = messages[len(pinned):]
+    folded = user_conversation.context_folded.get(history_name, 0)
+    summary = user_conversation.context_summaries.get(history_name)
+
+    def assemble(cut: int) -> List[Message]:
+        summary_messages = [create_summary_message(summary)] if summary and cut else []
+        return pinned + summary_messages + body[cut:]
+
+    context = assemble(folded)
+    if count_message_tokens(context) <= budget:
+        return context
+
+    cut = max(folded, len(body) - keep_turns * 2)
+    if cut > folded:
+        summary = await fold_messages(summary, body[folded:cut])
+        user_conversation.context_summaries[history_name] = summary
+        user_conversation.context_folded[history_name] = cut
+        logger.info(f"Folded {cut - folded} {history_name} messages of conversation {user_conversation.conversation_id} into the rolling summary")
+        context = assemble(cut)
+
+    if count_message_tokens(context) > budget:
+        logger.warning(f"{history_name} context of conversation {user_conversation.conversation_id} exceeds the token budget after folding")
+    return context
@@ -1,6 +1,8 @@
+from bson import ObjectId
 from fastapi import HTTPException
 from app.packages.models.conversation_models import GPTRequest, UserConversationQuery
 from app.packages.mongodb import init_or_get_conversation, create_conversation
+from app.packages.unit_of_work import current_unit_of_work
 from app.services.get_system_role import get_system_role
 from app.type import Conversation
 import logging
@@ -36,7 +38,13 @@ async def process_conversation(request: GPTRequest, user_id: str) -> Conversatio
         conversation.analyze.append({"role": "user", "content": request.prompt})
 
         if not conversation.conversation_id:
-            conversation.conversation_id = await create_conversation(conversation)
+            unit_of_work = current_unit_of_work.get()
+            if unit_of_work is not None:
+                # Inserted by the unit of work's single write at the end of the turn.
+                conversation.conversation_id = str(ObjectId())
+                unit_of_work.register(conversation)
+            else:
+                conversation.conversation_id = await create_conversation(conversation)
 
         return conversation
     except HTTPException as e:
@@ -1,6 +1,6 @@
 from fastapi import HTTPException
 from app.data import questions
-from app.type import SystemRoles
+from app.type import SystemRole, SystemRoles
 from app.openai_resolvers.keyword_extraction import adviser_prompts
 from app.exceptions import InvalidTopicException
 
@@ -17,6 +17,17 @@ def create_answers_system_role(primary_question: str):
     )
     return text
 
+def create_turn_system_role(primary_question: str):
+    text = (
+        f"You are an assistant that guides the user to reflect on their values through the question: '{primary_question}'.\n"
+        "After each user message, respond with a JSON object with these fields:\n"
+        "- question: the next question that guides the user to reflect on their values.\n"
+        "- summary: a summary of the user's responses to the question.\n"
+        f"- analysis: an analysis of the user's values, following these instructions: {adviser_prompts}\n"
+        "- answers: several possible answers the user might give to your next question, each with a title and an answer.\n"
+    )
+    return text
+
 def check_topic(topic: str):
     if topic not in questions:
         raise InvalidTopicException(topic)
@@ -43,3 +54,14 @@ def get_system_role(topic: str) -> SystemRoles:
         return system_roles
     except InvalidTopicException as e:
         raise HTTPException(status_code=500, detail=e.message)
+
+def get_turn_system_role(topic: str) -> SystemRole:
+    """
+    Returns the system prompt of the single-call turn mode, which asks for the follow-up
+    question, summary, analysis and possible answers in one structured completion.
+    """
+    try:
+        check_topic(topic)
+        return {"role": "system", "content": create_turn_system_role(questions[topic])}
+    except InvalidTopicException as e:
+        raise HTTPException(status_code=500, detail=e.message)
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+from app.packages.mongodb import acquire_lease, release_lease
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key within this process: the first caller starts
+    the function in its own task and every caller that arrives while it is in flight awaits the
+    same result. The call runs to completion even if every caller stops waiting.
+    """
+
+    def __init__(self):
+        self.calls: Dict[Hashable, asyncio.Task] = {}
+        self.coalesced = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self.calls
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        if key in self.calls:
+            self.coalesced += 1
+        else:
+            # The call runs detached from the caller that started it, so that caller
+            # disconnecting does not cancel the call for everyone else awaiting it.
+            task = asyncio.create_task(fn())
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self.finish(key, done))
+        # Shielded so cancelling a caller only cancels its own wait.
+        return await asyncio.shield(self.calls[key])
+
+    def finish(self, key: Hashable, task: asyncio.Task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        # Mark the exception as retrieved when nobody was left waiting for it.
+        if not task.cancelled():
+            task.exception()
+
+
+async def run_with_lease(
+    key: str,
+    fn: Callable[[], Awaitable[T]],
+    lookup: Callable[[], Awaitable[Optional[T]]],
+    ttl_seconds: float,
+    poll_interval: float,
+) -> T:
+    """
+    Coalesces identical work across workers with a short-lived lease document.
+
+    The worker that acquires the lease runs fn. Other workers poll lookup until the result
+    appears, and take over if the lease expires first because its holder died.
+
+    Args:
+        key (str): Identifies the work; only one worker holds the lease for a key at a time.
+        fn (Callable[[], Awaitable[T]]): Computes and stores the result.
+        lookup (Callable[[], Awaitable[Optional[T]]]): Reads the stored result, or None if absent.
+        ttl_seconds (float): How long a lease is valid; should exceed the expected run time of fn.
+        poll_interval (float): Seconds between lookups while another worker holds the lease.
+
+    Returns:
+        T: The result computed here or by the worker holding the lease.
+    """
+    owner = uuid.uuid4().hex
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + ttl_seconds
+    while True:
+        if await acquire_lease(key, owner, ttl_seconds):
+            try:
+                # The previous holder may have stored the result just before its lease ended.
+                result = await lookup()
+                if result is not None:
+                    return result
+                return await fn()
+            finally:
+                await release_lease(key, owner)
+
+        if loop.time() >= deadline:
+            logger.warning(f"Lease {key} was not released in time, computing locally")
+            return await fn()
+
+        await asyncio.sleep(poll_interval)
+        result = await lookup()
+        if result is not None:
+            return result
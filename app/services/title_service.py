@@ -0,0 +1,86 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+from app.openai_resolvers.call_site_config import apply_call_site_overrides, current_call_site_overrides
+from app.openai_resolvers.get_title import get_title
+from app.packages.mongodb import update_conversation_title
+from app.packages.unit_of_work import after_commit
+from app.services.background_tasks import background_tasks
+from app.type import Conversation
+
+logger = logging.getLogger(__name__)
+
+TITLE_PENDING = "pending"
+TITLE_READY = "ready"
+TITLE_FAILED = "failed"
+
+# A pending title older than this is assumed lost (e.g. the worker restarted) and is requested again.
+TITLE_PENDING_TIMEOUT = timedelta(minutes=5)
+
+
+def is_title_pending(conversation: Conversation) -> bool:
+    if conversation.title_status != TITLE_PENDING or conversation.title_requested_at is None:
+        return False
+    requested_at = conversation.title_requested_at
+    if requested_at.tzinfo is None:
+        requested_at = requested_at.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - requested_at < TITLE_PENDING_TIMEOUT
+
+def get_title_status(conversation: Conversation) -> Optional[str]:
+    if is_title_pending(conversation):
+        return TITLE_PENDING
+    if conversation.title:
+        return TITLE_READY
+    return TITLE_FAILED if conversation.title_status == TITLE_FAILED else None
+
+def get_provisional_title(conversation: Conversation) -> str:
+    return conversation.title or conversation.topic
+
+async def generate_and_store_title(conversation_id: str, summary: str, overrides: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    try:
+        with apply_call_site_overrides({"title": overrides} if overrides else {}):
+            title = await get_title([summary])
+        await update_conversation_title(conversation_id, title=title, title_status=TITLE_READY)
+        return title
+    except Exception as e:
+        logger.error(f"Error generating title for conversation {conversation_id}: {e}")
+        await update_conversation_title(conversation_id, title_status=TITLE_FAILED)
+        return None
+
+async def schedule_title_generation(conversation: Conversation, summary: str) -> bool:
+    """
+    Marks the conversation's title as pending and queues its generation on the background worker.
+
+    The pending status is stored before the job is queued so the job's final write always wins;
+    within a unit of work, the job is queued once the turn has been stored.
+    If the queue fills up in between, the title is generated inline instead.
+
+    Args:
+        conversation (Conversation): The conversation to title. Its title fields are updated in place.
+        summary (str): The summary the title is generated from.
+
+    Returns:
+        bool: True if the title service took care of the title, False if the background queue
+        is not running or full and the caller should generate the title itself.
+    """
+    if not background_tasks.has_capacity():
+        return False
+
+    conversation_id = conversation.conversation_id
+    conversation.title_status = TITLE_PENDING
+    conversation.title_requested_at = datetime.now(timezone.utc)
+    await update_conversation_title(conversation_id, title_status=TITLE_PENDING, title_requested_at=conversation.title_requested_at)
+
+    # The job runs outside this request, so the request's title overrides are handed to it.
+    overrides = current_call_site_overrides.get().get("title")
+
+    async def queue_generation():
+        if not background_tasks.submit(f"title:{conversation_id}", lambda: generate_and_store_title(conversation_id, summary, overrides)):
+            title = await generate_and_store_title(conversation_id, summary, overrides)
+            conversation.title = title or conversation.title
+            conversation.title_status = TITLE_READY if title else TITLE_FAILED
+
+    # Within a unit of work the pending status is only stored when the turn is, so the job is
+    # queued after that.
+    await after_commit(queue_generation)
+    return True
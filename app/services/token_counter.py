@@ -0,0 +1,26 @@
+import math
+import re
+from typing import List
+from app.type import Message
+
+# Rough per-message cost of the chat format (role, separators) on top of the content.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Approximates the number of model tokens in a text without calling any tokenizer service.
+    Words are counted as one token per four characters, punctuation as one token each.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The approximate token count.
+    """
+    return sum(math.ceil(len(piece) / 4) for piece in TOKEN_PATTERN.findall(text or ""))
+
+def count_message_tokens(messages: List[Message]) -> int:
+    return sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages)
@@ -0,0 +1,262 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, TypedDict
+
+from app.packages.mongodb import (
+    fetch_latest_analyses,
+    get_user_value_profile,
+    insert_user_value_profile_if_absent,
+    replace_user_value_profile,
+    update_user_value_profile_if_unchanged,
+)
+from app.services.add_new_label import add_new_label
+from app.services.analyze_service import AttributeExplanation, parse_percentage
+from app.services.consolidate_values import consolidate_attribute
+from app.type import LabeledAttribute
+
+logger = logging.getLogger(__name__)
+
+# Serve /user_all_values from the user_value_profiles read model, kept up to date as analyses
+# are stored, instead of consolidating every conversation's analysis on each call.
+USER_VALUE_PROFILES_ENABLED = os.getenv("USER_VALUE_PROFILES_ENABLED", "true").lower() == "true"
+# How often a profile update is retried when the conversation's contribution changed under it.
+USER_VALUE_PROFILE_UPDATE_ATTEMPTS = 3
+
+
+class AttributeTotals(TypedDict):
+    attribute: str
+    explanation: str
+    total: float
+    count: int
+
+class Contribution(TypedDict):
+    sha: str
+    values: Dict[str, Dict[str, float]]
+
+
+def attribute_key(attribute: str) -> str:
+    """
+    Field name of an attribute in a profile. Attribute names come from the model and may contain
+    dots or start with "$", so they are hashed rather than used as field names.
+    """
+    return hashlib.sha1(attribute.encode("utf-8")).hexdigest()[:16]
+
+def build_attribute_totals(analyzed_values: Iterable[AttributeExplanation]) -> Dict[str, AttributeTotals]:
+    """
+    Sums the percentages and counts the occurrences of each attribute, keeping the first
+    explanation seen, like consolidate_values.
+    """
+    totals: Dict[str, AttributeTotals] = {}
+    for value in analyzed_values:
+        key = attribute_key(value["attribute"])
+        if key not in totals:
+            totals[key] = {"attribute": value["attribute"], "explanation": value["explanation"], "total": 0.0, "count": 0}
+        totals[key]["total"] += parse_percentage(str(value["evaluation"]["percentage"]))
+        totals[key]["count"] += 1
+    return totals
+
+def build_contribution(sha256_hash: str, analyzed_values: List[AttributeExplanation]) -> Contribution:
+    """
+    What one conversation's latest analysis adds to its user's profile.
+    """
+    totals = build_attribute_totals(analyzed_values)
+    return {
+        "sha": sha256_hash,
+        "values": {key: {"total": entry["total"], "count": entry["count"]} for key, entry in totals.items()},
+    }
+
+def profile_delta_update(
+    conversation_id: str,
+    sha256_hash: str,
+    analyzed_values: List[AttributeExplanation],
+    previous: Optional[Contribution],
+    known_attributes: Iterable[str],
+    now: datetime,
+) -> Dict[str, Any]:
+    """
+    Builds the update that replaces a conversation's previous contribution to the profile with
+    the one of its new analysis: the differences of the sums and counts are $inc'ed, so the
+    update does not depend on the rest of the profile.
+
+    Args:
+        conversation_id (str): The conversation whose analysis changed.
+        sha256_hash (str): The hash of the new analysis.
+        analyzed_values (List[AttributeExplanation]): The analyzed values of the new analysis.
+        previous (Optional[Contribution]): The contribution the profile holds for the
+            conversation, None if it holds none.
+        known_attributes (Iterable[str]): Keys of the attributes already in the profile, whose
+            name and explanation are kept.
+        now (datetime): The update time.
+
+    Returns:
+        Dict[str, Any]: The update document.
+    """
+    totals = build_attribute_totals(analyzed_values)
+    contribution = build_contribution(sha256_hash, analyzed_values)
+    previous_values = (previous or {}).get("values", {})
+
+    increments: Dict[str, float] = {}
+    for key in set(contribution["values"]) | set(previous_values):
+        new = contribution["values"].get(key, {"total": 0.0, "count": 0})
+        old = previous_values.get(key, {"total": 0.0, "count": 0})
+        if new["total"] != old["total"]:
+            increments[f"attributes.{key}.total"] = new["total"] - old["total"]
+        if new["count"] != old["count"]:
+            increments[f"attributes.{key}.count"] = new["count"] - old["count"]
+
+    known_attributes = set(known_attributes)
+    sets: Dict[str, Any] = {f"contributions.{conversation_id}": contribution, "updated_at": now}
+    for key, entry in totals.items():
+        if key not in known_attributes:
+            sets[f"attributes.{key}.attribute"] = entry["attribute"]
+            sets[f"attributes.{key}.explanation"] = entry["explanation"]
+
+    update: Dict[str, Any] = {"$set": sets}
+    if increments:
+        update["$inc"] = increments
+    return update
+
+def build_profile(user_id: str, analyses: Iterable[Dict[str, Any]], now: datetime) -> Dict[str, Any]:
+    """
+    Builds a user's profile from scratch out of the latest analysis of each conversation, as
+    returned by fetch_latest_analyses.
+    """
+    attributes: Dict[str, AttributeTotals] = {}
+    contributions: Dict[str, Contribution] = {}
+    for analysis in analyses:
+        conversation_id = str(analysis["_id"])
+        for key, entry in build_attribute_totals(analysis["analyzed_values"]).items():
+            if key not in attributes:
+                attributes[key] = {**entry, "total": 0.0, "count": 0}
+            attributes[key]["total"] += entry["total"]
+            attributes[key]["count"] += entry["count"]
+        contributions[conversation_id] = build_contribution(analysis["sha"], analysis["analyzed_values"])
+    return {"_id": user_id, "attributes": attributes, "contributions": contributions, "updated_at": now}
+
+def profile_labeled_values(profile: Dict[str, Any]) -> List[LabeledAttribute]:
+    """
+    Consolidates and labels the values of a profile, the same result consolidate_values and
+    add_new_label give for the analyses the profile was built from.
+    """
+    consolidated = [
+        consolidate_attribute(entry["attribute"], entry["explanation"], entry["total"], entry["count"])
+        for entry in profile.get("attributes", {}).values()
+        # Attributes whose last contribution was replaced are left with a count of zero.
+        if entry.get("count", 0) > 0
+    ]
+    if not consolidated:
+        return []
+    consolidated.sort(key=lambda item: item["relevance_score"], reverse=True)
+    return add_new_label(consolidated)
+
+def profile_differences(stored: Dict[str, Any], rebuilt: Dict[str, Any], tolerance: float = 1e-6) -> List[str]:
+    """
+    Names of the attributes whose sums or counts differ between a stored profile and one rebuilt
+    from the conversations, and of the conversations whose contribution differs.
+    """
+    differences = []
+    stored_attributes = {key: entry for key, entry in stored.get("attributes", {}).items() if entry.get("count", 0) > 0}
+    for key in set(stored_attributes) | set(rebuilt["attributes"]):
+        left = stored_attributes.get(key, {"total": 0.0, "count": 0})
+        right = rebuilt["attributes"].get(key, {"total": 0.0, "count": 0})
+        if left.get("count", 0) != right["count"] or abs(left.get("total", 0.0) - right["total"]) > tolerance:
+            differences.append(f"attribute {right.get('attribute') or left.get('attribute') or key}")
+    stored_shas = {key: value.get("sha") for key, value in stored.get("contributions", {}).items()}
+    rebuilt_shas = {key: value["sha"] for key, value in rebuilt["contributions"].items()}
+    for conversation_id in sorted(set(stored_shas) | set(rebuilt_shas)):
+        if stored_shas.get(conversation_id) != rebuilt_shas.get(conversation_id):
+            differences.append(f"conversation {conversation_id}")
+    return differences
+
+
+async def update_user_value_profile(
+    user_id: str,
+    conversation_id: str,
+    sha256_hash: str,
+    analyzed_values: List[AttributeExplanation],
+) -> bool:
+    """
+    Makes a newly stored analysis the conversation's contribution to its user's profile,
+    replacing the previous one.
+
+    Returns:
+        bool: True if the profile was updated or already held the analysis.
+    """
+    for _ in range(USER_VALUE_PROFILE_UPDATE_ATTEMPTS):
+        # A user without a profile gets one built from all their analyses, not just this one.
+        profile = await get_or_build_user_value_profile(user_id, {"attributes": 1, f"contributions.{conversation_id}": 1}) or {}
+        previous = profile.get("contributions", {}).get(conversation_id)
+        if previous and previous["sha"] == sha256_hash:
+            return True
+        update = profile_delta_update(
+            conversation_id,
+            sha256_hash,
+            analyzed_values,
+            previous,
+            profile.get("attributes", {}).keys(),
+            datetime.now(timezone.utc),
+        )
+        if await update_user_value_profile_if_unchanged(user_id, conversation_id, previous and previous["sha"], update):
+            return True
+    logger.warning(f"Gave up updating the value profile of user {user_id} for conversation {conversation_id}")
+    return False
+
+async def get_or_build_user_value_profile(user_id: str, projection: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Fetches a user's profile, building it from the latest analysis of each conversation the
+    first time it is read. The built profile is only inserted if the user still has none, so
+    updates stored in the meantime are kept; replacing profiles is left to
+    rebuild_user_value_profiles.
+    """
+    profile = await get_user_value_profile(user_id, projection)
+    if profile is not None:
+        return profile
+    analyses = await fetch_latest_analyses(user_id).to_list(length=None)
+    profile = build_profile(user_id, analyses, datetime.now(timezone.utc))
+    if await insert_user_value_profile_if_absent(profile):
+        return profile
+    return await get_user_value_profile(user_id, projection)
+
+async def rebuild_user_value_profiles(write: bool = True) -> Dict[str, Any]:
+    """
+    Rebuilds the profile of every user with analyses, one user at a time, and compares each with
+    the stored one. Used to backfill the read model and to check it for drift.
+
+    Returns:
+        Dict[str, Any]: How many profiles were checked, and the differences found per user.
+    """
+    report: Dict[str, Any] = {"profiles": 0, "differences": {}}
+
+    async def finish(user_id: str, analyses: List[Dict[str, Any]]):
+        profile = build_profile(user_id, analyses, datetime.now(timezone.utc))
+        differences = profile_differences(await get_user_value_profile(user_id) or {}, profile)
+        if differences:
+            report["differences"][user_id] = differences
+        if write:
+            await replace_user_value_profile(profile)
+        report["profiles"] += 1
+
+    user_id, analyses = None, []
+    # Analyses arrive ordered by user, so only one user's analyses are held at a time.
+    async for analysis in fetch_latest_analyses():
+        if analysis.get("user_id") != user_id and analyses:
+            await finish(user_id, analyses)
+            analyses = []
+        user_id = analysis.get("user_id")
+        analyses.append(analysis)
+    if analyses:
+        await finish(user_id, analyses)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the user value profiles from the stored analyses.")
+    parser.add_argument("--check", action="store_true", help="Only report profiles that differ from a rebuild.")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(rebuild_user_value_profiles(write=not args.check)), indent=2))
@@ -24,6 +24,9 @@ class AnalyzeSummary:
     analyze_summary_text: str
     analyze_values: AttributeExplanation
 
+# The message histories of a conversation. Messages are only ever appended to them.
+HISTORY_FIELDS = ("questions", "summaries", "analyze", "answers")
+
 @dataclass
 class Conversation:
     _id: Optional[ObjectId] = None
@@ -37,6 +40,9 @@ class Conversation:
     # If you need a new field like 'answers'
     answers: List[Message] = field(default_factory=list)
     title: Optional[str] = None
+    # "pending" while a title is generated in the background, then "ready" or "failed".
+    title_status: Optional[str] = None
+    title_requested_at: Optional[datetime] = None
     created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
     status: str = "active"
@@ -44,6 +50,39 @@ class Conversation:
     deleted_at: Optional[datetime] = None
     # Detailed analysis summaries (optional, if needed)
     analysis_summaries: Dict[str, AnalyzeSummary] = field(default_factory=dict)
+    # Rolling summaries of the messages folded out of each history's context window,
+    # and how many non-system messages of that history each summary covers.
+    context_summaries: Dict[str, str] = field(default_factory=dict)
+    context_folded: Dict[str, int] = field(default_factory=dict)
+
+    # Length of each history as stored, set by mark_persisted. Not a field, so it is neither
+    # compared nor serialized.
+    _persisted_lengths = None
+
+    def mark_persisted(self):
+        """
+        Records the length of each history as stored, so the next update only writes the
+        messages appended after this point.
+        """
+        self._persisted_lengths = {name: len(getattr(self, name)) for name in HISTORY_FIELDS}
+
+    def appended_messages(self) -> Optional[Dict[str, List[Message]]]:
+        """
+        Returns the messages appended to each history since mark_persisted, leaving out histories
+        without new messages, or None when the stored histories are unknown or one was shortened
+        and the full histories have to be written.
+        """
+        if self._persisted_lengths is None:
+            return None
+        appended = {}
+        for name in HISTORY_FIELDS:
+            history = getattr(self, name)
+            persisted = self._persisted_lengths.get(name, 0)
+            if len(history) < persisted:
+                return None
+            if len(history) > persisted:
+                appended[name] = history[persisted:]
+        return appended
 
 
 class SystemRole(TypedDict):
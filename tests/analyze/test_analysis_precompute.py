@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.resolvers.analyze_resolvers import schedule_analysis_precompute
+from app.services.background_tasks import BackgroundTaskQueue
+
+
+@pytest.mark.asyncio
+async def test_debounced_jobs_run_once_after_a_burst():
+    queue = BackgroundTaskQueue(maxsize=10, workers=1)
+    await queue.start()
+    runs = []
+
+    for turn in range(3):
+        assert queue.submit_debounced("analysis:1", 0.02, AsyncMock(side_effect=lambda turn=turn: runs.append(turn)))
+        await asyncio.sleep(0.005)
+    await asyncio.sleep(0.05)
+    await queue.drain()
+
+    assert runs == [2]
+
+
+@pytest.mark.asyncio
+async def test_drain_drops_debounced_jobs_that_have_not_fired():
+    queue = BackgroundTaskQueue(maxsize=10, workers=1)
+    await queue.start()
+    job = AsyncMock()
+
+    queue.submit_debounced("analysis:1", 10, job)
+    await queue.drain()
+
+    job.assert_not_awaited()
+    assert not queue.debounced
+    assert not queue.submit_debounced("analysis:1", 0, job)
+
+
+@pytest.mark.asyncio
+async def test_turns_schedule_one_precompute_of_the_latest_summaries():
+    queue = BackgroundTaskQueue(maxsize=10, workers=1)
+    await queue.start()
+    mock_ensure = AsyncMock()
+    with patch("app.resolvers.analyze_resolvers.background_tasks", new=queue), \
+         patch("app.resolvers.analyze_resolvers.ANALYSIS_PRECOMPUTE_DELAY_SECONDS", 0.01), \
+         patch("app.resolvers.analyze_resolvers.ensure_analysis", new=mock_ensure):
+        assert schedule_analysis_precompute("conversation-1")
+        assert schedule_analysis_precompute("conversation-1")
+        assert schedule_analysis_precompute("conversation-2")
+        await asyncio.sleep(0.05)
+        await queue.drain()
+
+    assert sorted(call.args[0] for call in mock_ensure.await_args_list) == ["conversation-1", "conversation-2"]
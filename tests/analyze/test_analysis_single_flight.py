@@ -0,0 +1,183 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+from bson import ObjectId
+
+from app.resolvers.analyze_resolvers import generate_analysis, get_analyze_resolver
+from app.services.analyze_service import build_analysis_summary, get_summaries_content_and_hash
+from app.services.single_flight import SingleFlight, run_with_lease
+
+
+class MockMessage:
+    def __init__(self, content):
+        self.content = content
+
+class MockChoice:
+    def __init__(self, message):
+        self.message = message
+
+class MockResponse:
+    def __init__(self, content):
+        self.choices = [MockChoice(MockMessage(content))]
+
+
+ANALYSIS_TEXT = "Summary paragraph.\n1. Growth - Keeps learning - {high: 90%}"
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_one_call_between_concurrent_callers():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    results = await asyncio.gather(*(single_flight.do("key", work) for _ in range(5)))
+
+    assert results == ["result"] * 5
+    assert calls == 1
+    assert single_flight.coalesced == 4
+    assert not single_flight.in_flight("key")
+
+
+@pytest.mark.asyncio
+async def test_single_flight_propagates_errors_to_every_waiter():
+    single_flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(*(single_flight.do("key", work) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    # A failed call is not remembered; the next caller runs it again.
+    assert await single_flight.do("key", AsyncMock(return_value="retry")) == "retry"
+
+
+@pytest.mark.asyncio
+async def test_single_flight_survives_the_owner_being_cancelled():
+    single_flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return "result"
+
+    owner = asyncio.create_task(single_flight.do("key", work))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(single_flight.do("key", work))
+    await asyncio.sleep(0)
+
+    owner.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await waiter == "result"
+    assert owner.cancelled()
+    assert not single_flight.in_flight("key")
+
+
+@pytest.mark.asyncio
+async def test_run_with_lease_waits_for_the_lease_holder_result():
+    work = AsyncMock(return_value="computed here")
+    lookup = AsyncMock(side_effect=[None, "computed elsewhere"])
+    with patch("app.services.single_flight.acquire_lease", new=AsyncMock(return_value=False)), \
+         patch("app.services.single_flight.release_lease", new=AsyncMock()) as mock_release:
+        result = await run_with_lease("key", work, lookup, ttl_seconds=5, poll_interval=0)
+
+    assert result == "computed elsewhere"
+    work.assert_not_awaited()
+    mock_release.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_run_with_lease_computes_and_releases_when_acquired():
+    work = AsyncMock(return_value="computed here")
+    with patch("app.services.single_flight.acquire_lease", new=AsyncMock(return_value=True)), \
+         patch("app.services.single_flight.release_lease", new=AsyncMock()) as mock_release:
+        result = await run_with_lease("key", work, AsyncMock(return_value=None), ttl_seconds=5, poll_interval=0)
+
+    assert result == "computed here"
+    mock_release.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_get_analyze_resolver_calls_make_one_llm_call():
+    conversation_id = str(ObjectId())
+    conversation = {"summaries": [{"role": "assistant", "content": "Summary"}]}
+
+    async def slow_completion(prompts, structured=False):
+        await asyncio.sleep(0.02)
+        return MockResponse(ANALYSIS_TEXT)
+
+    mock_fetch = AsyncMock(side_effect=slow_completion)
+    with patch("app.resolvers.analyze_resolvers.get_conversation_by_id", new=AsyncMock(return_value=conversation)), \
+         patch("app.resolvers.analyze_resolvers.get_analysis_summary_by_sha", new=AsyncMock(return_value=None)), \
+         patch("app.resolvers.analyze_resolvers.fetch_keywords_from_api_only_one", new=mock_fetch), \
+         patch("app.resolvers.analyze_resolvers.update_or_append_field_by_id", new=AsyncMock()) as mock_update, \
+         patch("app.services.single_flight.acquire_lease", new=AsyncMock(return_value=True)), \
+         patch("app.services.single_flight.release_lease", new=AsyncMock()):
+        results = await asyncio.gather(*(get_analyze_resolver(conversation_id) for _ in range(3)))
+
+    assert mock_fetch.await_count == 1
+    mock_update.assert_awaited_once()
+    assert all(result == results[0] for result in results)
+    assert results[0]["analyzed_values"][0]["attribute"] == "Growth"
+
+
+@pytest.mark.asyncio
+async def test_get_analyze_resolver_analyzes_only_new_summaries():
+    conversation_id = str(ObjectId())
+    summaries = [{"role": "assistant", "content": f"Summary {number}"} for number in range(3)]
+    _, previous_sha = get_summaries_content_and_hash(summaries[:2])
+    _, current_sha = get_summaries_content_and_hash(summaries)
+    conversation = {
+        "summaries": summaries,
+        "analysis_summaries": {previous_sha: build_analysis_summary("Earlier.\n1. Growth - Keeps learning - {high: 60%}")},
+    }
+
+    mock_fetch = AsyncMock(return_value=MockResponse(ANALYSIS_TEXT))
+    with patch("app.resolvers.analyze_resolvers.get_conversation_by_id", new=AsyncMock(return_value=conversation)), \
+         patch("app.resolvers.analyze_resolvers.get_analysis_summary_by_sha", new=AsyncMock(return_value=None)), \
+         patch("app.resolvers.analyze_resolvers.fetch_keywords_from_api_only_one", new=mock_fetch), \
+         patch("app.resolvers.analyze_resolvers.update_or_append_field_by_id", new=AsyncMock()) as mock_update, \
+         patch("app.services.single_flight.acquire_lease", new=AsyncMock(return_value=True)), \
+         patch("app.services.single_flight.release_lease", new=AsyncMock()):
+        result = await get_analyze_resolver(conversation_id)
+
+    prompt = json.dumps(mock_fetch.await_args.args[0])
+    assert "Summary 2" in prompt
+    assert "Summary 0" not in prompt and "Summary 1" not in prompt
+    assert mock_update.await_args.kwargs["key"] == current_sha
+    assert result["analyzed_values"][0]["evaluation"]["percentage"] == "70%"
+
+
+@pytest.mark.asyncio
+async def test_generate_analysis_retries_invalid_structured_output_in_text_mode():
+    invalid = json.dumps({"summary": "x", "values": [{"attribute": "Growth", "label": "huge"}]})
+    mock_fetch = AsyncMock(side_effect=[MockResponse(invalid), MockResponse(ANALYSIS_TEXT)])
+    with patch("app.resolvers.analyze_resolvers.ANALYSIS_STRUCTURED", True), \
+         patch("app.resolvers.analyze_resolvers.fetch_keywords_from_api_only_one", new=mock_fetch), \
+         patch("app.resolvers.analyze_resolvers.update_or_append_field_by_id", new=AsyncMock()) as mock_update:
+        result = await generate_analysis("c1", "sha", "Summary")
+
+    assert [call.kwargs["structured"] for call in mock_fetch.await_args_list] == [True, False]
+    assert result["analyzed_values"][0]["attribute"] == "Growth"
+    assert mock_update.await_args.kwargs["value"] == result
+
+
+@pytest.mark.asyncio
+async def test_generate_analysis_does_not_store_an_analysis_without_values():
+    mock_fetch = AsyncMock(return_value=MockResponse("Nothing to report."))
+    with patch("app.resolvers.analyze_resolvers.ANALYSIS_STRUCTURED", False), \
+         patch("app.resolvers.analyze_resolvers.fetch_keywords_from_api_only_one", new=mock_fetch), \
+         patch("app.resolvers.analyze_resolvers.update_or_append_field_by_id", new=AsyncMock()) as mock_update:
+        with pytest.raises(ValueError):
+            await generate_analysis("c1", "sha", "Summary")
+
+    mock_update.assert_not_awaited()
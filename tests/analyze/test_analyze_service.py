@@ -1,5 +1,13 @@
+import json
 import pytest
-from app.services.analyze_service import get_attribute_and_explanation_object_array
+from app.services.analyze_service import (
+    build_analysis_summary,
+    find_previous_analysis,
+    get_attribute_and_explanation_object_array,
+    get_summaries_content_and_hash,
+    merge_analyses,
+    parse_structured_analysis
+)
 
 data = "The individual's priorities and values reflect a strong inclination towards personal growth, social connection, and authenticity. Their actions suggest an appreciation for truth and stability in their relationships, as well as a desire for adventure and discovery. This combination indicates a balance between seeking new experiences and valuing deep, meaningful connections with others.\n\n1. Growth - The individual demonstrates a commitment to personal development and improvement, often seeking opportunities for learning and self-discovery - {high: 90%}.\n2. Authenticity - They prioritize being true to themselves and their beliefs, often expressing their thoughts and feelings honestly in social settings - {high: 85%}.\n3. Adventure - They enjoy taking risks and exploring new experiences, showing a preference for novelty and excitement in life - {medium: 70%}.\n4. Connection - Building and maintaining relationships is important to them, as evidenced by their efforts to create deeper bonds with others - {high: 80%}.\n5. Truth - They value honesty and integrity, striving to engage with others in a transparent and genuine manner - {high: 85%}.\n6. Stability - The individual seeks a sense of security in their relationships and personal life, often favoring routines and familiarity - {medium: 65%}."
 
@@ -49,3 +57,78 @@ def test_get_attribute_and_explanation_object_array_invalid_format():
     result = get_attribute_and_explanation_object_array(invalid_data)
     
     assert result == []
+
+
+structured_data = json.dumps({
+    "summary": "They value growth and honesty.",
+    "values": [
+        {"attribute": "Growth", "explanation": "Keeps learning - even at work", "label": "high", "percentage": 90},
+        {"attribute": "Truth", "explanation": "Values honesty", "label": "medium", "percentage": 62.5},
+    ],
+})
+
+def test_parse_structured_analysis_matches_the_text_format():
+    result = parse_structured_analysis(structured_data)
+
+    assert result["analyzed_values"][0] == {
+        "attribute": "Growth",
+        "explanation": "Keeps learning - even at work",
+        "evaluation": {"label": "high", "percentage": "90%"},
+    }
+    assert result["analyzed_values"][1]["evaluation"]["percentage"] == "62.5%"
+    assert result["analysis_summary_text"].splitlines() == [
+        "They value growth and honesty.",
+        "1. Growth - Keeps learning - even at work - {high: 90%}",
+        "2. Truth - Values honesty - {medium: 62.5%}",
+    ]
+
+@pytest.mark.parametrize("content", [
+    "{not json",
+    json.dumps({"summary": "x"}),
+    json.dumps({"summary": "x", "values": [{"attribute": "Growth", "explanation": "y", "label": "huge", "percentage": 90}]}),
+    json.dumps({"summary": "x", "values": [{"attribute": "Growth", "explanation": "y", "label": "high", "percentage": "90%"}]}),
+])
+def test_parse_structured_analysis_rejects_invalid_output(content):
+    with pytest.raises(ValueError):
+        parse_structured_analysis(content)
+
+def test_build_analysis_summary_parses_both_formats():
+    assert len(build_analysis_summary(structured_data)["analyzed_values"]) == 2
+    assert len(build_analysis_summary(data)["analyzed_values"]) == 6
+
+@pytest.mark.parametrize("content", [
+    json.dumps({"summary": "x", "values": [{"attribute": "Growth", "explanation": "y", "label": "huge", "percentage": 90}]}),
+    "This is some random text that does not match the expected format.",
+])
+def test_build_analysis_summary_rejects_analyses_without_values(content):
+    with pytest.raises(ValueError):
+        build_analysis_summary(content)
+
+def test_find_previous_analysis_returns_the_longest_analyzed_prefix():
+    summaries = [{"role": "assistant", "content": f"Summary {number}"} for number in range(4)]
+    _, first_sha = get_summaries_content_and_hash(summaries[:1])
+    _, third_sha = get_summaries_content_and_hash(summaries[:3])
+    analyses = {first_sha: "first", third_sha: "third"}
+
+    assert find_previous_analysis(summaries, analyses) == (3, "third")
+    assert find_previous_analysis(summaries[:1], analyses) is None
+    assert find_previous_analysis(summaries, {}) is None
+
+def test_merge_analyses_weights_by_summary_count():
+    previous = build_analysis_summary(
+        "Old summary.\n1. Growth - Keeps learning - {high: 90%}\n2. Humor - Jokes a lot - {medium: 60%}"
+    )
+    new = build_analysis_summary(
+        "New summary.\n1. Growth - Still learning - {high: 70%}\n2. Courage - Took a risk - {high: 80%}"
+    )
+
+    merged = merge_analyses(previous, 3, new, 1)
+    values = {value["attribute"]: value for value in merged["analyzed_values"]}
+
+    assert [value["attribute"] for value in merged["analyzed_values"]] == ["Growth", "Humor", "Courage"]
+    assert values["Growth"]["evaluation"] == {"label": "high", "percentage": "85%"}
+    assert values["Growth"]["explanation"] == "Still learning"
+    assert values["Humor"]["evaluation"] == {"label": "medium", "percentage": "45%"}
+    assert values["Courage"]["evaluation"] == {"label": "low", "percentage": "20%"}
+    assert merged["analysis_summary_text"].startswith("New summary.\n1. Growth - Still learning - {high: 85%}")
+    assert build_analysis_summary(merged["analysis_summary_text"])["analyzed_values"] == merged["analyzed_values"]
@@ -0,0 +1,54 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.openai_resolvers.batch_executor import BatchItemResult
+from app.openai_resolvers.keyword_extraction import attribute_matcher, extract_keywords_batch
+from app.services.attribute_matcher import AttributeMatcher
+
+
+class MockMessage:
+    def __init__(self, content):
+        self.content = content
+
+class MockChoice:
+    def __init__(self, message):
+        self.message = message
+
+class MockResponse:
+    def __init__(self, content):
+        self.choices = [MockChoice(MockMessage(content))]
+
+
+def test_matches_attribute_names_and_their_word_forms():
+    text = "They were honest with their family, committed to the team and felt responsible for its success."
+
+    names = [name for name, _ in attribute_matcher.match(text)]
+
+    assert names == ["Honesty", "Family", "Responsibility", "Commitment"]
+
+def test_ignores_words_that_only_look_alike():
+    assert attribute_matcher.match("An ordinary funeral notice was prevented from spreading.") == []
+
+def test_explanation_words_alone_are_not_confident():
+    matcher = AttributeMatcher([
+        {"attribute": "Stability", "explanation": "Leading a consistently calm life"},
+        {"attribute": "Growth", "explanation": "Maintaining positive change and growth"},
+    ])
+
+    assert [name for name, _ in matcher.match("A calm and quiet evening")] == ["Stability"]
+    assert matcher.extract_keywords(["A calm and quiet evening", "Growth and more growth"]) == [None, "Growth"]
+
+@pytest.mark.asyncio
+async def test_extract_keywords_batch_sends_only_unmatched_texts_to_the_llm():
+    async def fetch_keywords_batch(prompts):
+        return [BatchItemResult(index=index, value=MockResponse("pasta, cooking")) for index, _ in enumerate(prompts)]
+
+    mock_fetch = AsyncMock(side_effect=fetch_keywords_batch)
+
+    with patch("app.openai_resolvers.keyword_extraction.fetch_keywords_batch", new=mock_fetch):
+        results = await extract_keywords_batch(["An honest friend", "Cooking pasta on weekends"])
+
+    assert [result.value for result in results] == ["Honesty, Friendship", "pasta, cooking"]
+    prompts = mock_fetch.await_args.args[0]
+    assert len(prompts) == 1 and "Cooking pasta" in prompts[0]["content"]
+
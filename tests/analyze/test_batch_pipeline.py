@@ -0,0 +1,118 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+from bson import ObjectId
+
+from app.openai_resolvers.batch_backends import LocalBatchBackend
+from app.openai_resolvers.fake_client import FakeAsyncOpenAI, FakeLLMConfig
+from app.services.analyze_service import get_summaries_content_and_hash
+from app.services.batch_pipeline import collect_batch_requests, ingest_batch_results, load_checkpoint, run_batch_pipeline
+
+
+CONVERSATION_ID = ObjectId()
+SUMMARIES = [{"role": "assistant", "content": "They value family."}]
+CONVERSATION = {
+    "_id": CONVERSATION_ID,
+    "summaries": SUMMARIES,
+    "analyze": [
+        {"role": "assistant", "content": "Loyal to family."},
+        {"role": "assistant", "content": "Works hard."},
+        {"role": "assistant", "content": "Seeks growth."},
+    ],
+    "keywords": ["Loyalty"],
+    "analysis_summaries": {},
+}
+
+
+class Cursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self.iterate()
+
+    async def iterate(self):
+        for document in self.documents:
+            yield document
+
+
+@pytest.fixture
+def fake_llm():
+    with patch("app.openai_resolvers.completions.client", new=FakeAsyncOpenAI(FakeLLMConfig())):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_collects_missing_analyses_and_keywords(tmp_path):
+    done = {**CONVERSATION, "_id": ObjectId(), "analysis_summaries": {get_summaries_content_and_hash(SUMMARIES)[1]: {}}, "keywords": ["a", "b", "c"]}
+    input_path = str(tmp_path / "input.jsonl")
+    with patch("app.services.batch_pipeline.find_conversations_for_batch", return_value=Cursor([CONVERSATION, done])):
+        count = await collect_batch_requests(input_path)
+
+    with open(input_path) as input_file:
+        custom_ids = [json.loads(line)["custom_id"] for line in input_file]
+    sha = get_summaries_content_and_hash(SUMMARIES)[1]
+    assert count == 3
+    assert custom_ids == [f"analysis:{CONVERSATION_ID}:{sha}", f"keywords:{CONVERSATION_ID}:1", f"keywords:{CONVERSATION_ID}:2"]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_ingests_results_with_the_local_backend(tmp_path, fake_llm):
+    with patch("app.services.batch_pipeline.find_conversations_for_batch", return_value=Cursor([CONVERSATION])), \
+         patch("app.services.batch_pipeline.get_conversation_by_id", new=AsyncMock(return_value=CONVERSATION)), \
+         patch("app.services.batch_pipeline.update_or_append_field_by_id", new=AsyncMock()) as mock_update, \
+         patch("app.services.batch_pipeline.store_keywords", new=AsyncMock()) as mock_store:
+        checkpoint = await run_batch_pipeline(str(tmp_path), backend=LocalBatchBackend(), poll_seconds=0)
+
+    assert checkpoint["stage"] == "ingested"
+    assert checkpoint["counts"] == {"analyses": 1, "keywords": 2, "failed": 0, "stale": 0}
+    assert mock_update.await_args.kwargs["field_name"] == "analysis_summaries"
+    assert len(mock_update.await_args.kwargs["value"]["analyzed_values"]) == 5
+    stored_keywords = mock_store.await_args.args[1]
+    assert len(stored_keywords) == 3 and stored_keywords[0] == "Loyalty"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_resumes_from_checkpoint_without_resubmitting(tmp_path, fake_llm):
+    backend = LocalBatchBackend()
+    backend.submit = AsyncMock(wraps=backend.submit)
+    with patch("app.services.batch_pipeline.find_conversations_for_batch", return_value=Cursor([CONVERSATION])), \
+         patch("app.services.batch_pipeline.get_conversation_by_id", new=AsyncMock(return_value=CONVERSATION)), \
+         patch("app.services.batch_pipeline.store_keywords", new=AsyncMock()), \
+         patch("app.services.batch_pipeline.update_or_append_field_by_id", new=AsyncMock(side_effect=RuntimeError("crash"))):
+        with pytest.raises(RuntimeError):
+            await run_batch_pipeline(str(tmp_path), backend=backend, poll_seconds=0)
+
+    assert load_checkpoint(str(tmp_path))["stage"] == "downloaded"
+
+    with patch("app.services.batch_pipeline.find_conversations_for_batch") as mock_find, \
+         patch("app.services.batch_pipeline.get_conversation_by_id", new=AsyncMock(return_value=CONVERSATION)), \
+         patch("app.services.batch_pipeline.store_keywords", new=AsyncMock()), \
+         patch("app.services.batch_pipeline.update_or_append_field_by_id", new=AsyncMock()) as mock_update:
+        checkpoint = await run_batch_pipeline(str(tmp_path), backend=backend, poll_seconds=0)
+
+    assert checkpoint["stage"] == "ingested"
+    mock_find.assert_not_called()
+    backend.submit.assert_awaited_once()
+    mock_update.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_ingest_drops_analyses_of_summaries_that_changed(tmp_path):
+    sha = get_summaries_content_and_hash(SUMMARIES)[1]
+    changed = {**CONVERSATION, "user_id": "user123", "summaries": SUMMARIES + [{"role": "assistant", "content": "They moved abroad."}]}
+    content = "Summary.\n1. Family - Loyal to family - {high: 90%}"
+    output_path = tmp_path / "output.jsonl"
+    output_path.write_text(json.dumps({
+        "custom_id": f"analysis:{CONVERSATION_ID}:{sha}",
+        "response": {"status_code": 200, "body": {"choices": [{"message": {"content": content}}]}},
+    }) + "\n")
+
+    with patch("app.services.batch_pipeline.get_conversation_by_id", new=AsyncMock(return_value=changed)), \
+         patch("app.services.batch_pipeline.update_or_append_field_by_id", new=AsyncMock()) as mock_update, \
+         patch("app.services.batch_pipeline.update_user_value_profile", new=AsyncMock()) as mock_profile:
+        counts = await ingest_batch_results(str(output_path))
+
+    assert counts == {"analyses": 0, "keywords": 0, "failed": 0, "stale": 1}
+    mock_update.assert_not_awaited()
+    mock_profile.assert_not_awaited()
@@ -0,0 +1,132 @@
+import asyncio
+import httpx
+import pytest
+from unittest.mock import AsyncMock, patch
+from openai import BadRequestError, InternalServerError
+
+from app.openai_resolvers.batch_executor import leading_successes, run_batch
+from app.openai_resolvers.keyword_extraction import fetch_keywords_batch, fetch_keywords_from_api
+from app.openai_resolvers.resilience import resilient_caller
+from app.packages.models.conversation_models import AnalayzeRequest, Analyze
+from app.resolvers.analyze_resolvers import process_retrieve_keywords_resolver
+
+
+class MockMessage:
+    def __init__(self, content):
+        self.content = content
+
+class MockChoice:
+    def __init__(self, message):
+        self.message = message
+
+class MockResponse:
+    def __init__(self, content):
+        self.choices = [MockChoice(MockMessage(content))]
+
+
+@pytest.mark.asyncio
+async def test_run_batch_preserves_order_and_limits_concurrency():
+    in_flight = 0
+    peak = 0
+
+    async def worker(item):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        # Later items finish first to prove results are re-ordered by index.
+        await asyncio.sleep(0.01 * (10 - item))
+        in_flight -= 1
+        return item * 2
+
+    results = await run_batch(list(range(10)), worker, max_in_flight=3)
+
+    assert [result.value for result in results] == [item * 2 for item in range(10)]
+    assert all(result.ok for result in results)
+    assert peak == 3
+
+
+@pytest.mark.asyncio
+async def test_run_batch_retries_and_keeps_partial_success():
+    attempts = {}
+
+    async def worker(item):
+        attempts[item] = attempts.get(item, 0) + 1
+        if item == 1 and attempts[item] < 2:
+            raise RuntimeError("transient")
+        if item == 2:
+            raise RuntimeError("permanent")
+        return item
+
+    results = await run_batch([0, 1, 2, 3], worker, max_in_flight=2, max_retries=1, retry_delay=0)
+
+    assert [result.ok for result in results] == [True, True, False, True]
+    assert results[1].attempts == 2
+    assert results[2].attempts == 2
+    assert str(results[2].error) == "permanent"
+    assert results[3].value == 3
+    assert leading_successes(results) == [0, 1]
+
+
+@pytest.mark.asyncio
+async def test_fetch_keywords_from_api_raises_on_failed_item():
+    async def fake_create(messages, model):
+        if messages[0]["content"] == "two":
+            raise RuntimeError("boom")
+        return MockResponse("a")
+
+    with patch("app.openai_resolvers.completions.client.chat.completions.create", new=AsyncMock(side_effect=fake_create)), \
+         patch("app.openai_resolvers.batch_executor.asyncio.sleep", new=AsyncMock()):
+        results = await fetch_keywords_batch([{"role": "system", "content": "one"}], max_retries=0)
+        assert results[0].value.choices[0].message.content == "a"
+        with pytest.raises(RuntimeError):
+            await fetch_keywords_from_api([{"role": "system", "content": "two"}])
+
+
+@pytest.mark.asyncio
+async def test_process_retrieve_keywords_resolver_stores_leading_successes():
+    analyze = Analyze(
+        conversation_id="123",
+        analyze=[
+            {"role": "assistant", "content": "first"},
+            {"role": "assistant", "content": "second"},
+            {"role": "assistant", "content": "third"},
+        ],
+        keywords=[],
+    )
+
+    async def fake_create(messages, model):
+        if "second" in messages[0]["content"]:
+            raise RuntimeError("rate limited")
+        return MockResponse(f"keywords for {messages[0]['content'][-5:]}")
+
+    with patch("app.resolvers.analyze_resolvers.get_analyze", new=AsyncMock(return_value=analyze)), \
+         patch("app.openai_resolvers.completions.client.chat.completions.create", new=AsyncMock(side_effect=fake_create)), \
+         patch("app.openai_resolvers.batch_executor.asyncio.sleep", new=AsyncMock()), \
+         patch("app.resolvers.analyze_resolvers.store_keywords", new=AsyncMock()) as mock_store:
+        keywords = await process_retrieve_keywords_resolver(AnalayzeRequest(conversation_id="123"))
+
+    assert keywords == ["keywords for first"]
+    mock_store.assert_awaited_once_with("123", ["keywords for first"])
+
+
+@pytest.mark.asyncio
+async def test_fetch_keywords_batch_retries_only_in_the_resilience_layer():
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    unavailable = InternalServerError("error", response=httpx.Response(503, request=request), body=None)
+    bad_request = BadRequestError("error", response=httpx.Response(400, request=request), body=None)
+
+    async def fake_create(messages, model):
+        raise unavailable if messages[0]["content"] == "unavailable" else bad_request
+
+    create = AsyncMock(side_effect=fake_create)
+    with patch("app.openai_resolvers.completions.client.chat.completions.create", new=create), \
+         patch("app.openai_resolvers.resilience.asyncio.sleep", new=AsyncMock()), \
+         patch("app.openai_resolvers.batch_executor.asyncio.sleep", new=AsyncMock()):
+        results = await fetch_keywords_batch([{"role": "system", "content": "unavailable"}])
+        assert not results[0].ok
+        assert create.await_count == resilient_caller.policy("keywords").max_retries + 1
+
+        create.reset_mock()
+        results = await fetch_keywords_batch([{"role": "system", "content": "invalid"}])
+        assert isinstance(results[0].error, BadRequestError)
+        assert create.await_count == 1
@@ -0,0 +1,48 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.packages.mongodb import fetch_latest_analyzed_values
+from app.resolvers.analyze_resolvers import get_consolidated_and_labeled_values_for_user
+
+VALUES = [
+    {"attribute": "Honesty", "explanation": "Telling the truth", "evaluation": {"percentage": "80%"}},
+    {"attribute": "Honesty", "explanation": "Telling the truth", "evaluation": {"percentage": "60%"}},
+    {"attribute": "Courage", "explanation": "Facing fear", "evaluation": {"percentage": "50%"}},
+]
+
+
+@pytest.mark.asyncio
+@patch("app.packages.mongodb.conversation_collection.aggregate")
+async def test_fetch_latest_analyzed_values_runs_one_aggregation(mock_aggregate):
+    mock_aggregate.return_value.to_list = AsyncMock(return_value=VALUES)
+
+    result = await fetch_latest_analyzed_values("user123")
+
+    assert result == VALUES
+    mock_aggregate.assert_called_once()
+    pipeline = mock_aggregate.call_args.args[0]
+    assert pipeline[0]["$match"]["user_id"] == "user123"
+    assert pipeline[-1] == {"$replaceRoot": {"newRoot": "$latest.v.analyzed_values"}}
+
+
+@pytest.mark.asyncio
+@patch("app.resolvers.analyze_resolvers.USER_VALUE_PROFILES_ENABLED", False)
+@patch("app.resolvers.analyze_resolvers.get_conversation_by_id", new_callable=AsyncMock)
+@patch("app.resolvers.analyze_resolvers.fetch_latest_analyzed_values", new_callable=AsyncMock)
+async def test_values_for_user_are_consolidated_without_fetching_conversations(mock_fetch_values, mock_get_conversation):
+    mock_fetch_values.return_value = [dict(value, evaluation=dict(value["evaluation"])) for value in VALUES]
+
+    result = await get_consolidated_and_labeled_values_for_user("user123")
+
+    mock_fetch_values.assert_awaited_once_with("user123")
+    mock_get_conversation.assert_not_awaited()
+    assert [entry["attribute"] for entry in result] == ["Honesty", "Courage"]
+
+
+@pytest.mark.asyncio
+@patch("app.resolvers.analyze_resolvers.USER_VALUE_PROFILES_ENABLED", False)
+@patch("app.resolvers.analyze_resolvers.fetch_latest_analyzed_values", new_callable=AsyncMock)
+async def test_values_for_user_without_analyses_are_empty(mock_fetch_values):
+    mock_fetch_values.return_value = []
+
+    assert await get_consolidated_and_labeled_values_for_user("user123") == []
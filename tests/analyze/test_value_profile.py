@@ -0,0 +1,113 @@
+import copy
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.resolvers.analyze_resolvers import get_consolidated_and_labeled_values_for_user
+from app.services.add_new_label import add_new_label
+from app.services.consolidate_values import consolidate_values
+from app.services.value_profile import (
+    build_profile,
+    get_or_build_user_value_profile,
+    profile_delta_update,
+    profile_differences,
+    profile_labeled_values,
+    update_user_value_profile,
+)
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def value(attribute, percentage):
+    return {"attribute": attribute, "explanation": f"About {attribute}", "evaluation": {"label": "high", "percentage": f"{percentage}%"}}
+
+
+def apply_update(document, update):
+    # Applies the $set and $inc of an update with dotted paths, as MongoDB would.
+    for operator, fields in update.items():
+        for path, change in fields.items():
+            *parents, name = path.split(".")
+            target = document
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[name] = target.get(name, 0) + change if operator == "$inc" else copy.deepcopy(change)
+
+
+def test_delta_updates_match_a_rebuild_and_a_full_consolidation():
+    first = [value("Honesty", 80), value("Courage", 50)]
+    second = [value("Honesty", 60), value("Family", 90)]
+    replaced = [value("Family", 70), value("Growth", 40)]
+
+    profile = {}
+    for conversation_id, sha, values in [("c1", "a", first), ("c2", "b", second), ("c2", "c", replaced)]:
+        previous = profile.get("contributions", {}).get(conversation_id)
+        apply_update(profile, profile_delta_update(conversation_id, sha, values, previous, profile.get("attributes", {}).keys(), NOW))
+
+    rebuilt = build_profile("user123", [{"_id": "c1", "sha": "a", "analyzed_values": first}, {"_id": "c2", "sha": "c", "analyzed_values": replaced}], NOW)
+    expected = add_new_label(consolidate_values(copy.deepcopy(first + replaced)))
+
+    assert profile_differences(profile, rebuilt) == []
+    assert profile_labeled_values(profile) == expected
+    assert profile_labeled_values(rebuilt) == expected
+
+
+def test_profile_differences_report_drift():
+    stored = build_profile("user123", [{"_id": "c1", "sha": "a", "analyzed_values": [value("Honesty", 80)]}], NOW)
+    rebuilt = build_profile("user123", [{"_id": "c1", "sha": "b", "analyzed_values": [value("Honesty", 60)]}], NOW)
+
+    assert profile_differences(stored, rebuilt) == ["attribute Honesty", "conversation c1"]
+
+
+@pytest.mark.asyncio
+async def test_update_retries_when_the_contribution_changed_concurrently():
+    profiles = [{}, {"attributes": {}, "contributions": {"c1": {"sha": "a", "values": {}}}}]
+    with patch("app.services.value_profile.get_user_value_profile", new=AsyncMock(side_effect=profiles)), \
+         patch("app.services.value_profile.update_user_value_profile_if_unchanged", new=AsyncMock(side_effect=[False, True])) as mock_update:
+        assert await update_user_value_profile("user123", "c1", "b", [value("Honesty", 80)])
+
+    assert [call.args[2] for call in mock_update.await_args_list] == [None, "a"]
+
+
+@pytest.mark.asyncio
+async def test_values_for_user_are_served_from_the_profile():
+    profile = build_profile("user123", [{"_id": "c1", "sha": "a", "analyzed_values": [value("Honesty", 80)]}], NOW)
+    with patch("app.resolvers.analyze_resolvers.get_or_build_user_value_profile", new=AsyncMock(return_value=profile)) as mock_get, \
+         patch("app.resolvers.analyze_resolvers.fetch_latest_analyzed_values", new=AsyncMock()) as mock_fetch:
+        result = await get_consolidated_and_labeled_values_for_user("user123")
+
+    mock_get.assert_awaited_once_with("user123", {"attributes": 1})
+    mock_fetch.assert_not_awaited()
+    assert [(entry["attribute"], entry["mean"], entry["label"]) for entry in result] == [("Honesty", 80.0, "high")]
+
+
+@pytest.mark.asyncio
+async def test_profile_built_on_read_does_not_replace_a_concurrent_one():
+    analyses = MagicMock()
+    analyses.to_list = AsyncMock(return_value=[{"_id": "c1", "sha": "a", "analyzed_values": [value("Honesty", 80)]}])
+    stored = {"_id": "user123", "attributes": {}, "contributions": {"c2": {"sha": "b", "values": {}}}}
+    with patch("app.services.value_profile.get_user_value_profile", new=AsyncMock(side_effect=[None, stored])), \
+         patch("app.services.value_profile.fetch_latest_analyses", return_value=analyses), \
+         patch("app.services.value_profile.insert_user_value_profile_if_absent", new=AsyncMock(return_value=False)) as mock_insert, \
+         patch("app.services.value_profile.replace_user_value_profile", new=AsyncMock()) as mock_replace:
+        profile = await get_or_build_user_value_profile("user123")
+
+    assert mock_insert.await_args.args[0]["contributions"].keys() == {"c1"}
+    mock_replace.assert_not_awaited()
+    assert profile is stored
+
+
+@pytest.mark.asyncio
+async def test_first_analysis_of_a_user_with_older_analyses_builds_the_whole_profile():
+    analyses = MagicMock()
+    analyses.to_list = AsyncMock(return_value=[
+        {"_id": "c0", "sha": "a", "analyzed_values": [value("Honesty", 60)]},
+        {"_id": "c1", "sha": "b", "analyzed_values": [value("Growth", 80)]},
+    ])
+    with patch("app.services.value_profile.get_user_value_profile", new=AsyncMock(return_value=None)), \
+         patch("app.services.value_profile.fetch_latest_analyses", return_value=analyses), \
+         patch("app.services.value_profile.insert_user_value_profile_if_absent", new=AsyncMock(return_value=True)) as mock_insert, \
+         patch("app.services.value_profile.update_user_value_profile_if_unchanged", new=AsyncMock()) as mock_update:
+        assert await update_user_value_profile("user123", "c1", "b", [value("Growth", 80)])
+
+    assert mock_insert.await_args.args[0]["contributions"].keys() == {"c0", "c1"}
+    mock_update.assert_not_awaited()
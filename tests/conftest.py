@@ -1,3 +1,24 @@
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from app.openai_resolvers.llm_cache import llm_cache
+from app.openai_resolvers.resilience import resilient_caller
+
+
+@pytest.fixture(autouse=True)
+def clear_llm_cache():
+    # Responses cached by one test must not leak into the next one.
+    llm_cache.clear()
+    yield
+    llm_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_resilient_caller():
+    # Circuit breakers and latency samples are process-wide; start every test from a clean slate.
+    resilient_caller.reset()
+    yield
+    resilient_caller.reset()
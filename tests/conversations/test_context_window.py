@@ -0,0 +1,63 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.services.context_window import build_context, count_message_tokens, count_tokens
+from app.type import Conversation
+
+
+def make_conversation(turns: int) -> Conversation:
+    questions = [{"role": "system", "content": "pinned system prompt"}]
+    for turn in range(turns):
+        questions.append({"role": "user", "content": f"answer {turn} " + "word " * 40})
+        questions.append({"role": "assistant", "content": f"question {turn} " + "word " * 40})
+    return Conversation(conversation_id="123", questions=questions)
+
+
+def test_count_tokens_approximates_words_and_punctuation():
+    assert count_tokens("") == 0
+    assert count_tokens("Hello, world!") == 6
+    assert count_tokens("internationalization") == 5
+    assert count_message_tokens([{"role": "user", "content": "Hello"}]) == 2 + 4
+
+
+@pytest.mark.asyncio
+async def test_build_context_returns_history_unchanged_under_budget():
+    conversation = make_conversation(2)
+    with patch("app.services.context_window.fold_messages", new_callable=AsyncMock) as mock_fold:
+        context = await build_context(conversation, "questions", budget=10_000)
+
+    assert context == conversation.questions
+    mock_fold.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_build_context_folds_old_turns_into_rolling_summary():
+    conversation = make_conversation(10)
+    with patch("app.services.context_window.fold_messages", new=AsyncMock(return_value="rolling summary")) as mock_fold:
+        context = await build_context(conversation, "questions", budget=400, keep_turns=2)
+
+    # System prompt pinned, summary injected, last two turns verbatim.
+    assert context[0] == {"role": "system", "content": "pinned system prompt"}
+    assert context[1]["content"].endswith("rolling summary")
+    assert context[2:] == conversation.questions[-4:]
+    assert count_message_tokens(context) <= 400
+    mock_fold.assert_awaited_once_with(None, conversation.questions[1:-4])
+    assert conversation.context_summaries == {"questions": "rolling summary"}
+    assert conversation.context_folded == {"questions": 16}
+    # The stored history is never truncated.
+    assert len(conversation.questions) == 21
+
+
+@pytest.mark.asyncio
+async def test_build_context_reuses_summary_until_budget_is_exceeded_again():
+    conversation = make_conversation(10)
+    with patch("app.services.context_window.fold_messages", new=AsyncMock(return_value="first summary")):
+        await build_context(conversation, "questions", budget=400, keep_turns=2)
+
+    conversation.questions.append({"role": "user", "content": "short"})
+    with patch("app.services.context_window.fold_messages", new=AsyncMock(return_value="second summary")) as mock_fold:
+        context = await build_context(conversation, "questions", budget=400, keep_turns=2)
+
+    mock_fold.assert_not_awaited()
+    assert context[1]["content"].endswith("first summary")
+    assert context[-1] == {"role": "user", "content": "short"}
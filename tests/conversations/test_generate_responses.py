@@ -0,0 +1,173 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
+
+from app.openai_resolvers.fake_client import FakeAsyncOpenAI, FakeLLMConfig
+from app.openai_resolvers.generate_responses import generate_responses
+from app.services.analyze_service import get_attribute_and_explanation_object_array
+from app.services.get_system_role import get_system_role
+from app.services.token_counter import count_message_tokens
+from app.type import Conversation
+
+
+def make_conversation() -> Conversation:
+    return Conversation(
+        conversation_id="123",
+        user_id="test_user",
+        topic="Test",
+        questions=[{"role": "system", "content": "question role"}, {"role": "user", "content": "prompt"}],
+        summaries=[{"role": "system", "content": "summary role"}, {"role": "user", "content": "prompt"}],
+        analyze=[{"role": "system", "content": "analyze role"}, {"role": "user", "content": "prompt"}],
+        answers=[{"role": "system", "content": "answers role"}],
+    )
+
+
+def fake_ai_response(delay: float = 0.05, fail_on: str = None):
+    async def _fake(messages, model="gpt-4o-mini", call_site="turn"):
+        role_content = messages[0]["content"]
+        await asyncio.sleep(delay)
+        if fail_on and role_content.startswith(fail_on):
+            raise RuntimeError(f"{fail_on} failed")
+        return f"response to {role_content}"
+    return _fake
+
+
+@pytest.mark.asyncio
+@patch("app.openai_resolvers.generate_responses.update_conversation", new_callable=AsyncMock)
+async def test_concurrent_mode_overlaps_independent_calls(mock_update_conversation):
+    conversation = make_conversation()
+    with patch("app.openai_resolvers.generate_responses.get_ai_response", side_effect=fake_ai_response(0.1)):
+        started = asyncio.get_running_loop().time()
+        responses = await generate_responses(conversation, concurrent=True)
+        elapsed = asyncio.get_running_loop().time() - started
+
+    # Two round trips (fan-out + answers) instead of four.
+    assert elapsed < 0.35
+    assert responses == (
+        "response to question role",
+        "response to summary role",
+        "response to analyze role",
+        "response to answers role",
+    )
+    assert conversation.questions[-1] == {"role": "assistant", "content": "response to question role"}
+    assert conversation.answers[-2]["role"] == "user"
+    assert "response to question role" in conversation.answers[-2]["content"]
+    assert conversation.answers[-1] == {"role": "assistant", "content": "response to answers role"}
+    mock_update_conversation.assert_awaited_once_with(conversation)
+
+
+@pytest.mark.asyncio
+@patch("app.openai_resolvers.generate_responses.update_conversation", new_callable=AsyncMock)
+async def test_concurrent_mode_matches_sequential_mode(mock_update_conversation):
+    concurrent_conversation = make_conversation()
+    sequential_conversation = make_conversation()
+    with patch("app.openai_resolvers.generate_responses.get_ai_response", side_effect=fake_ai_response(0)):
+        concurrent_responses = await generate_responses(concurrent_conversation, concurrent=True)
+        sequential_responses = await generate_responses(sequential_conversation, concurrent=False)
+
+    assert concurrent_responses == sequential_responses
+    assert concurrent_conversation.questions == sequential_conversation.questions
+    assert concurrent_conversation.summaries == sequential_conversation.summaries
+    assert concurrent_conversation.analyze == sequential_conversation.analyze
+    assert concurrent_conversation.answers == sequential_conversation.answers
+
+
+@pytest.mark.asyncio
+@patch("app.openai_resolvers.generate_responses.update_conversation", new_callable=AsyncMock)
+async def test_concurrent_mode_isolates_failed_branch(mock_update_conversation):
+    conversation = make_conversation()
+    mock_get_ai_response = AsyncMock(side_effect=fake_ai_response(0, fail_on="analyze"))
+    with patch("app.openai_resolvers.generate_responses.get_ai_response", mock_get_ai_response):
+        with pytest.raises(HTTPException) as exc_info:
+            await generate_responses(conversation, concurrent=True)
+
+    assert exc_info.value.status_code == 500
+    # The other branches still ran to completion, but nothing was appended or persisted.
+    assert mock_get_ai_response.await_count == 4
+    assert conversation.questions[-1]["role"] == "user"
+    assert conversation.answers == [{"role": "system", "content": "answers role"}]
+    mock_update_conversation.assert_not_awaited()
+
+
+def make_topic_conversation(turns: int = 6) -> Conversation:
+    roles = get_system_role("Father")
+    conversation = Conversation(
+        conversation_id="123",
+        topic="Father",
+        questions=[roles["question"]],
+        summaries=[roles["summary"]],
+        analyze=[roles["analyze"]],
+        answers=[roles["answers"]],
+    )
+    for turn in range(turns):
+        prompt = {"role": "user", "content": f"My father worked every weekend at shop {turn}, and I learned that showing up for family matters most to me."}
+        conversation.questions += [prompt, {"role": "assistant", "content": "What about that felt most important to you?"}]
+        conversation.summaries += [prompt, {"role": "assistant", "content": "The user explained that family and hard work shaped them."}]
+        conversation.analyze += [prompt, {"role": "assistant", "content": "Summary.\n1. Family - Shows up - {high: 90%}"}]
+    prompt = {"role": "user", "content": "He never complained about it."}
+    for history in (conversation.questions, conversation.summaries, conversation.analyze):
+        history.append(prompt)
+    return conversation
+
+
+async def run_with_fake_client(conversation: Conversation, mode: str):
+    client = FakeAsyncOpenAI(FakeLLMConfig())
+    sent = []
+
+    async def create(messages, **params):
+        sent.append(messages)
+        return await FakeAsyncOpenAI(FakeLLMConfig()).chat.completions.create(messages=messages, **params)
+
+    with patch("app.openai_resolvers.completions.client", new=client), \
+         patch.object(client.chat.completions, "create", new=create), \
+         patch("app.openai_resolvers.generate_responses.update_conversation", new_callable=AsyncMock):
+        responses = await generate_responses(conversation, mode=mode)
+    return responses, sent
+
+
+@pytest.mark.asyncio
+async def test_single_call_mode_fills_every_history_with_one_completion():
+    conversation = make_topic_conversation()
+    lengths = [len(conversation.questions), len(conversation.summaries), len(conversation.analyze), len(conversation.answers)]
+
+    (question, summary, analyze, answers), sent = await run_with_fake_client(conversation, "single")
+
+    assert len(sent) == 1
+    assert conversation.questions[-1] == {"role": "assistant", "content": question}
+    assert conversation.summaries[-1] == {"role": "assistant", "content": summary}
+    assert conversation.analyze[-1] == {"role": "assistant", "content": analyze}
+    assert conversation.answers[-1] == {"role": "assistant", "content": answers}
+    assert [len(conversation.questions), len(conversation.summaries), len(conversation.analyze), len(conversation.answers)] == [
+        lengths[0] + 1, lengths[1] + 1, lengths[2] + 1, lengths[3] + 2
+    ]
+    assert all(set(answer) == {"title", "answer"} for answer in json.loads(answers))
+    assert len(get_attribute_and_explanation_object_array(analyze)) == 5
+
+
+@pytest.mark.asyncio
+async def test_single_call_mode_sends_far_fewer_prompt_tokens():
+    _, multi_sent = await run_with_fake_client(make_topic_conversation(), "multi")
+    _, single_sent = await run_with_fake_client(make_topic_conversation(), "single")
+
+    multi_tokens = sum(count_message_tokens(messages) for messages in multi_sent)
+    single_tokens = sum(count_message_tokens(messages) for messages in single_sent)
+    # The shared history is sent once instead of three times; both modes still send the
+    # analysis instructions once, so the ratio grows towards 3x as the history gets longer.
+    assert single_tokens * 1.5 < multi_tokens
+
+
+@pytest.mark.asyncio
+@patch("app.openai_resolvers.generate_responses.update_conversation", new_callable=AsyncMock)
+async def test_single_call_mode_falls_back_to_one_call_per_history_on_invalid_output(mock_update_conversation):
+    conversation = make_conversation()
+    invalid = MagicMock()
+    invalid.choices[0].message.content = '{"question": "Why?"}'
+    with patch("app.openai_resolvers.generate_responses.get_turn_system_role", return_value={"role": "system", "content": "turn role"}), \
+         patch("app.openai_resolvers.generate_responses.create_chat_completion", new=AsyncMock(return_value=invalid)), \
+         patch("app.openai_resolvers.generate_responses.get_ai_response", side_effect=fake_ai_response(0)):
+        responses = await generate_responses(conversation, mode="single")
+
+    assert responses[0] == "response to question role"
+    assert len(conversation.questions) == 3
@@ -58,7 +58,7 @@ def test_retrieve_title():
 # Test `ask_title` function with mock
 @pytest.mark.asyncio
 async def test_ask_title():
-    with patch("app.openai_resolvers.get_title.client.chat.completions.create", new_callable=AsyncMock) as mock_create:
+    with patch("app.openai_resolvers.completions.client.chat.completions.create", new_callable=AsyncMock) as mock_create:
         mock_create.return_value = mock_response
         response = await ask_title(mock_sentences)
         assert response == mock_response
@@ -46,6 +46,6 @@ async def test_process_answer_and_generate_followup_resolver(
     assert response["title"] == "Generated Title"
     
     mock_process_conversation.assert_awaited_once_with(request, user_id)
-    mock_generate_responses.assert_awaited_once_with(conversation)
+    mock_generate_responses.assert_awaited_once_with(conversation, mode=None)
     mock_update_conversation.assert_awaited()
     mock_get_title.assert_awaited_once_with(["ai_summary_response"])
@@ -0,0 +1,102 @@
+import json
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from app.packages.models.conversation_models import GPTRequest
+from app.resolvers.conversation_resolvers import process_answer_and_generate_followup_stream_resolver
+from app.type import Conversation
+
+
+def make_conversation() -> Conversation:
+    return Conversation(
+        conversation_id="123",
+        user_id="test_user",
+        topic="Test",
+        questions=[{"role": "system", "content": "question"}, {"role": "user", "content": "prompt"}],
+        summaries=[{"role": "system", "content": "summary"}, {"role": "user", "content": "prompt"}],
+        analyze=[{"role": "system", "content": "analyze"}, {"role": "user", "content": "prompt"}],
+        answers=[{"role": "system", "content": "answers"}],
+    )
+
+
+class FakeStream:
+    def __init__(self, deltas):
+        self.deltas = deltas
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for delta in self.deltas:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+
+
+async def fake_create(messages, model, stream, stream_options=None):
+    assert stream is True
+    content = messages[0]["content"]
+    if content.startswith("You are a title"):
+        return FakeStream(["A ", "title"])
+    if content == "fail":
+        raise RuntimeError("upstream failed")
+    return FakeStream([f"{content} ", "tokens"])
+
+
+def parse_events(chunks):
+    events = []
+    for chunk in chunks:
+        event_line, data_line = chunk.strip().split("\n")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+@pytest.mark.asyncio
+@patch("app.resolvers.conversation_resolvers.update_conversation", new_callable=AsyncMock)
+@patch("app.resolvers.conversation_resolvers.process_conversation", new_callable=AsyncMock)
+async def test_stream_resolver_emits_tagged_events_and_persists(mock_process_conversation, mock_update_conversation):
+    conversation = make_conversation()
+    mock_process_conversation.return_value = conversation
+    request = GPTRequest(topic="Test", prompt="prompt", conversation_id="123")
+
+    with patch("app.openai_resolvers.completions.client.chat.completions.create", new=AsyncMock(side_effect=fake_create)):
+        events = await process_answer_and_generate_followup_stream_resolver(request, "test_user")
+        chunks = [chunk async for chunk in events]
+
+    parsed = parse_events(chunks)
+    deltas = {}
+    for event, data in parsed[:-1]:
+        deltas[event] = deltas.get(event, "") + data["delta"]
+
+    assert deltas == {
+        "question": "question tokens",
+        "summary": "summary tokens",
+        "analyze": "analyze tokens",
+        "answers": "answers tokens",
+        "title": "A title",
+    }
+    done_event, done = parsed[-1]
+    assert done_event == "done"
+    assert done["question_response"] == "question tokens"
+    assert done["answers_response"] == "answers tokens"
+    assert done["title"] == "A title"
+    assert conversation.answers[-2]["role"] == "user"
+    mock_update_conversation.assert_awaited_once_with(conversation)
+
+
+@pytest.mark.asyncio
+@patch("app.resolvers.conversation_resolvers.update_conversation", new_callable=AsyncMock)
+@patch("app.resolvers.conversation_resolvers.process_conversation", new_callable=AsyncMock)
+async def test_stream_resolver_emits_error_without_persisting(mock_process_conversation, mock_update_conversation):
+    conversation = make_conversation()
+    conversation.title = "Existing title"
+    conversation.analyze[0]["content"] = "fail"
+    mock_process_conversation.return_value = conversation
+    request = GPTRequest(topic="Test", prompt="prompt", conversation_id="123")
+
+    with patch("app.openai_resolvers.completions.client.chat.completions.create", new=AsyncMock(side_effect=fake_create)):
+        events = await process_answer_and_generate_followup_stream_resolver(request, "test_user")
+        chunks = [chunk async for chunk in events]
+
+    assert parse_events(chunks)[-1][0] == "error"
+    assert conversation.questions[-1]["role"] == "user"
+    mock_update_conversation.assert_not_awaited()
@@ -0,0 +1,159 @@
+import asyncio
+import pytest
+from bson import ObjectId
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
+
+from app.openai_resolvers.call_site_config import bind_call_site_overrides
+from app.openai_resolvers.fair_queue import bind_llm_user, current_llm_user
+from app.openai_resolvers.llm_metrics import bind_llm_topic, current_llm_topic
+from app.packages.models.conversation_models import GPTRequest
+from app.resolvers.conversation_resolvers import get_conversation_title_resolver, process_answer_and_generate_followup_resolver
+from app.services.background_tasks import BackgroundTaskQueue
+from app.services.title_service import get_title_status, is_title_pending, schedule_title_generation
+from app.type import Conversation
+
+
+@pytest.mark.asyncio
+async def test_background_queue_runs_jobs_and_drains_on_shutdown():
+    queue = BackgroundTaskQueue(maxsize=10, workers=2)
+    assert queue.submit("before-start", AsyncMock()) is False
+
+    await queue.start()
+    finished = []
+
+    async def job(index):
+        await asyncio.sleep(0.01)
+        finished.append(index)
+
+    for index in range(5):
+        assert queue.submit(f"job-{index}", lambda index=index: job(index))
+    await queue.drain()
+
+    assert sorted(finished) == [0, 1, 2, 3, 4]
+    assert queue.submit("after-drain", AsyncMock()) is False
+
+
+@pytest.mark.asyncio
+async def test_background_queue_is_bounded_and_survives_failing_jobs():
+    queue = BackgroundTaskQueue(maxsize=1, workers=1)
+    await queue.start()
+    blocker = asyncio.Event()
+
+    async def blocked():
+        await blocker.wait()
+
+    assert queue.submit("failing", AsyncMock(side_effect=RuntimeError("boom")))
+    # Each job runs in its own task, so the worker needs a few loop iterations to take the next one.
+    for _ in range(3):
+        await asyncio.sleep(0)
+    assert queue.submit("blocked", blocked)
+    for _ in range(3):
+        await asyncio.sleep(0)
+    assert queue.submit("queued", AsyncMock())
+    assert queue.has_capacity() is False
+    assert queue.submit("rejected", AsyncMock()) is False
+
+    blocker.set()
+    await queue.drain()
+
+
+@pytest.mark.asyncio
+async def test_background_jobs_do_not_inherit_context_from_earlier_jobs():
+    queue = BackgroundTaskQueue(maxsize=10, workers=1)
+    await queue.start()
+    seen = []
+
+    async def binding_job():
+        bind_llm_user("user-1")
+        bind_llm_topic("Father")
+
+    async def observing_job():
+        seen.append((current_llm_user.get(), current_llm_topic.get()))
+
+    assert queue.submit("binding", binding_job)
+    assert queue.submit("observing", observing_job)
+    await queue.drain()
+
+    assert seen == [(None, None)]
+
+
+def test_title_status_reports_pending_until_timeout():
+    conversation = Conversation(title_status="pending", title_requested_at=datetime.now(timezone.utc))
+    assert is_title_pending(conversation)
+    assert get_title_status(conversation) == "pending"
+
+    conversation.title_requested_at = datetime.now(timezone.utc) - timedelta(hours=1)
+    assert get_title_status(conversation) is None
+
+    conversation.title = "Generated Title"
+    assert get_title_status(conversation) == "ready"
+
+
+@pytest.mark.asyncio
+@patch("app.resolvers.conversation_resolvers.process_conversation", new_callable=AsyncMock)
+@patch("app.resolvers.conversation_resolvers.generate_responses", new_callable=AsyncMock)
+@patch("app.resolvers.conversation_resolvers.update_conversation", new_callable=AsyncMock)
+@patch("app.resolvers.conversation_resolvers.get_title", new_callable=AsyncMock)
+@patch("app.services.title_service.update_conversation_title", new_callable=AsyncMock)
+@patch("app.services.title_service.get_title", new_callable=AsyncMock)
+async def test_resolver_returns_provisional_title_and_generates_it_in_background(
+    mock_service_get_title, mock_update_conversation_title, mock_resolver_get_title,
+    mock_update_conversation, mock_generate_responses, mock_process_conversation
+):
+    conversation = Conversation(conversation_id="123", topic="Father", questions=[], summaries=[], analyze=[], answers=[])
+    mock_process_conversation.return_value = conversation
+    mock_generate_responses.return_value = ("question", "summary", "analyze", "answers")
+    mock_service_get_title.return_value = "Generated Title"
+    request = GPTRequest(topic="Father", prompt="prompt", conversation_id=None)
+
+    queue = BackgroundTaskQueue(maxsize=10, workers=1)
+    with patch("app.services.title_service.background_tasks", queue):
+        await queue.start()
+        response = await process_answer_and_generate_followup_resolver(request, "test_user")
+        assert response["title"] == "Father"
+        assert response["title_status"] == "pending"
+        mock_resolver_get_title.assert_not_awaited()
+        # Only the turn's own write happens on the request path.
+        mock_update_conversation.assert_awaited_once_with(conversation)
+        await queue.drain()
+
+    mock_service_get_title.assert_awaited_once_with(["summary"])
+    assert mock_update_conversation_title.await_args_list[-1].kwargs == {"title": "Generated Title", "title_status": "ready"}
+
+
+@pytest.mark.asyncio
+@patch("app.services.title_service.update_conversation_title", new_callable=AsyncMock)
+async def test_background_title_uses_the_request_overrides(mock_update_conversation_title):
+    response = MagicMock()
+    response.choices[0].message.content = "Generated Title"
+    mock_create = AsyncMock(return_value=response)
+    queue = BackgroundTaskQueue(maxsize=10, workers=1)
+
+    async def request():
+        bind_call_site_overrides({"title": {"model": "gpt-4o", "temperature": 0.1}})
+        assert await schedule_title_generation(Conversation(conversation_id="123"), "summary")
+
+    with patch("app.services.title_service.background_tasks", queue), \
+         patch("app.openai_resolvers.completions.client.chat.completions.create", new=mock_create):
+        await queue.start()
+        # Run in its own task so the overrides do not leak into other tests.
+        await asyncio.create_task(request())
+        await queue.drain()
+
+    assert mock_create.await_args.kwargs["model"] == "gpt-4o"
+    assert mock_create.await_args.kwargs["temperature"] == 0.1
+    assert mock_update_conversation_title.await_args_list[-1].kwargs == {"title": "Generated Title", "title_status": "ready"}
+
+
+@pytest.mark.asyncio
+async def test_title_of_another_users_conversation_is_not_found():
+    conversation_id = str(ObjectId())
+    with patch("app.packages.database.conversation_collection.find_one", new_callable=AsyncMock) as mock_find_one:
+        mock_find_one.return_value = None
+        with pytest.raises(HTTPException) as error:
+            await get_conversation_title_resolver(conversation_id, "other_user")
+
+    assert error.value.status_code == 404
+    assert mock_find_one.await_args.args[0] == {"_id": ObjectId(conversation_id), "user_id": "other_user"}
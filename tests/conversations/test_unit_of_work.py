@@ -0,0 +1,97 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
+
+from app.openai_resolvers.fake_client import FakeAsyncOpenAI, FakeLLMConfig
+from app.packages.models.conversation_models import GPTRequest
+from app.packages.mongodb import conversation_unit_of_work, update_conversation, update_conversation_title
+from app.packages.unit_of_work import turn_round_trips
+from app.resolvers.conversation_resolvers import process_answer_and_generate_followup_resolver
+from app.type import Conversation
+
+
+@pytest.fixture(autouse=True)
+def fake_llm():
+    turn_round_trips.reset()
+    with patch("app.openai_resolvers.completions.client", new=FakeAsyncOpenAI(FakeLLMConfig())), \
+         patch("app.resolvers.conversation_resolvers.schedule_analysis_precompute"):
+        yield
+    turn_round_trips.reset()
+
+
+@pytest.mark.asyncio
+async def test_a_new_conversation_turn_is_stored_with_one_upsert():
+    mock_update = AsyncMock(return_value=MagicMock(matched_count=0, upserted_id=None))
+    with patch("app.packages.mongodb.conversation_collection.update_one", new=mock_update), \
+         patch("app.packages.mongodb.conversation_collection.insert_one", new=AsyncMock()) as mock_insert:
+        result = await process_answer_and_generate_followup_resolver(GPTRequest(prompt="Blue", topic="Test"), "user123")
+
+    mock_insert.assert_not_awaited()
+    mock_update.assert_awaited_once()
+    query, update = mock_update.await_args.args
+    assert query == {"_id": ObjectId(result["conversation_id"])}
+    assert mock_update.await_args.kwargs == {"upsert": True}
+    assert update["$setOnInsert"]["topic"] == "Test"
+    assert update["$set"]["title"] == result["title"]
+    assert len(update["$set"]["questions"]) == 3
+    assert turn_round_trips.get_stats()["round_trips"] == {"read": 0, "write": 1}
+
+
+@pytest.mark.asyncio
+async def test_an_existing_conversation_turn_reads_once_and_writes_once():
+    conversation_id = ObjectId()
+    stored = {
+        "_id": conversation_id,
+        "questions": [{"role": "system", "content": "Ask"}],
+        "summaries": [{"role": "system", "content": "Summarize"}],
+        "analyze": [{"role": "system", "content": "Analyze"}],
+        "answers": [{"role": "system", "content": "Answer"}],
+        "created_at": None,
+        "status": "active",
+        "is_favorite": False,
+        "title": "Colors",
+    }
+    mock_update = AsyncMock(return_value=MagicMock(matched_count=1, upserted_id=None))
+    with patch("app.packages.mongodb.conversation_collection.find_one", new=AsyncMock(return_value=stored)), \
+         patch("app.packages.mongodb.conversation_collection.update_one", new=mock_update):
+        await process_answer_and_generate_followup_resolver(
+            GPTRequest(prompt="Blue", topic="Test", conversation_id=str(conversation_id)), "user123"
+        )
+
+    mock_update.assert_awaited_once()
+    update = mock_update.await_args.args[1]
+    assert [message["role"] for message in update["$push"]["questions"]["$each"]] == ["user", "assistant"]
+    assert turn_round_trips.get_stats() == {
+        "turns": 1,
+        "round_trips": {"read": 1, "write": 1},
+        "round_trips_per_turn": 2.0,
+        "max_round_trips_per_turn": 2,
+    }
+
+
+@pytest.mark.asyncio
+async def test_nothing_is_stored_when_the_turn_fails():
+    conversation = Conversation(user_id="user123", conversation_id=str(ObjectId()), topic="Test")
+    mock_update = AsyncMock()
+    with patch("app.packages.mongodb.conversation_collection.update_one", new=mock_update):
+        with pytest.raises(RuntimeError):
+            async with conversation_unit_of_work():
+                await update_conversation(conversation)
+                await update_conversation_title(conversation.conversation_id, title_status="pending")
+                raise RuntimeError("generation failed")
+
+    mock_update.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_staged_title_fields_are_written_with_the_conversation():
+    conversation = Conversation(user_id="user123", conversation_id=str(ObjectId()), topic="Test")
+    conversation.mark_persisted()
+    mock_update = AsyncMock(return_value=MagicMock(matched_count=1, upserted_id=None))
+    with patch("app.packages.mongodb.conversation_collection.update_one", new=mock_update):
+        async with conversation_unit_of_work():
+            await update_conversation(conversation)
+            await update_conversation_title(conversation.conversation_id, title_status="pending")
+
+    mock_update.assert_awaited_once()
+    assert mock_update.await_args.args[1]["$set"]["title_status"] == "pending"
@@ -0,0 +1,114 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from fastapi import HTTPException
+
+from app.openai_resolvers.call_site_config import (
+    CallSiteConfig,
+    bind_call_site_overrides,
+    call_site_configs,
+    current_call_site_overrides,
+    get_call_site_config,
+    get_request_overrides,
+)
+from app.openai_resolvers.completions import create_chat_completion
+from app.packages.models.conversation_models import GPTRequest
+from app.resolvers.conversation_resolvers import process_answer_and_generate_followup_resolver
+
+
+class MockMessage:
+    def __init__(self, content):
+        self.content = content
+
+class MockChoice:
+    def __init__(self, message):
+        self.message = message
+
+class MockResponse:
+    def __init__(self, content):
+        self.choices = [MockChoice(MockMessage(content))]
+        self.usage = None
+
+
+@pytest.fixture(autouse=True)
+def reset_call_site_configs():
+    call_site_configs.clear()
+    token = current_call_site_overrides.set({})
+    yield
+    current_call_site_overrides.reset(token)
+    call_site_configs.clear()
+
+
+def test_reads_call_site_config_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_SUMMARY_MODEL", "gpt-4o")
+    monkeypatch.setenv("LLM_SUMMARY_MAX_TOKENS", "120")
+    monkeypatch.setenv("LLM_SUMMARY_TEMPERATURE", "0.2")
+    monkeypatch.setenv("LLM_SUMMARY_STOP", "\n\n|END")
+
+    config = CallSiteConfig.from_env("summary")
+
+    assert config.model == "gpt-4o"
+    assert config.params() == {"max_tokens": 120, "temperature": 0.2, "stop": ["\n\n", "END"]}
+    assert CallSiteConfig.from_env("question").params() == {}
+
+
+def test_request_max_tokens_applies_only_when_sent():
+    assert get_request_overrides(GPTRequest(prompt="hi", topic="t")) == {}
+
+    overrides = get_request_overrides(GPTRequest(
+        prompt="hi",
+        topic="t",
+        max_tokens=80,
+        llm_overrides={"summary": {"max_tokens": 40}, "title": {"temperature": 0}},
+    ))
+
+    assert overrides == {
+        "question": {"max_tokens": 80},
+        "summary": {"max_tokens": 40},
+        "analyze": {"max_tokens": 80},
+        "answers": {"max_tokens": 80},
+        "title": {"temperature": 0},
+    }
+
+
+@pytest.mark.parametrize("overrides", [
+    {"keywords": {"max_tokens": 10}},
+    {"question": {"model": "some-other-model"}},
+    {"question": {"max_tokens": 100000}},
+])
+def test_rejects_overrides_outside_the_limits(overrides):
+    with pytest.raises(ValueError):
+        bind_call_site_overrides(overrides)
+
+
+@pytest.mark.asyncio
+async def test_create_chat_completion_sends_the_call_site_parameters(monkeypatch):
+    monkeypatch.setenv("LLM_ANSWERS_MAX_TOKENS", "200")
+    bind_call_site_overrides({"answers": {"model": "gpt-4o", "temperature": 0.5}})
+
+    mock_create = AsyncMock(return_value=MockResponse("ok"))
+    with patch("app.openai_resolvers.completions.client.chat.completions.create", new=mock_create):
+        await create_chat_completion([{"role": "user", "content": "hi"}], call_site="answers", use_cache=False)
+        await create_chat_completion([{"role": "user", "content": "hi"}], call_site="question", use_cache=False, stop=["?"])
+
+    assert mock_create.await_args_list[0].kwargs == {
+        "messages": [{"role": "user", "content": "hi"}],
+        "model": "gpt-4o",
+        "max_tokens": 200,
+        "temperature": 0.5,
+    }
+    assert mock_create.await_args_list[1].kwargs == {
+        "messages": [{"role": "user", "content": "hi"}],
+        "model": "gpt-4o-mini",
+        "stop": ["?"],
+    }
+
+
+@pytest.mark.asyncio
+async def test_resolver_rejects_invalid_overrides_with_400():
+    request = GPTRequest(prompt="hi", topic="t", llm_overrides={"question": {"max_tokens": 100000}})
+
+    with pytest.raises(HTTPException) as error:
+        await process_answer_and_generate_followup_resolver(request, "user")
+
+    assert error.value.status_code == 400
+    assert get_call_site_config("question").max_tokens is None
@@ -0,0 +1,141 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.openai_resolvers.completions import create_chat_completion
+from app.openai_resolvers.fair_queue import FairQueue, bind_llm_user, current_llm_user, parse_user_weights, user_key
+
+
+async def run_calls(queue, calls, hold=0.01):
+    order = []
+
+    async def call(user_id):
+        async with queue.slot(user_id=user_id):
+            order.append(user_id)
+            await asyncio.sleep(hold)
+
+    await asyncio.gather(*(call(user_id) for user_id in calls))
+    return order
+
+
+@pytest.mark.asyncio
+async def test_bursting_user_does_not_starve_others():
+    queue = FairQueue(max_in_flight=1, user_max_in_flight=10, weights={})
+
+    order = await run_calls(queue, ["heavy"] * 8 + ["light", "light"])
+
+    # The light user's calls are interleaved right after the heavy user's first calls.
+    assert order.index("light") <= 2
+    assert order[:5].count("light") == 2
+
+
+@pytest.mark.asyncio
+async def test_weights_give_proportional_share():
+    queue = FairQueue(max_in_flight=1, user_max_in_flight=10, weights={"gold": 3})
+
+    order = await run_calls(queue, ["gold"] * 6 + ["basic"] * 6, hold=0)
+
+    assert order[:8].count("gold") == 6
+
+
+@pytest.mark.asyncio
+async def test_per_user_in_flight_limit():
+    queue = FairQueue(max_in_flight=10, user_max_in_flight=2, weights={})
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with queue.slot(user_id="user"):
+            peak = max(peak, queue.user("user").in_flight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(call() for _ in range(6)))
+
+    assert peak == 2
+    stats = queue.stats()
+    assert stats["granted"] == 6
+    assert stats["queue_depth"] == 0 and stats["in_flight"] == 0
+    assert stats["max_wait_seconds"] > 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_the_queue():
+    queue = FairQueue(max_in_flight=1, user_max_in_flight=1, weights={})
+    await queue.acquire("user")
+
+    waiting = asyncio.create_task(queue.acquire("user"))
+    await asyncio.sleep(0)
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+    queue.release("user")
+
+    assert queue.stats()["queue_depth"] == 0
+    assert queue.in_flight == 0
+    assert queue.users == {}
+
+
+@pytest.mark.asyncio
+async def test_idle_users_are_forgotten_and_not_exposed():
+    queue = FairQueue(max_in_flight=2, user_max_in_flight=10, weights={})
+    await queue.acquire("holder")
+
+    async with queue.slot(user_id="user-1"):
+        pass
+    # Kept while its finish tag is ahead of the virtual time, but not reported as active.
+    assert "user-1" in queue.users
+    assert list(queue.stats()["users"]) == [user_key("holder")]
+
+    for _ in range(2):
+        async with queue.slot(user_id="user-2"):
+            pass
+    assert "user-1" not in queue.users
+
+    queue.release("holder")
+    assert queue.users == {} and queue.idle == []
+
+
+def test_parse_user_weights():
+    assert parse_user_weights("a=2, b=0.5,bad") == {"a": 2.0, "b": 0.5}
+
+
+@pytest.mark.asyncio
+async def test_create_chat_completion_queues_under_the_bound_user():
+    async def request():
+        bind_llm_user("user-1")
+        await create_chat_completion([{"role": "user", "content": "hi"}], call_site="question", use_cache=False)
+
+    with patch("app.openai_resolvers.completions.client.chat.completions.create", new=AsyncMock(return_value="response")), \
+         patch("app.openai_resolvers.completions.fair_queue.acquire", new=AsyncMock()) as mock_acquire, \
+         patch("app.openai_resolvers.completions.fair_queue.release") as mock_release:
+        # Run in its own task so the bound user does not leak into other tests.
+        await asyncio.create_task(request())
+
+    assert mock_acquire.await_args.args[0] == "user-1"
+    mock_release.assert_called_once_with("user-1")
+    assert current_llm_user.get() is None
+
+
+@pytest.mark.asyncio
+async def test_stream_holds_its_slot_until_consumed():
+    queue = FairQueue(max_in_flight=1, user_max_in_flight=1, weights={})
+
+    async def chunks():
+        for chunk in ("a", "b"):
+            yield chunk
+
+    async def fake_create(**params):
+        return chunks()
+
+    with patch("app.openai_resolvers.completions.client.chat.completions.create", new=AsyncMock(side_effect=fake_create)), \
+         patch("app.openai_resolvers.completions.fair_queue", new=queue):
+        stream = await create_chat_completion([{"role": "user", "content": "hi"}], call_site="question", stream=True)
+        assert queue.in_flight == 1
+
+        received = [chunk async for chunk in stream]
+
+        assert received == ["a", "b"]
+        assert queue.in_flight == 0
+
+        stream = await create_chat_completion([{"role": "user", "content": "hi"}], call_site="question", stream=True)
+        await stream.close()
+        assert queue.in_flight == 0
@@ -0,0 +1,97 @@
+import pytest
+from openai import InternalServerError, RateLimitError
+
+from app.openai_resolvers.fake_client import FakeAsyncOpenAI, FakeLLMConfig
+from app.openai_resolvers.get_title import system_prompt as title_system_prompt
+from app.openai_resolvers.keyword_extraction import ANALYSIS_RESPONSE_FORMAT, create_prompt_for_single_sentence, create_prompts_for_multiple_sentences
+from app.services.analyze_service import get_attribute_and_explanation_object_array, parse_structured_analysis
+from app.services.get_system_role import get_system_role
+
+
+@pytest.mark.asyncio
+async def test_fake_analysis_matches_the_numbered_list_format():
+    client = FakeAsyncOpenAI(FakeLLMConfig())
+    response = await client.chat.completions.create(
+        messages=create_prompt_for_single_sentence("I love spending time with my family."),
+        model="gpt-4o-mini",
+    )
+
+    analyzed_values = get_attribute_and_explanation_object_array(response.choices[0].message.content)
+
+    assert len(analyzed_values) == 5
+    for value in analyzed_values:
+        assert value["evaluation"]["label"] in ("high", "medium", "low")
+        assert value["evaluation"]["percentage"].endswith("%")
+    assert response.usage.total_tokens == response.usage.prompt_tokens + response.usage.completion_tokens
+
+
+@pytest.mark.asyncio
+async def test_fake_returns_schema_shaped_json_for_structured_analysis():
+    client = FakeAsyncOpenAI(FakeLLMConfig())
+    response = await client.chat.completions.create(
+        messages=create_prompt_for_single_sentence("I love spending time with my family.", structured=True),
+        model="gpt-4o-mini",
+        response_format=ANALYSIS_RESPONSE_FORMAT,
+    )
+
+    assert len(parse_structured_analysis(response.choices[0].message.content)["analyzed_values"]) == 5
+
+
+@pytest.mark.asyncio
+async def test_fake_responses_are_deterministic_per_prompt():
+    client = FakeAsyncOpenAI(FakeLLMConfig())
+    roles = get_system_role("Father")
+    messages = [roles["question"], {"role": "user", "content": "My father worked every weekend."}]
+
+    first = await client.chat.completions.create(messages=messages, model="gpt-4o-mini")
+    second = await client.chat.completions.create(messages=messages, model="gpt-4o-mini")
+    title = await client.chat.completions.create(messages=[title_system_prompt, {"role": "user", "content": "x"}], model="gpt-4o-mini")
+    keywords = await client.chat.completions.create(messages=create_prompts_for_multiple_sentences(["x"]), model="gpt-4o-mini")
+
+    assert first.choices[0].message.content == second.choices[0].message.content
+    assert first.choices[0].message.content.endswith("?")
+    assert '"' not in title.choices[0].message.content
+    assert len(keywords.choices[0].message.content.split(", ")) == 4
+
+
+@pytest.mark.asyncio
+async def test_fake_streams_chunks_that_join_to_the_full_response():
+    client = FakeAsyncOpenAI(FakeLLMConfig())
+    messages = [{"role": "user", "content": "hello there"}]
+
+    full = await client.chat.completions.create(messages=messages, model="gpt-4o-mini")
+    stream = await client.chat.completions.create(messages=messages, model="gpt-4o-mini", stream=True)
+    deltas = [chunk.choices[0].delta.content async for chunk in stream]
+
+    assert len(deltas) > 1
+    assert "".join(deltas) == full.choices[0].message.content
+
+
+@pytest.mark.asyncio
+async def test_fake_injects_configured_errors_and_scales_usage():
+    failing = FakeAsyncOpenAI(FakeLLMConfig(error_rate=1.0, error_statuses=[429], seed=1))
+    with pytest.raises(RateLimitError):
+        await failing.chat.completions.create(messages=[{"role": "user", "content": "x"}], model="gpt-4o-mini")
+
+    failing = FakeAsyncOpenAI(FakeLLMConfig(error_rate=1.0, error_statuses=[503], seed=1))
+    with pytest.raises(InternalServerError):
+        await failing.chat.completions.create(messages=[{"role": "user", "content": "x"}], model="gpt-4o-mini")
+
+    messages = [{"role": "user", "content": "count these tokens"}]
+    base = await FakeAsyncOpenAI(FakeLLMConfig()).chat.completions.create(messages=messages, model="gpt-4o-mini")
+    scaled = await FakeAsyncOpenAI(FakeLLMConfig(usage_scale=2)).chat.completions.create(messages=messages, model="gpt-4o-mini")
+    assert scaled.usage.prompt_tokens == base.usage.prompt_tokens * 2
+
+
+def test_fake_latency_distributions_respect_configuration():
+    fixed = FakeAsyncOpenAI(FakeLLMConfig(latency_ms=250)).chat.completions
+    assert fixed.sample_latency() == 0.25
+
+    uniform = FakeAsyncOpenAI(FakeLLMConfig(latency_distribution="uniform", latency_ms=100, latency_jitter_ms=50, seed=3)).chat.completions
+    samples = [uniform.sample_latency() for _ in range(200)]
+    assert all(0.05 <= sample <= 0.15 for sample in samples)
+
+    lognormal = FakeAsyncOpenAI(FakeLLMConfig(latency_distribution="lognormal", latency_ms=100, latency_jitter_ms=50, seed=3)).chat.completions
+    samples = sorted(lognormal.sample_latency() for _ in range(1001))
+    assert 0.08 < samples[500] < 0.12
+    assert samples[-1] > 0.2
@@ -0,0 +1,79 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from app.openai_resolvers.completions import create_chat_completion
+from app.openai_resolvers.llm_cache import LRUCache, llm_cache, make_cache_key
+
+
+def make_response(content: str, total_tokens: int = 10):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(total_tokens=total_tokens),
+    )
+
+
+def test_make_cache_key_depends_on_model_messages_and_params():
+    messages = [{"role": "user", "content": "hello"}]
+    key = make_cache_key("gpt-4o-mini", messages, {})
+    assert key == make_cache_key("gpt-4o-mini", [{"content": "hello", "role": "user"}], {})
+    assert key != make_cache_key("gpt-4o", messages, {})
+    assert key != make_cache_key("gpt-4o-mini", messages, {"temperature": 0})
+    assert key != make_cache_key("gpt-4o-mini", [{"role": "user", "content": "hello!"}], {})
+
+
+def test_lru_cache_evicts_least_recently_used_entry():
+    cache = LRUCache(max_entries=2, max_bytes=1_000_000, ttl_seconds=60)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.get("a") == "A"
+    cache.set("c", "C")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+    assert cache.stats.evictions == 1
+
+
+def test_lru_cache_evicts_by_size_and_expires_by_ttl():
+    cache = LRUCache(max_entries=10, max_bytes=120, ttl_seconds=60)
+    cache.set("a", "x" * 40)
+    cache.set("b", "y" * 40)
+    assert cache.get("a") is None
+    assert cache.size_bytes <= 120
+
+    expired = LRUCache(max_entries=10, max_bytes=1_000_000, ttl_seconds=0)
+    expired.set("a", "A")
+    assert expired.get("a") is None
+    assert expired.stats.expirations == 1
+
+
+@pytest.mark.asyncio
+async def test_create_chat_completion_serves_repeated_requests_from_cache():
+    messages = [{"role": "user", "content": "same payload"}]
+    mock_create = AsyncMock(return_value=make_response("cached answer", total_tokens=42))
+    with patch("app.openai_resolvers.completions.client.chat.completions.create", mock_create):
+        first = await create_chat_completion(messages, call_site="title")
+        second = await create_chat_completion(messages, call_site="title")
+        await create_chat_completion(messages, call_site="title", use_cache=False)
+
+    assert first is second
+    assert mock_create.await_count == 2
+    stats = llm_cache.get_stats()
+    assert stats["call_sites"]["title"] == {
+        "hits": 1, "misses": 1, "evictions": 0, "expirations": 0, "tokens_saved": 42
+    }
+
+
+@pytest.mark.asyncio
+async def test_create_chat_completion_never_caches_streams_or_errors():
+    messages = [{"role": "user", "content": "stream me"}]
+    mock_create = AsyncMock(side_effect=[RuntimeError("boom"), make_response("ok"), "stream", "stream"])
+    with patch("app.openai_resolvers.completions.client.chat.completions.create", mock_create):
+        with pytest.raises(RuntimeError):
+            await create_chat_completion(messages)
+        await create_chat_completion(messages)
+        await create_chat_completion(messages, stream=True)
+        await create_chat_completion(messages, stream=True)
+
+    assert mock_create.await_count == 4
@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.openai_resolvers.completions import create_chat_completion
+from app.openai_resolvers.fake_client import FakeAsyncOpenAI, FakeLLMConfig
+from app.openai_resolvers.llm_metrics import Histogram, bind_llm_topic, llm_metrics
+
+
+@pytest.fixture(autouse=True)
+def reset_llm_metrics():
+    llm_metrics.reset()
+    yield
+    llm_metrics.reset()
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", ("call_site",), buckets=(0.5, 1.0))
+    histogram.observe(("turn",), 0.2)
+    histogram.observe(("turn",), 0.7)
+    histogram.observe(("turn",), 3.0)
+
+    lines = histogram.render()
+
+    assert 'latency_seconds_bucket{call_site="turn",le="0.5"} 1' in lines
+    assert 'latency_seconds_bucket{call_site="turn",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{call_site="turn",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{call_site="turn"} 3.9' in lines
+    assert 'latency_seconds_count{call_site="turn"} 3' in lines
+
+
+@pytest.mark.asyncio
+async def test_records_latency_tokens_and_outcome_by_call_site_and_topic():
+    bind_llm_topic("friendship")
+    fake = FakeAsyncOpenAI(FakeLLMConfig())
+    with patch("app.openai_resolvers.completions.client", new=fake):
+        response = await create_chat_completion([{"role": "user", "content": "hi"}], call_site="question", use_cache=False)
+
+    labels = ("question", "friendship", "gpt-4o-mini")
+    assert llm_metrics.requests.get((*labels, "ok")) == 1
+    assert llm_metrics.duration.count((*labels, "ok")) == 1
+    assert llm_metrics.tokens.get((*labels, "prompt")) == response.usage.prompt_tokens
+    assert llm_metrics.tokens.get((*labels, "completion")) == response.usage.completion_tokens
+    assert 'llm_requests_total{call_site="question",topic="friendship",model="gpt-4o-mini",outcome="ok"} 1' in llm_metrics.render()
+
+
+@pytest.mark.asyncio
+async def test_records_the_outcome_of_failed_calls():
+    failing = AsyncMock(side_effect=asyncio.TimeoutError())
+    with patch("app.openai_resolvers.completions.client.chat.completions.create", new=failing):
+        with pytest.raises(asyncio.TimeoutError):
+            await create_chat_completion([{"role": "user", "content": "hi"}], call_site="title", use_cache=False)
+
+    assert llm_metrics.requests.get(("title", "unknown", "gpt-4o-mini", "timeout")) == 1
+
+
+@pytest.mark.asyncio
+async def test_records_time_to_first_token_and_usage_of_streams():
+    fake = FakeAsyncOpenAI(FakeLLMConfig())
+    with patch("app.openai_resolvers.completions.client", new=fake):
+        stream = await create_chat_completion(
+            [{"role": "user", "content": "hello there"}],
+            call_site="summary",
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        # Nothing is recorded until the stream has been consumed.
+        assert llm_metrics.requests.get(("summary", "unknown", "gpt-4o-mini", "ok")) == 0
+        chunks = [chunk async for chunk in stream]
+
+    labels = ("summary", "unknown", "gpt-4o-mini")
+    assert llm_metrics.time_to_first_token.count(labels) == 1
+    assert llm_metrics.requests.get((*labels, "ok")) == 1
+    assert llm_metrics.tokens.get((*labels, "completion")) == chunks[-1].usage.completion_tokens > 0
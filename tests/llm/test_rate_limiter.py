@@ -0,0 +1,94 @@
+import asyncio
+import httpx
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.openai_resolvers.completions import create_chat_completion
+from app.openai_resolvers.openai_client import observe_rate_limits
+from app.openai_resolvers.rate_limiter import RateBudgetScheduler, TokenBucket, parse_reset_seconds
+
+
+def test_token_bucket_reports_wait_for_missing_tokens():
+    bucket = TokenBucket(capacity=60, refill_per_second=1)
+    bucket.take(60)
+
+    assert bucket.seconds_until(10) == pytest.approx(10, abs=0.1)
+    # A request larger than the bucket only waits for a full bucket.
+    assert bucket.seconds_until(1000) == pytest.approx(60, abs=0.1)
+
+
+@pytest.mark.asyncio
+async def test_interactive_calls_are_dispatched_before_background_calls():
+    scheduler = RateBudgetScheduler(requests_per_minute=6000, tokens_per_minute=60000)
+    scheduler.requests.take(scheduler.requests.level)
+    order = []
+
+    async def call(call_site):
+        await scheduler.acquire(call_site, 10)
+        order.append(call_site)
+
+    tasks = [asyncio.create_task(call(site)) for site in ("title", "keywords", "question", "analysis", "answers")]
+    await asyncio.wait_for(asyncio.gather(*tasks), timeout=2)
+
+    assert order == ["question", "answers", "analysis", "title", "keywords"]
+    assert scheduler.queue_depth() == 0
+    assert scheduler.stats()["granted"] == 5
+
+
+@pytest.mark.asyncio
+async def test_token_budget_delays_requests_until_refilled():
+    scheduler = RateBudgetScheduler(requests_per_minute=6000, tokens_per_minute=6000)
+    await scheduler.acquire("question", 6000)
+
+    started = asyncio.get_running_loop().time()
+    await scheduler.acquire("question", 10)
+
+    assert asyncio.get_running_loop().time() - started >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_block_the_queue():
+    scheduler = RateBudgetScheduler(requests_per_minute=600, tokens_per_minute=60000)
+    scheduler.requests.take(scheduler.requests.level)
+
+    waiting = asyncio.create_task(scheduler.acquire("title", 10))
+    await asyncio.sleep(0)
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+
+    assert scheduler.queue_depth() == 0
+
+
+def test_rate_limit_headers_lower_budgets_and_429_pauses_dispatch():
+    scheduler = RateBudgetScheduler(requests_per_minute=500, tokens_per_minute=200000)
+    scheduler.observe_response(429, {
+        "x-ratelimit-limit-requests": "100",
+        "x-ratelimit-remaining-requests": "3",
+        "x-ratelimit-remaining-tokens": "1000",
+        "x-ratelimit-reset-requests": "1m30s",
+    })
+
+    assert scheduler.requests.capacity == 100
+    assert scheduler.requests.level <= 3.1
+    assert scheduler.tokens.level <= 1000.1
+    assert scheduler.paused_until > 0
+    assert parse_reset_seconds("6m0s") == 360
+    assert parse_reset_seconds("20ms") == pytest.approx(0.02)
+
+
+@pytest.mark.asyncio
+async def test_openai_client_response_hook_feeds_the_scheduler():
+    response = httpx.Response(200, headers={"x-ratelimit-remaining-tokens": "5"})
+    with patch("app.openai_resolvers.openai_client.rate_scheduler.observe_response") as mock_observe:
+        await observe_rate_limits(response)
+
+    mock_observe.assert_called_once_with(200, response.headers)
+
+
+@pytest.mark.asyncio
+async def test_create_chat_completion_acquires_budget_for_each_call():
+    with patch("app.openai_resolvers.completions.client.chat.completions.create", new=AsyncMock(return_value="response")), \
+         patch("app.openai_resolvers.completions.rate_scheduler.acquire", new=AsyncMock()) as mock_acquire:
+        await create_chat_completion([{"role": "user", "content": "hi"}], call_site="title", use_cache=False, max_tokens=50)
+
+    mock_acquire.assert_awaited_once_with("title", 50 + 1 + 4)
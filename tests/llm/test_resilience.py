@@ -0,0 +1,165 @@
+import asyncio
+import httpx
+import time
+import pytest
+from unittest.mock import AsyncMock, patch
+from openai import BadRequestError, InternalServerError, RateLimitError
+
+from app.openai_resolvers.completions import create_chat_completion
+from app.openai_resolvers.resilience import CallSitePolicy, CircuitBreaker, CircuitOpenError, ResilientCaller
+
+
+def make_error(error_class, status, headers=None):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status, request=request, headers=headers or {})
+    return error_class("error", response=response, body=None)
+
+
+def make_caller(**policy):
+    caller = ResilientCaller()
+    caller.policies["turn"] = CallSitePolicy(**{"timeout": 1.0, "backoff_base": 0, **policy})
+    return caller
+
+
+@pytest.mark.asyncio
+async def test_retries_rate_limits_and_server_errors_then_succeeds():
+    caller = make_caller(max_retries=2)
+    call = AsyncMock(side_effect=[make_error(RateLimitError, 429), make_error(InternalServerError, 503), "ok"])
+
+    assert await caller.call("question", call) == "ok"
+    assert call.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_does_not_retry_client_errors():
+    caller = make_caller(max_retries=2)
+    call = AsyncMock(side_effect=make_error(BadRequestError, 400))
+
+    with pytest.raises(BadRequestError):
+        await caller.call("question", call)
+    assert call.await_count == 1
+    assert caller.breaker("turn").state == "closed"
+    assert not caller.breaker("turn").outcomes
+
+
+@pytest.mark.asyncio
+async def test_client_errors_do_not_close_a_half_open_circuit():
+    caller = make_caller(max_retries=0)
+    breaker = caller.breaker("turn")
+    breaker.opened_at = time.monotonic() - breaker.cooldown_seconds
+
+    with pytest.raises(BadRequestError):
+        await caller.call("question", AsyncMock(side_effect=make_error(BadRequestError, 400)))
+
+    assert breaker.state == "half_open"
+    assert not breaker.trial_in_flight
+
+
+@pytest.mark.asyncio
+async def test_honors_retry_after_header():
+    caller = make_caller(max_retries=1, backoff_max=10)
+    call = AsyncMock(side_effect=[make_error(RateLimitError, 429, {"retry-after": "3"}), "ok"])
+
+    with patch("app.openai_resolvers.resilience.asyncio.sleep", new=AsyncMock()) as mock_sleep:
+        assert await caller.call("question", call) == "ok"
+    mock_sleep.assert_awaited_once_with(3.0)
+
+
+@pytest.mark.asyncio
+async def test_times_out_slow_attempts_and_retries():
+    caller = make_caller(timeout=0.01, max_retries=1)
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            await asyncio.sleep(1)
+        return "ok"
+
+    assert await caller.call("question", call) == "ok"
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_hedges_a_slow_request_and_returns_the_first_response():
+    caller = make_caller(hedge=True, hedge_min_delay=0.01)
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.5 if calls == 1 else 0)
+        return f"response {calls}"
+
+    assert await caller.call("question", call) == "response 2"
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_waiting_for_rate_budget_does_not_trigger_a_hedge():
+    caller = make_caller(hedge=True, hedge_min_delay=0.01)
+    call = AsyncMock(return_value="response")
+    waits = [0.05, 0]
+
+    async def wait_for_budget():
+        # Only the first attempt is queued behind other calls.
+        await asyncio.sleep(waits.pop(0))
+
+    assert await caller.call("question", call, before_attempt=wait_for_budget) == "response"
+    call.assert_awaited_once()
+    # No hedge was fired, so the second budget wait never happened.
+    assert waits == [0]
+
+
+@pytest.mark.asyncio
+async def test_cancelling_the_caller_cancels_the_primary_attempt_before_the_hedge():
+    caller = make_caller(hedge=True, hedge_min_delay=10)
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def call():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    task = asyncio.create_task(caller.call("question", call))
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+
+def test_circuit_opens_on_failures_and_closes_after_a_successful_trial():
+    breaker = CircuitBreaker(min_calls=4, cooldown_seconds=0)
+    breaker.cooldown_seconds = 60
+    for _ in range(4):
+        breaker.record(False)
+
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call("turn")
+
+    breaker.cooldown_seconds = 0
+    breaker.before_call("turn")
+    with pytest.raises(CircuitOpenError):
+        # Only one trial call is let through while half-open.
+        breaker.before_call("turn")
+    breaker.record(True)
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_create_chat_completion_retries_through_the_resilience_layer():
+    mock_create = AsyncMock(side_effect=[make_error(InternalServerError, 500), "response"])
+    with patch("app.openai_resolvers.completions.client.chat.completions.create", new=mock_create), \
+         patch("app.openai_resolvers.resilience.asyncio.sleep", new=AsyncMock()):
+        response = await create_chat_completion([{"role": "user", "content": "hi"}], call_site="title", use_cache=False)
+
+    assert response == "response"
+    assert mock_create.await_count == 2
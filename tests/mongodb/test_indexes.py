@@ -0,0 +1,70 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from pymongo.errors import OperationFailure
+
+from app.packages.indexes import IndexSpec, diff_indexes, ensure_indexes, index_report
+
+SPECS = [
+    IndexSpec(collection="users", name="username_unique", keys=(("username", 1),), options={"unique": True}),
+    IndexSpec(collection="users", name="email_1", keys=(("email", 1),)),
+]
+
+
+def make_database(existing, stats=None, create_error=None):
+    collection = MagicMock()
+    collection.name = "users"
+    collection.index_information = AsyncMock(return_value=existing)
+    collection.create_indexes = AsyncMock(side_effect=create_error)
+    collection.aggregate.return_value.to_list = AsyncMock(return_value=stats or [])
+    database = MagicMock()
+    database.get_collection.return_value = collection
+    return database, collection
+
+
+def test_diff_indexes_finds_missing_conflicting_and_undeclared_indexes():
+    existing = {
+        "_id_": {"key": [("_id", 1)]},
+        "username_unique": {"key": [("username", 1)]},
+        "legacy_1": {"key": [("legacy", 1)]},
+    }
+
+    assert diff_indexes(SPECS, existing) == {
+        "present": [],
+        "missing": ["email_1"],
+        "conflicting": ["username_unique"],
+        "undeclared": ["legacy_1"],
+    }
+    existing["username_unique"]["unique"] = True
+    assert diff_indexes(SPECS, existing)["present"] == ["username_unique"]
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes_creates_only_missing_indexes():
+    database, collection = make_database({"_id_": {"key": [("_id", 1)]}, "username_unique": {"key": [("username", 1)], "unique": True}})
+
+    result = await ensure_indexes(database, SPECS)
+
+    assert result == {"users": {"created": ["email_1"], "present": ["username_unique"], "conflicting": [], "failed": []}}
+    created = collection.create_indexes.await_args.args[0][0].document
+    assert created["name"] == "email_1"
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes_reports_failures_without_raising():
+    database, _ = make_database({}, create_error=OperationFailure("E11000 duplicate key error"))
+
+    result = await ensure_indexes(database, SPECS[:1])
+
+    assert result["users"]["failed"] == ["username_unique"]
+
+
+@pytest.mark.asyncio
+async def test_index_report_lists_unused_indexes():
+    existing = {"_id_": {"key": [("_id", 1)]}, "email_1": {"key": [("email", 1)]}}
+    stats = [{"name": "_id_", "accesses": {"ops": 0}}, {"name": "email_1", "accesses": {"ops": 0}}]
+    database, _ = make_database(existing, stats=stats)
+
+    report = await index_report(database, SPECS)
+
+    assert report["users"]["missing"] == ["username_unique"]
+    assert report["users"]["unused"] == ["email_1"]
@@ -0,0 +1,72 @@
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.packages.models.conversation_models import ConversationListRequest
+from app.packages.mongodb import decode_conversation_cursor, encode_conversation_cursor, list_user_conversations
+from app.resolvers.conversation_resolvers import get_all_user_conversations_resolver
+
+
+def make_documents(count):
+    return [
+        {"_id": ObjectId(), "title": f"Conversation {index}", "updated_at": datetime(2024, 1, 1, 12, 0, index)}
+        for index in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+@patch("app.packages.mongodb.conversation_collection.find")
+async def test_list_user_conversations_returns_a_projected_page_and_cursor(mock_find):
+    documents = make_documents(3)
+    mock_find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=documents)
+
+    page = await list_user_conversations("user123", 2, fields=["summaries"])
+
+    query, projection = mock_find.call_args.args
+    assert query == {"user_id": "user123", "questions.0": {"$exists": True}, "summaries.0": {"$exists": True}}
+    assert projection == {
+        "title": 1, "topic": 1, "created_at": 1, "updated_at": 1, "status": 1, "is_favorite": 1, "summaries": 1,
+    }
+    mock_find.return_value.sort.assert_called_once_with([("updated_at", -1), ("_id", -1)])
+    mock_find.return_value.sort.return_value.limit.assert_called_once_with(3)
+    assert [conversation["title"] for conversation in page["conversations"]] == ["Conversation 0", "Conversation 1"]
+    assert page["conversations"][1]["_id"] == str(documents[1]["_id"])
+    assert decode_conversation_cursor(page["next_cursor"]) == (documents[1]["updated_at"], ObjectId(documents[1]["_id"]))
+
+
+@pytest.mark.asyncio
+@patch("app.packages.mongodb.conversation_collection.find")
+async def test_list_user_conversations_continues_after_the_cursor(mock_find):
+    mock_find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=make_documents(1))
+    updated_at, conversation_id = datetime(2024, 1, 1, 12, 0, 0, 123000), ObjectId()
+
+    page = await list_user_conversations("user123", 2, encode_conversation_cursor(updated_at, conversation_id))
+
+    query = mock_find.call_args.args[0]
+    assert query["$or"] == [
+        {"updated_at": {"$lt": updated_at}},
+        {"updated_at": updated_at, "_id": {"$lt": conversation_id}},
+    ]
+    assert page["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_resolver_rejects_a_malformed_cursor_with_400():
+    with pytest.raises(HTTPException) as error:
+        await get_all_user_conversations_resolver("user123", ConversationListRequest(cursor="not-a-cursor"))
+
+    assert error.value.status_code == 400
+
+
+@pytest.mark.asyncio
+@patch("app.resolvers.conversation_resolvers.list_user_conversations", new_callable=AsyncMock)
+async def test_resolver_returns_404_when_the_user_has_no_conversations(mock_list):
+    mock_list.return_value = {"conversations": [], "next_cursor": None}
+
+    with pytest.raises(HTTPException) as error:
+        await get_all_user_conversations_resolver("user123")
+
+    assert error.value.status_code == 404
+    mock_list.assert_awaited_once_with("user123", 20, None, [])
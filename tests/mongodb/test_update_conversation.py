@@ -0,0 +1,58 @@
+import bson
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
+
+from app.packages.mongodb import update_conversation
+from app.type import Conversation
+
+
+def take_turn(conversation, turn):
+    prompt = {"role": "user", "content": f"Answer number {turn:04d}"}
+    for history in (conversation.questions, conversation.summaries, conversation.analyze):
+        history.append(prompt)
+        history.append({"role": "assistant", "content": f"Reply number {turn:04d}"})
+    conversation.answers.append({"role": "user", "content": f"Possible answers {turn:04d}"})
+    conversation.answers.append({"role": "assistant", "content": f"Answers number {turn:04d}"})
+
+
+@pytest.mark.asyncio
+async def test_bytes_written_per_turn_stay_constant():
+    conversation = Conversation(user_id="user123", conversation_id=str(ObjectId()), topic="Family")
+    conversation.mark_persisted()
+    mock_update = AsyncMock(return_value=MagicMock(matched_count=1, upserted_id=None))
+
+    sizes = []
+    with patch("app.packages.mongodb.conversation_collection.update_one", new=mock_update):
+        for turn in range(50):
+            take_turn(conversation, turn)
+            await update_conversation(conversation)
+            update = mock_update.await_args.args[1]
+            sizes.append(len(bson.encode(update)))
+        # A second write in the same turn only touches the scalar fields.
+        conversation.title = "A title"
+        await update_conversation(conversation)
+
+    assert len(set(sizes)) == 1
+    assert mock_update.await_args.args[1].get("$push") is None
+    update = mock_update.await_args_list[-2].args[1]
+    assert update["$push"]["answers"] == {"$each": conversation.answers[-2:]}
+    assert "questions" not in update["$set"]
+    assert all("upsert" not in call.kwargs for call in mock_update.await_args_list)
+
+
+@pytest.mark.asyncio
+async def test_writes_full_histories_when_the_stored_state_is_unknown():
+    conversation = Conversation(user_id="user123", conversation_id=str(ObjectId()), topic="Family")
+    take_turn(conversation, 0)
+    mock_update = AsyncMock(return_value=MagicMock(matched_count=1, upserted_id=ObjectId(conversation.conversation_id)))
+
+    with patch("app.packages.mongodb.conversation_collection.update_one", new=mock_update):
+        await update_conversation(conversation)
+        take_turn(conversation, 1)
+        await update_conversation(conversation)
+
+    first, second = [call.args[1] for call in mock_update.await_args_list]
+    assert "questions" in first["$set"] and "$push" not in first
+    assert mock_update.await_args_list[0].kwargs == {"upsert": True}
+    assert second["$push"]["questions"] == {"$each": conversation.questions[2:]}